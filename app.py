@@ -1,17 +1,81 @@
 import streamlit as st
+import json
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
+from typing import Optional
 from dotenv import load_dotenv
-from utils.travel_agent import TravelAgent, TravelPreferences
+from utils.itinerary import itinerary_from_text
+from utils.refinement import changed_days
+from utils.jobs import JobQueueFull, get_job_queue
+from utils.rendering import render_itinerary, render_partial_text
+from utils.travel_agent import ItineraryStore, SQLiteResponseCache, TravelAgent, TravelPreferences
 load_dotenv()
 
 
+# With an API server (server.py) the app is a thin client and generates nothing itself.
+api_url = os.getenv("TRAVEL_AGENT_API_URL")
 api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
+if not api_url and not api_key:
     st.error("Please set up your GOOGLE_API_KEY in the .env file")
     st.stop()
 
-agent = TravelAgent(api_key)
+
+@st.cache_resource(show_spinner=False)
+def get_agent(api_key: str, api_url: Optional[str] = None):
+    """Create the agent once per process; every session and rerun shares it.
+
+    Popular destinations start loading into the cache in the background.
+    Requests that differ only trivially from an earlier one reuse its itinerary.
+    Given ``api_url``, returns a ``TravelAgentClient`` for that server
+    instead; the client (and ``requests``) is only imported then.
+    """
+    if api_url:
+        from utils.client import TravelAgentClient
+        return TravelAgentClient(api_url)
+    agent = TravelAgent(api_key, response_cache=SQLiteResponseCache(),
+                        itinerary_store=ItineraryStore(),
+                        adapt_stored_itineraries=os.getenv("TRAVEL_AGENT_ADAPT_ITINERARIES") == "1")
+    agent.prewarm_destinations()
+    return agent
+
+
+agent = get_agent(api_key, api_url)
+
+
+jobs = get_job_queue()
+# How often a page waiting on a background job checks on it.
+POLL_INTERVAL_S = 0.5
+
+
+def itinerary_job(preferences):
+    """Background job that streams the itinerary into the job's partial output.
+
+    Its result is the parsed ``Itinerary``. If no days can be read from the
+    streamed text, it is generated again in structured mode, so refinement
+    always has days to work on.
+    """
+    def run(job):
+        for chunk in agent.generate_itinerary_stream(preferences):
+            job.add_partial(chunk)
+        itinerary = itinerary_from_text(job.partial_text())
+        if not itinerary.days:
+            itinerary = agent.generate_structured_itinerary(preferences)
+        return itinerary
+    return run
+
+
+def reset_session():
+    """Back to the form, cancelling any generation still in progress."""
+    if st.session_state.job_id is not None:
+        jobs.cancel(st.session_state.job_id)
+    st.session_state.stage = 'gather_info'
+    st.session_state.preferences = None
+    st.session_state.itinerary = None
+    st.session_state.changed_days = None
+    st.session_state.job_id = None
+    agent.conversation_memory.clear(st.session_state.session_id)
 
 def main():
     st.set_page_config(page_title="AI Travel Planner", page_icon="🌎", layout="wide")
@@ -26,9 +90,21 @@ def main():
         st.session_state.preferences = None
     if 'itinerary' not in st.session_state:
         st.session_state.itinerary = None
+    if 'job_id' not in st.session_state:
+        st.session_state.job_id = None
+    if 'changed_days' not in st.session_state:
+        st.session_state.changed_days = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
     
     if st.session_state.stage == 'gather_info':
+        # Outside the form so a change triggers a rerun: destination info starts
+        # loading while the rest of the form is filled in.
+        destination = st.text_input(
+            "Where would you like to go?", key="destination",
+            on_change=lambda: agent.prefetch_destination_info(st.session_state.destination))
+
         with st.form("travel_preferences"):
             st.subheader("Essential Information")
             
@@ -40,7 +116,6 @@ def main():
                     ["Leisure", "Business", "Adventure", "Cultural", "Relaxation"])
                 
             with col2:
-                destination = st.text_input("Where would you like to go?")
                 start_date = st.date_input("Start date", min_value=datetime.today())
                 duration = st.number_input("How many days?", min_value=1, value=3)
 
@@ -99,11 +174,6 @@ def main():
                 st.rerun()
 
     elif st.session_state.stage == 'show_itinerary':
-        if st.session_state.itinerary is None:
-            with st.spinner("Generating your personalized itinerary..."):
-                itinerary = agent.generate_itinerary(st.session_state.preferences)
-                st.session_state.itinerary = itinerary
-
         st.subheader("Your Personalized Travel Itinerary")
         
         
@@ -183,74 +253,53 @@ def main():
         }
         </style>
         """, unsafe_allow_html=True)
-        
-        def format_itinerary(text):
-            lines = text.split('\n')
-            formatted_lines = []
-            in_list = False
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-            
-                line = line.replace('**', '')
-                if line.startswith('* ') or line.startswith('• '):
-                    line = line[2:]
-                
-                
-                if line.startswith('Day ') and ':' in line:
-                    if in_list:
-                        formatted_lines.append('</ul>')
-                        in_list = False
-                    line = f'<div class="day-title">{line}</div>'
-                
-                
-                elif any(t in line.lower() for t in ['am:', 'pm:', 'am-', 'pm-']):
-                    time = line.split(':')[0]
-                    rest = ':'.join(line.split(':')[1:])
-                    line = f'<span class="time">{time}</span>{rest}'
-                
-                
-                if '(AED' in line:
-                    cost_part = line[line.find('('):line.find(')')+1]
-                    line = line.replace(cost_part, f'<span class="cost">{cost_part}</span>')
-                
-                
-                if line.lower().startswith('transportation:'):
-                    line = f'<div class="transport-info">{line}</div>'
-                
-                
-                elif line.startswith('Note:') or line.startswith('Important:'):
-                    line = f'<div class="note">{line}</div>'
-                
-                
-                elif not any(line.startswith(prefix) for prefix in ['Day ', 'Transportation:', 'Note:', 'Important:']):
-                    if not in_list:
-                        formatted_lines.append('<ul>')
-                        in_list = True
-                    line = f'<li>{line}</li>'
-                else:
-                    if in_list:
-                        formatted_lines.append('</ul>')
-                        in_list = False
-                
-                formatted_lines.append(line)
-            
-            if in_list:
-                formatted_lines.append('</ul>')
-            
-            return '\n'.join(formatted_lines)
 
-        
-        cleaned_itinerary = format_itinerary(st.session_state.itinerary)
-        
-        
-        cleaned_itinerary = cleaned_itinerary.replace('# ', '<h1>')
-        cleaned_itinerary = cleaned_itinerary.replace('## ', '<h2>')
-        
-        st.markdown(f'<div class="itinerary">{cleaned_itinerary}</div>', unsafe_allow_html=True)
+        itinerary_placeholder = st.empty()
+        if st.session_state.itinerary is None:
+            # Generation runs on the shared job queue; this script only polls it,
+            # so it never holds a script thread for the length of a generation.
+            if st.session_state.job_id is None:
+                try:
+                    st.session_state.job_id = jobs.submit(
+                        itinerary_job(st.session_state.preferences), label="itinerary")
+                except JobQueueFull:
+                    st.error("The planner is busy right now. Please try again in a minute.")
+                    if st.button("Try again"):
+                        st.rerun()
+                    st.stop()
+            job = jobs.status(st.session_state.job_id)
+            if job is None or job["status"] in ("failed", "cancelled"):
+                st.session_state.job_id = None
+                st.error("Unable to generate itinerary"
+                         + (f": {job['error']}" if job and job["error"] else ". Please try again."))
+                if st.button("Try again"):
+                    st.rerun()
+                st.stop()
+            if job["status"] != "done":
+                if job["status"] == "queued":
+                    st.info(f"Waiting for a free planner: position {job['queue_position']} in the queue "
+                            f"({job['wait_s']:.0f}s so far)")
+                itinerary_placeholder.markdown(
+                    f'<div class="itinerary">{render_partial_text(job["partial"])}</div>', unsafe_allow_html=True)
+                if st.button("Cancel"):
+                    reset_session()
+                    st.rerun()
+                time.sleep(POLL_INTERVAL_S)
+                st.rerun()
+            # Parsed once by the job; reruns, refinement and export all work on the model.
+            st.session_state.itinerary = job["result"]
+            st.session_state.job_id = None
+        cleaned_itinerary = render_itinerary(st.session_state.itinerary)
+        itinerary_placeholder.markdown(f'<div class="itinerary">{cleaned_itinerary}</div>', unsafe_allow_html=True)
+
+        col_text, col_json = st.columns(2)
+        with col_text:
+            st.download_button("Download itinerary (text)", st.session_state.itinerary.to_text(),
+                               file_name="itinerary.txt", mime="text/plain")
+        with col_json:
+            st.download_button("Download itinerary (JSON)",
+                               json.dumps(st.session_state.itinerary.to_dict(), indent=2),
+                               file_name="itinerary.json", mime="application/json")
 
         
         st.subheader("Want to refine your itinerary?")
@@ -258,9 +307,7 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Start Over"):
-                st.session_state.stage = 'gather_info'
-                st.session_state.preferences = None
-                st.session_state.itinerary = None
+                reset_session()
                 st.rerun()
 
         with col2:
@@ -270,10 +317,25 @@ def main():
             )
             if st.button("Refine Itinerary") and feedback:
                 with st.spinner("Refining your itinerary..."):
-                    refined_itinerary = agent.refine_suggestions(
-                        st.session_state.preferences, feedback)
-                    st.session_state.itinerary = refined_itinerary
+                    # Only the days the feedback touches are regenerated; render_day
+                    # is memoized per day, so the rerun re-renders just those.
+                    previous = st.session_state.itinerary
+                    try:
+                        st.session_state.itinerary = agent.refine_itinerary(
+                            st.session_state.preferences, previous, feedback,
+                            session_id=st.session_state.session_id)
+                    except Exception as e:
+                        # An ApiError from the server, or a model or quota failure in process;
+                        # the previous itinerary stays in place.
+                        st.error(f"Unable to refine the itinerary: {e}")
+                        st.stop()
+                    st.session_state.changed_days = changed_days(previous, st.session_state.itinerary)
                     st.rerun()
+            if st.session_state.changed_days is not None:
+                if st.session_state.changed_days:
+                    st.caption("Updated day " + ", ".join(str(day) for day in st.session_state.changed_days))
+                else:
+                    st.caption("No changes were made; try rephrasing your feedback.")
 
         # Additional helpful information
         with st.expander("Travel Tips & Resources"):
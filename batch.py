@@ -0,0 +1,160 @@
+"""Generate itineraries offline from a JSONL file of travel preferences.
+
+Each input line is a JSON object with ``TravelPreferences`` fields and an
+optional ``id`` (or ``request_id``); lines without one are keyed by a hash of
+their content. ``end_date`` may be omitted; it is derived from
+``start_date`` and ``duration``. Results are appended to the output JSONL as
+they complete, and finished ids are recorded in a checkpoint file so an
+interrupted run can be restarted without regenerating them.
+
+    python batch.py preferences.jsonl itineraries.jsonl --concurrency 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from utils.metrics import Metrics
+from utils.travel_agent import ItineraryStore, SQLiteResponseCache, TravelAgent, preferences_from_dict, run_async
+
+
+def read_requests(path):
+    """Yield ``(item_id, preferences_dict)`` from the input file, one line at a time."""
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            item_id = data.pop("id", None) or data.pop("request_id", None)
+            yield str(item_id or hashlib.sha256(line.encode("utf-8")).hexdigest()[:16]), data
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as handle:
+        return {line.strip() for line in handle if line.strip()}
+
+
+def ensure_trailing_newline(path):
+    """Terminate a line cut short by a crash so appended records stay valid JSONL."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as handle:
+        handle.seek(-1, os.SEEK_END)
+        if handle.read(1) != b"\n":
+            handle.write(b"\n")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_batch(agent, input_path, output_path, checkpoint_path, concurrency):
+    done = load_checkpoint(checkpoint_path)
+    latencies = []
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    ensure_trailing_newline(output_path)
+    with open(output_path, "a", encoding="utf-8") as output, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+
+        async def generate(item_id, data):
+            item_started = time.perf_counter()
+            record = {"id": item_id}
+            try:
+                itinerary = await agent.agenerate_structured_itinerary(preferences_from_dict(data))
+                record["itinerary"] = itinerary.to_text()
+                record["structured"] = itinerary.to_dict()
+            except Exception as e:
+                record["error"] = str(e)
+            record["latency_s"] = round(time.perf_counter() - item_started, 3)
+            return record
+
+        def finish(record):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            if "error" in record:
+                counts["failed"] += 1
+                return
+            # Only successful items are checkpointed, so failures retry on resume.
+            checkpoint.write(record["id"] + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            counts["ok"] += 1
+            latencies.append(record["latency_s"])
+
+        pending = set()
+        for item_id, data in read_requests(input_path):
+            if item_id in done:
+                counts["skipped"] += 1
+                continue
+            done.add(item_id)
+            pending.add(asyncio.ensure_future(generate(item_id, data)))
+            if len(pending) >= concurrency:
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    finish(task.result())
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                finish(task.result())
+
+    elapsed = time.perf_counter() - started
+    processed = counts["ok"] + counts["failed"]
+    report = dict(counts)
+    report["elapsed_s"] = round(elapsed, 2)
+    report["items_per_min"] = round(processed / elapsed * 60, 2) if elapsed > 0 else 0.0
+    if latencies:
+        report["p50_latency_s"] = round(statistics.median(latencies), 3)
+        report["p95_latency_s"] = round(percentile(latencies, 0.95), 3)
+    report["tokens"] = agent.token_usage.stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate itineraries from a JSONL file of travel preferences.")
+    parser.add_argument("input", help="JSONL file of TravelPreferences objects")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="file of finished ids (default: OUTPUT.checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=4, help="itineraries generated at once")
+    parser.add_argument("--metrics", help="write a plain-text metrics dump (latencies, retries, cache hits) here")
+    parser.add_argument("--reuse", action="store_true",
+                        help="serve near-identical preferences from the on-disk itinerary store")
+    parser.add_argument("--adapt", action="store_true",
+                        help="with --reuse, adapt reused itineraries to each request's exact details")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        sys.exit("Please set up your GOOGLE_API_KEY in the .env file")
+
+    # Each itinerary makes up to two model calls; let them all run concurrently.
+    agent = TravelAgent(api_key, max_concurrent_requests=max(1, args.concurrency) * 2,
+                        metrics=Metrics() if args.metrics else None,
+                        itinerary_store=ItineraryStore() if args.reuse else None,
+                        adapt_stored_itineraries=args.adapt)
+    checkpoint = args.checkpoint or args.output + ".checkpoint"
+    try:
+        report = run_async(run_batch(agent, args.input, args.output, checkpoint, max(1, args.concurrency)))
+    except KeyboardInterrupt:
+        sys.exit("Interrupted; rerun the same command to resume from the checkpoint.")
+    finally:
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as handle:
+                handle.write(agent.metrics_text())
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
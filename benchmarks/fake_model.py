@@ -0,0 +1,156 @@
+"""Deterministic stand-in for ``genai.GenerativeModel`` used by the benchmarks.
+
+Answers each prompt with canned output of the right shape for its pipeline
+stage, after a delay drawn from a configurable latency distribution. A
+configurable share of calls returns malformed JSON, empty text or a
+retryable API error. Every random draw is seeded from the prompt and how
+many times it has been seen, so a run is reproducible at any concurrency.
+
+    model = FakeModel(latency="lognormal:0.8,0.4", malformed_rate=0.05, error_rate=0.02)
+    agent.model = model
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+from benchmarks.render import synthetic_itinerary
+
+DESTINATION_INFO = {
+    "attractions": [f"Landmark {index}" for index in range(1, 9)],
+    "hidden_gems": [f"Hidden courtyard {index}" for index in range(1, 4)],
+    "restaurants": [f"Bistro {index}" for index in range(1, 6)],
+    "events": ["Night market", "Street festival"],
+}
+
+PREFERENCES = {
+    "dietary_preferences": ["Vegetarian"],
+    "walking_tolerance": "2-4 hours",
+    "specific_interests": ["Museums", "Food tours"],
+    "budget": "$2000-3000",
+}
+
+
+def parse_latency(spec):
+    """Parse ``fixed:S``, ``uniform:LOW,HIGH`` or ``lognormal:MEDIAN,SIGMA`` (seconds).
+
+    Returns a function that draws one delay from a ``random.Random``.
+    """
+    kind, _, values = spec.partition(":")
+    numbers = [float(value) for value in values.split(",") if value]
+    if kind == "fixed" and len(numbers) == 1:
+        return lambda rng: numbers[0]
+    if kind == "uniform" and len(numbers) == 2:
+        return lambda rng: rng.uniform(numbers[0], numbers[1])
+    if kind == "lognormal" and len(numbers) == 2:
+        return lambda rng: rng.lognormvariate(math.log(numbers[0]), numbers[1])
+    raise ValueError(f"unknown latency distribution: {spec!r}")
+
+
+def canned_day(day, title="Neighbourhood"):
+    return {"day": day, "title": f"{title} {day}", "segments": [
+        {"name": name, "activities": [
+            {"time": "9:00 AM", "place": f"Landmark {day}", "description": "Guided visit",
+             "cost": "$20", "transport": "Metro"},
+        ]} for name in ("Morning", "Afternoon", "Evening")
+    ]}
+
+
+def canned_text(prompt):
+    """Well-formed output for whichever pipeline stage ``prompt`` belongs to."""
+    if "Generate detailed travel information" in prompt:
+        return json.dumps(DESTINATION_INFO)
+    if "Extract key travel preferences" in prompt:
+        return json.dumps(PREFERENCES)
+    if "Decide which days of this travel itinerary" in prompt:
+        return json.dumps({"days": [{"day": 1, "segments": []}]})
+    if "Return this day as JSON" in prompt:
+        return json.dumps(canned_day(1, "Refined"))
+    if "Return the itinerary as JSON" in prompt:
+        return json.dumps({"days": [canned_day(day) for day in range(1, 4)]})
+    if "schedule for day" in prompt:
+        return "* 9:00 AM: Visit Landmark 1 (Cost: $20)\n* 11:00 AM: Coffee at Bistro 2 (Cost: $8)"
+    if "-day travel itinerary" in prompt:
+        return synthetic_itinerary(3).split("\n", 4)[4]
+    return "Sounds great! Tell me a little more about what you enjoy doing when you travel."
+
+
+class FakeResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.candidates = []
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4 + 1,
+            candidates_token_count=len(text) // 4,
+            total_token_count=len(prompt) // 4 + 1 + len(text) // 4,
+        )
+
+
+class FakeModel:
+    """Drop-in for the parts of ``GenerativeModel`` that ``TravelAgent`` uses."""
+
+    model_name = "models/fake-benchmark"
+
+    def __init__(self, latency="fixed:0.05", malformed_rate=0.0, empty_rate=0.0, error_rate=0.0, seed=0):
+        self.latency = parse_latency(latency)
+        self.malformed_rate = malformed_rate
+        self.empty_rate = empty_rate
+        self.error_rate = error_rate
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._seen = {}
+        self.calls = 0
+        self.errors = 0
+
+    def _draw(self, prompt):
+        """Return ``(delay, text)`` for this call, or ``(delay, exception)``."""
+        with self._lock:
+            occurrence = self._seen.get(prompt, 0)
+            self._seen[prompt] = occurrence + 1
+            self.calls += 1
+        rng = random.Random(f"{self.seed}:{occurrence}:{prompt}")
+        delay = self.latency(rng)
+        roll = rng.random()
+        if roll < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return delay, google_exceptions.ServiceUnavailable("injected failure")
+        roll -= self.error_rate
+        if roll < self.empty_rate:
+            return delay, ""
+        roll -= self.empty_rate
+        text = canned_text(prompt)
+        if roll < self.malformed_rate:
+            text = text[:len(text) // 2]
+        return delay, text
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        delay, result = self._draw(prompt)
+        if isinstance(result, Exception):
+            time.sleep(delay)
+            raise result
+        if stream:
+            return self._stream(result, prompt, delay)
+        time.sleep(delay)
+        return FakeResponse(result, prompt)
+
+    async def generate_content_async(self, prompt, generation_config=None, request_options=None):
+        delay, result = self._draw(prompt)
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return FakeResponse(result, prompt)
+
+    def _stream(self, text, prompt, delay):
+        # Half the delay before the first chunk, the rest spread over the remainder.
+        pieces = [text[index:index + 64] for index in range(0, len(text), 64)] or [""]
+        time.sleep(delay / 2)
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(delay / 2 / len(pieces))
+            yield FakeResponse(piece, prompt if index == len(pieces) - 1 else "")
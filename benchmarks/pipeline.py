@@ -0,0 +1,195 @@
+"""End-to-end benchmark of the TravelAgent pipeline against a fake model.
+
+Swaps ``TravelAgent.model`` for ``benchmarks.fake_model.FakeModel`` (no network, no API
+key) and measures, at each concurrency level:
+- ``generate_itinerary`` in single-call and day-level planning modes
+- ``generate_structured_itinerary``
+- ``gather_preferences``
+- ``refine_suggestions``
+- ``refine_itinerary`` (one named day of a structured itinerary)
+plus the itinerary renderer on the generated text. Each operation runs on a
+fresh agent so caches do not carry over between measurements; requests
+cycle through ``--destinations`` cities, so destination lookups are shared
+the way they are in production.
+
+Run from the repository root:
+
+    python -m benchmarks.pipeline --requests 40 --concurrency 1 4 16
+    python -m benchmarks.pipeline --latency lognormal:0.8,0.4 --malformed-rate 0.1 --error-rate 0.05 --json
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks.fake_model import FakeModel, canned_day
+from benchmarks.render import synthetic_itinerary
+from utils.itinerary import itinerary_from_dict
+from utils.rate_limit import RateLimiter
+from utils.rendering import _render_text
+from utils.travel_agent import DestinationCache, TravelAgent, TravelPreferences, is_error_text
+
+STRUCTURED_ITINERARY = itinerary_from_dict({"days": [canned_day(day) for day in range(1, 4)]})
+
+
+def preferences(index, destinations):
+    start = datetime(2025, 5, 1)
+    return TravelPreferences(
+        budget="$2500",
+        duration=3,
+        start_date=start,
+        end_date=start + timedelta(days=3),
+        start_location="Berlin",
+        destination=f"City {index % destinations}",
+        purpose="Leisure",
+        interests=["Art & Museums", "Food & Dining"],
+        dietary_preferences=["Vegetarian"],
+        walking_tolerance="2-4 hours",
+    )
+
+
+def operations(destinations):
+    """Map each operation name to ``(agent, index) -> result`` and an error check."""
+    def text_failed(result):
+        return not result or is_error_text(result)
+
+    return {
+        "generate_itinerary": (
+            lambda agent, index: agent.generate_itinerary(preferences(index, destinations)), text_failed),
+        "generate_itinerary_daily": (
+            lambda agent, index: agent.generate_itinerary(preferences(index, destinations), planning_mode="daily"),
+            text_failed),
+        "generate_structured_itinerary": (
+            lambda agent, index: agent.generate_structured_itinerary(preferences(index, destinations)),
+            lambda result: not result.days),
+        "gather_preferences": (
+            lambda agent, index: agent.gather_preferences(f"Trip {index}: museums and good vegetarian food"),
+            lambda result: result.get("needs_clarification", True)),
+        "refine_suggestions": (
+            lambda agent, index: agent.refine_suggestions(preferences(index, destinations), "More museums please"),
+            text_failed),
+        "refine_itinerary": (
+            lambda agent, index: agent.refine_itinerary(
+                preferences(index, destinations), STRUCTURED_ITINERARY, "More museums on day 2 please"),
+            lambda result: result == STRUCTURED_ITINERARY),
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_operation(function, failed, model_options, requests, concurrency):
+    model = FakeModel(**model_options)
+    agent = TravelAgent(
+        "benchmark-placeholder-key",
+        destination_cache=DestinationCache(path=None),
+        # Generous quota: the benchmark measures the pipeline, not the limiter.
+        rate_limiter=RateLimiter(requests_per_minute=1e7, tokens_per_minute=1e10, max_concurrency=256),
+        max_schedule_workers=max(6, concurrency),
+    )
+    agent.model = model
+
+    def timed(index):
+        start = time.perf_counter()
+        try:
+            ok = not failed(function(agent, index))
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for seconds, _ in outcomes]
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "max_ms": round(max(latencies), 1),
+        "model_calls": model.calls,
+        "injected_errors": model.errors,
+        "tokens": agent.token_usage.stats()["total"]["total_tokens"],
+    }
+
+
+def run_renderer(days, repeat):
+    texts = [synthetic_itinerary(days, seed) for seed in range(repeat)]
+    samples = []
+    for text in texts:
+        start = time.perf_counter()
+        _render_text(text)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "days": days,
+        "renders": repeat,
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20, help="requests per operation and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--operations", nargs="+", help="subset of operations to run (default: all)")
+    parser.add_argument("--destinations", type=int, default=5, help="distinct destinations to cycle through")
+    parser.add_argument("--latency", default="fixed:0.05",
+                        help="model latency: fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of responses cut off mid-JSON")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="share of empty responses")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a retryable error")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render-days", type=int, default=14, help="itinerary length for the renderer benchmark")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    model_options = {
+        "latency": args.latency,
+        "malformed_rate": args.malformed_rate,
+        "empty_rate": args.empty_rate,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+    }
+    available = operations(max(1, args.destinations))
+    selected = args.operations or list(available)
+    unknown = set(selected) - set(available)
+    if unknown:
+        parser.error(f"unknown operations: {', '.join(sorted(unknown))}")
+
+    results = {
+        "config": dict(model_options, requests=args.requests, concurrency=args.concurrency,
+                       destinations=args.destinations),
+        "operations": {},
+        "render": run_renderer(args.render_days, max(args.requests, 20)),
+    }
+    for name in selected:
+        function, failed = available[name]
+        results["operations"][name] = {
+            str(level): run_operation(function, failed, model_options, args.requests, max(1, level))
+            for level in args.concurrency
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'operation':<30} {'conc':>4} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'errors':>6} {'calls':>6}")
+    for name, levels in results["operations"].items():
+        for level, stats in levels.items():
+            print(f"{name:<30} {level:>4} {stats['throughput_rps']:>8.2f} {stats['p50_ms']:>9.1f} "
+                  f"{stats['p95_ms']:>9.1f} {stats['errors']:>6} {stats['model_calls']:>6}")
+    render = results["render"]
+    print(f"render {render['days']}-day itinerary: p50 {render['p50_ms']:.3f} ms, p95 {render['p95_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Micro-benchmark for the itinerary renderer on synthetic long trips.
+
+Measures, per itinerary:
+- cold render of streamed text with the single-pass tokenizer
+- cold render of the parsed ``Itinerary`` model
+- a rerun with an unchanged itinerary, which should hit the render cache
+
+Run from the repository root:
+
+    python -m benchmarks.render --days 30 --repeat 200
+    python -m benchmarks.render --json
+"""
+import argparse
+import json
+import statistics
+import time
+
+from utils.itinerary import itinerary_from_text
+from utils.rendering import _render_model, _render_text, render_itinerary, render_itinerary_text
+
+SEGMENTS = (
+    ("Morning", ("8:00 AM", "9:30 AM", "11:00 AM")),
+    ("Afternoon", ("1:00 PM", "2:30 PM", "4:00 PM")),
+    ("Evening", ("6:30 PM", "8:00 PM", "9:30 PM")),
+)
+
+
+def synthetic_itinerary(days, seed=0):
+    """Build itinerary text shaped like model output for a ``days``-long trip."""
+    lines = [
+        "Personalized Travel Itinerary for Benchmark City",
+        f"Duration: {days} days",
+        "Dates: 2025-01-01 to 2025-01-31",
+        "Budget: $5000",
+        "# Benchmark City Itinerary",
+    ]
+    for day in range(1, days + 1):
+        lines.append("")
+        lines.append(f"**Day {day}: Neighbourhood {day + seed}**")
+        for segment, times in SEGMENTS:
+            lines.append(f"{segment}:")
+            for index, slot in enumerate(times):
+                lines.append(
+                    f"* {slot}: Visit Attraction {day}-{index} - a {segment.lower()} highlight "
+                    f"with local guides (Cost: AED {20 * (index + 1)})"
+                )
+            lines.append(f"Transportation: Metro line {day % 4 + 1} between stops")
+        lines.append("Note: Book tickets in advance.")
+    lines.append("")
+    lines.append("Practical Information:")
+    lines.append("- Weather: Check daily forecast")
+    return "\n".join(lines)
+
+
+def timed(function, argument, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return {
+        "median_us": round(statistics.median(samples), 2),
+        "p95_us": round(sorted(samples)[int(len(samples) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    # A fresh itinerary per run keeps the "cold" timings off the cache.
+    texts = [synthetic_itinerary(args.days, seed) for seed in range(args.repeat)]
+    models = [itinerary_from_text(text) for text in texts]
+
+    def cold(render, items):
+        iterator = iter(items)
+        return timed(lambda _: render(next(iterator)), None, len(items))
+
+    results = {
+        "days": args.days,
+        "text_bytes": len(texts[0].encode("utf-8")),
+        "parse_text": cold(itinerary_from_text, texts),
+        "render_text_cold": cold(_render_text, texts),
+        "render_text_cached": timed(render_itinerary_text, texts[0], args.repeat),
+        "render_model_cold": cold(_render_model, models),
+        "render_model_cached": timed(render_itinerary, models[0], args.repeat),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.days}-day itinerary, {results['text_bytes']} bytes of text")
+    for name, stats in results.items():
+        if isinstance(stats, dict):
+            print(f"{name:<22} median {stats['median_us']:>10.1f} us  p95 {stats['p95_us']:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
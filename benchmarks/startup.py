@@ -0,0 +1,104 @@
+"""Measure cold-start cost of the travel planner.
+
+Reports, for fresh Python processes:
+- import time of ``utils.travel_agent``
+- first render of ``app.py`` (import, agent creation and the first script run)
+- a rerun of ``app.py`` in the same process, which should reuse the cached agent
+
+Run from the repository root:
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --json --max-import-ms 2500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import utils.travel_agent
+print((time.perf_counter() - start) * 1000)
+"""
+
+RENDER_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file("app.py", default_timeout=60).run()
+first = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+app.run()
+rerun = (time.perf_counter() - start) * 1000
+if app.exception:
+    raise SystemExit(str(app.exception))
+print(first, rerun)
+"""
+
+
+def run_snippet(snippet):
+    """Run ``snippet`` in a fresh interpreter and return the numbers it prints."""
+    env = dict(os.environ)
+    # The app stops without a key. Rendering the form makes no model call, so any value works.
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder-key")
+    # Prewarming would send real lookups with that key; startup is measured without it.
+    env["TRAVEL_AGENT_PREWARM_DESTINATIONS"] = ""
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return [float(value) for value in result.stdout.split()]
+
+
+def summarize(samples):
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--max-import-ms", type=float, help="fail if median import time exceeds this")
+    parser.add_argument("--max-render-ms", type=float, help="fail if median first render exceeds this")
+    args = parser.parse_args()
+
+    imports = [run_snippet(IMPORT_SNIPPET)[0] for _ in range(args.runs)]
+    renders = [run_snippet(RENDER_SNIPPET) for _ in range(args.runs)]
+    results = {
+        "import_travel_agent": summarize(imports),
+        "first_render": summarize([first for first, _ in renders]),
+        "rerun": summarize([rerun for _, rerun in renders]),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, stats in results.items():
+            print(f"{name:<20} median {stats['median_ms']:>8.1f} ms  "
+                  f"(min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f})")
+
+    failed = False
+    if args.max_import_ms is not None and results["import_travel_agent"]["median_ms"] > args.max_import_ms:
+        print(f"import time regression: above {args.max_import_ms} ms", file=sys.stderr)
+        failed = True
+    if args.max_render_ms is not None and results["first_render"]["median_ms"] > args.max_render_ms:
+        print(f"first render regression: above {args.max_render_ms} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Headless HTTP API for the travel agent.
+
+Serves the agent's pipeline to any HTTP client (the Streamlit app with
+``TRAVEL_AGENT_API_URL`` set, load tests, other services), so generation
+capacity scales separately from the UI:
+
+    python server.py --port 8080 --workers 4
+
+Endpoints (JSON in, JSON out):
+
+    POST   /v1/preferences      {"user_input": "..."}                  -> gather_preferences
+    POST   /v1/itinerary        {"preferences": {...}, "planning_mode": "single",
+                                 "format": "text" | "json", "stream": false}
+                                                                        -> generate_itinerary
+    POST   /v1/refine           {"preferences": {...}, "feedback": "...",
+                                 "itinerary": "..." | {...}, "session_id": "..."}
+                                                                        -> refine_suggestions / refine_itinerary
+    POST   /v1/prefetch         {"destination": "..."}                 -> prefetch_destination_info
+    DELETE /v1/sessions/{id}                                            -> forget a refinement session
+    GET    /healthz, /metrics
+
+Every request may carry ``timeout_s``; requests that wait or run past it
+get 504, and requests the model fails to answer get 502. Each worker process runs one agent (one pooled model client and
+rate limiter share) behind admission control: a bounded number of requests
+run at once, a bounded number wait, and the rest get 429 with Retry-After.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+from aiohttp import web
+from dotenv import load_dotenv
+from pydantic import ValidationError
+
+from utils.admission import AdmissionControl, Overloaded
+from utils.deadline import DeadlineExceeded, deadline_at
+from utils.itinerary import itinerary_from_dict
+from utils.metrics import metrics_from_env
+from utils.rate_limit import RateLimiter
+from utils.travel_agent import (
+    ItineraryStore, SQLiteResponseCache, TravelAgent, is_error_text, preferences_from_dict,
+)
+
+# Default and maximum time a request may take, waiting included, by endpoint.
+DEFAULT_TIMEOUTS_S = {"preferences": 30, "itinerary": 180, "refine": 120, "prefetch": 5}
+MAX_TIMEOUT_S = 600
+
+AGENT = web.AppKey("agent", TravelAgent)
+ADMISSION = web.AppKey("admission", AdmissionControl)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class GenerationFailed(RuntimeError):
+    pass
+
+
+def error_response(status, message, headers=None):
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+async def read_body(request):
+    try:
+        body = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest("request body must be a JSON object") from None
+    if not isinstance(body, dict):
+        raise BadRequest("request body must be a JSON object")
+    return body
+
+
+def read_preferences(body):
+    data = body.get("preferences")
+    if not isinstance(data, dict):
+        raise BadRequest("'preferences' must be an object of TravelPreferences fields")
+    try:
+        return preferences_from_dict(data)
+    except (ValidationError, TypeError, ValueError) as e:
+        raise BadRequest(f"invalid preferences: {e}") from None
+
+
+def deadline_for(body, endpoint):
+    """``time.monotonic()`` deadline from the request's ``timeout_s``, capped at ``MAX_TIMEOUT_S``."""
+    timeout_s = body.get("timeout_s", DEFAULT_TIMEOUTS_S[endpoint])
+    if not isinstance(timeout_s, (int, float)) or timeout_s <= 0:
+        raise BadRequest("'timeout_s' must be a positive number")
+    return time.monotonic() + min(float(timeout_s), MAX_TIMEOUT_S)
+
+
+async def within(deadline, awaitable):
+    return await asyncio.wait_for(awaitable, timeout=max(0.0, deadline - time.monotonic()))
+
+
+def generated(text):
+    """``text``, unless it is the failure message an agent text method returns instead of raising."""
+    if not text or is_error_text(text):
+        raise GenerationFailed("the model could not generate a response; please try again")
+    return text
+
+
+def handler(endpoint):
+    """Wrap an endpoint with body parsing, admission control, its deadline and error mapping.
+
+    The wrapped function gets ``(request, body, deadline)`` and returns a
+    response; it bounds its own work with ``within(deadline, ...)``. The
+    deadline is also set for the agent, which splits it between its stages
+    and drops optional ones rather than overrun it.
+    """
+    def decorate(function):
+        async def handle(request):
+            admission = request.app[ADMISSION]
+            try:
+                body = await read_body(request)
+                deadline = deadline_for(body, endpoint)
+                async with admission.admit(deadline, label=endpoint):
+                    with deadline_at(deadline):
+                        return await function(request, body, deadline)
+            except BadRequest as e:
+                return error_response(400, str(e))
+            except Overloaded as e:
+                return error_response(429, str(e), headers={"Retry-After": str(int(e.retry_after_s))})
+            except (DeadlineExceeded, asyncio.TimeoutError):
+                return error_response(504, "request deadline exceeded")
+            except GenerationFailed as e:
+                request.app[AGENT].metrics.increment("errors", operation=f"api_{endpoint}")
+                return error_response(502, str(e))
+            except Exception as e:
+                # The exception's text can carry internals (paths, upstream messages), so clients get none of it.
+                request.app[AGENT].metrics.increment("errors", operation=f"api_{endpoint}", error=type(e).__name__)
+                return error_response(500, "internal server error")
+        return handle
+    return decorate
+
+
+@handler("preferences")
+async def gather_preferences(request, body, deadline):
+    user_input = body.get("user_input")
+    if not isinstance(user_input, str) or not user_input.strip():
+        raise BadRequest("'user_input' must be a non-empty string")
+    preferences = await within(deadline, request.app[AGENT].agather_preferences(user_input))
+    return web.json_response(json.loads(json.dumps(preferences, default=str)))
+
+
+@handler("itinerary")
+async def generate_itinerary(request, body, deadline):
+    agent = request.app[AGENT]
+    preferences = read_preferences(body)
+    if body.get("stream"):
+        return await stream_itinerary(request, agent, preferences, deadline)
+    if body.get("format", "text") == "json":
+        itinerary = await within(deadline, agent.agenerate_structured_itinerary(preferences))
+        return web.json_response({"itinerary": itinerary.to_text(), "structured": itinerary.to_dict()})
+    planning_mode = body.get("planning_mode", "single")
+    if planning_mode not in ("single", "daily"):
+        raise BadRequest("'planning_mode' must be 'single' or 'daily'")
+    itinerary = await within(deadline, agent.agenerate_itinerary(preferences, planning_mode=planning_mode))
+    return web.json_response({"itinerary": generated(itinerary)})
+
+
+async def stream_itinerary(request, agent, preferences, deadline):
+    """Send ``generate_itinerary_stream`` chunks as a chunked text response.
+
+    The stream is read on a thread; when the client goes away or the
+    deadline passes, the generator is closed at its next chunk, which closes
+    the model stream. A response cut short by the deadline, or by the
+    model failing part way, is closed without its final chunk, so the
+    client sees it as incomplete rather than done; the failure message
+    itself is not sent.
+    """
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def produce():
+        # The executor thread does not inherit the request's context, so the deadline is passed in.
+        stream = agent.generate_itinerary_stream(preferences, timeout_s=deadline - time.monotonic())
+        end = None
+        try:
+            for chunk in stream:
+                if stopped.is_set():
+                    break
+                if is_error_text(chunk):
+                    end = GenerationFailed(chunk.strip())
+                    break
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+        except DeadlineExceeded as e:
+            end = e
+        finally:
+            stream.close()
+            loop.call_soon_threadsafe(chunks.put_nowait, end)
+
+    response = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            chunk = await within(deadline, chunks.get())
+            if chunk is None:
+                break
+            if isinstance(chunk, (DeadlineExceeded, GenerationFailed)):
+                raise chunk
+            await response.write(chunk.encode("utf-8"))
+    except (asyncio.TimeoutError, DeadlineExceeded, GenerationFailed, ConnectionResetError):
+        stopped.set()
+        if request.transport is not None:
+            request.transport.close()
+        return response
+    except asyncio.CancelledError:
+        stopped.set()
+        raise
+    await producer
+    await response.write_eof()
+    return response
+
+
+@handler("refine")
+async def refine(request, body, deadline):
+    agent = request.app[AGENT]
+    preferences = read_preferences(body)
+    feedback = body.get("feedback")
+    if not isinstance(feedback, str) or not feedback.strip():
+        raise BadRequest("'feedback' must be a non-empty string")
+    itinerary = body.get("itinerary")
+    session_id = body.get("session_id")
+    if isinstance(itinerary, dict):
+        try:
+            structured = itinerary_from_dict(itinerary, tuple(itinerary.get("header") or ()))
+        except (KeyError, TypeError, ValueError) as e:
+            raise BadRequest(f"invalid itinerary: {e}") from None
+        refined = await within(
+            deadline, agent.arefine_itinerary(preferences, structured, feedback, session_id=session_id))
+        return web.json_response({"itinerary": refined.to_text(), "structured": refined.to_dict()})
+    if itinerary is not None and not isinstance(itinerary, str):
+        raise BadRequest("'itinerary' must be text or a structured itinerary object")
+    refined = await within(
+        deadline, agent.arefine_suggestions(preferences, feedback, itinerary, session_id=session_id))
+    return web.json_response({"itinerary": generated(refined)})
+
+
+@handler("prefetch")
+async def prefetch(request, body, deadline):
+    destination = body.get("destination")
+    if not isinstance(destination, str):
+        raise BadRequest("'destination' must be a string")
+    request.app[AGENT].prefetch_destination_info(destination)
+    return web.json_response({"accepted": True}, status=202)
+
+
+async def forget_session(request):
+    request.app[AGENT].conversation_memory.clear(request.match_info["session_id"])
+    return web.Response(status=204)
+
+
+async def health(request):
+    return web.json_response({"status": "ok", "pid": os.getpid(), **request.app[ADMISSION].stats()})
+
+
+async def metrics(request):
+    text = request.app[AGENT].metrics_text(extra_stats={"admission": request.app[ADMISSION].stats()})
+    return web.Response(text=text, content_type="text/plain")
+
+
+def create_app(agent, max_in_flight=8, max_queued=32):
+    app = web.Application(client_max_size=1024 * 1024)
+    app[AGENT] = agent
+    app[ADMISSION] = AdmissionControl(max_in_flight, max_queued, metrics=agent.metrics)
+    app.add_routes([
+        web.post("/v1/preferences", gather_preferences),
+        web.post("/v1/itinerary", generate_itinerary),
+        web.post("/v1/refine", refine),
+        web.post("/v1/prefetch", prefetch),
+        web.delete("/v1/sessions/{session_id}", forget_session),
+        web.get("/healthz", health),
+        web.get("/metrics", metrics),
+    ])
+    return app
+
+
+def create_agent(api_key, workers, prewarm):
+    """One agent per worker process; the process's share of the quota goes to its rate limiter."""
+    share = max(1, workers)
+    rate_limiter = RateLimiter(
+        requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "1000")) / share,
+        tokens_per_minute=float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000")) / share,
+        max_concurrency=max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")) // share),
+    )
+    agent = TravelAgent(api_key, response_cache=SQLiteResponseCache(), rate_limiter=rate_limiter,
+                        metrics=metrics_from_env(),
+                        itinerary_store=ItineraryStore(),
+                        adapt_stored_itineraries=os.getenv("TRAVEL_AGENT_ADAPT_ITINERARIES") == "1")
+    if prewarm:
+        agent.prewarm_destinations()
+    return agent
+
+
+def serve(api_key, host, port, workers, worker_index, max_in_flight, max_queued):
+    # Only the first worker prewarms; the others find the results in the on-disk cache.
+    agent = create_agent(api_key, workers, prewarm=worker_index == 0)
+    web.run_app(create_app(agent, max_in_flight, max_queued), host=host, port=port,
+                reuse_port=workers > 1, print=None, handle_signals=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the travel agent over HTTP.")
+    parser.add_argument("--host", default=os.getenv("TRAVEL_AGENT_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("TRAVEL_AGENT_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TRAVEL_AGENT_WORKERS", "1")),
+                        help="worker processes sharing the port")
+    parser.add_argument("--max-in-flight", type=int, default=int(os.getenv("TRAVEL_AGENT_MAX_IN_FLIGHT", "8")),
+                        help="requests each worker runs at once")
+    parser.add_argument("--max-queued", type=int, default=int(os.getenv("TRAVEL_AGENT_MAX_QUEUED", "32")),
+                        help="requests each worker lets wait before answering 429")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        sys.exit("Please set up your GOOGLE_API_KEY in the .env file")
+
+    options = (args.host, args.port, max(1, args.workers))
+    limits = (max(1, args.max_in_flight), max(0, args.max_queued))
+    if args.workers <= 1:
+        serve(api_key, *options, 0, *limits)
+        return
+
+    # Workers bind the same port with SO_REUSEPORT and the kernel spreads connections over them.
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=serve, args=(api_key, *options, index, *limits), daemon=True)
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.admission import AdmissionControl, Overloaded
+from utils.deadline import DeadlineExceeded
+
+
+def later(seconds=5):
+    return time.monotonic() + seconds
+
+
+async def hold(admission, release, deadline=None):
+    async with admission.admit(deadline or later()):
+        await release.wait()
+
+
+def test_requests_beyond_the_slots_wait_in_order():
+    async def main():
+        admission = AdmissionControl(max_in_flight=1, max_queued=2)
+        release, order = asyncio.Event(), []
+
+        async def request(name):
+            async with admission.admit(later()):
+                order.append(name)
+                await release.wait()
+
+        tasks = [asyncio.create_task(request(name)) for name in ("first", "second", "third")]
+        await asyncio.sleep(0.01)
+        stats = admission.stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return stats, order, admission.stats()
+
+    waiting, order, done = asyncio.run(main())
+
+    assert waiting["in_flight"] == 1 and waiting["queued"] == 2
+    assert order == ["first", "second", "third"]
+    assert done == {"admitted": 3, "rejected": 0, "expired": 0, "in_flight": 0, "queued": 0}
+
+
+def test_a_full_queue_rejects_with_a_retry_hint():
+    async def main():
+        admission = AdmissionControl(max_in_flight=1, max_queued=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(admission, release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(Overloaded) as rejected:
+                await hold(admission, release)
+        finally:
+            release.set()
+            await asyncio.gather(*tasks)
+        return admission, rejected.value
+
+    admission, error = asyncio.run(main())
+
+    assert error.retry_after_s >= 1
+    assert admission.stats()["rejected"] == 1
+    assert admission.stats()["admitted"] == 2
+
+
+def test_a_request_whose_deadline_passes_in_the_queue_never_runs():
+    async def main():
+        admission = AdmissionControl(max_in_flight=1, max_queued=4)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(admission, release))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await hold(admission, release, deadline=later(0.05))
+        finally:
+            release.set()
+            await running
+        return admission.stats()
+
+    stats = asyncio.run(main())
+
+    assert stats["expired"] == 1
+    assert stats["admitted"] == 1
+    assert stats["queued"] == 0
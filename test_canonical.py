@@ -0,0 +1,66 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from utils.canonical import (budget_band, canonical_key, date_bucket, preference_differences,
+                             stored_itinerary)
+from utils.travel_agent import TravelPreferences
+
+
+def preferences(**changes):
+    fields = dict(budget="$2000", duration=3, start_date=datetime(2025, 7, 1), end_date=datetime(2025, 7, 4),
+                  start_location="London", destination="Paris", purpose="Leisure",
+                  dietary_preferences=["Vegetarian"], interests=["Art", "Food"], walking_tolerance="3 hours")
+    fields.update(changes)
+    return TravelPreferences(**fields)
+
+
+@pytest.mark.parametrize("budget, band", [
+    ("$2000", "$2000-4000"),
+    ("2000 USD", "$2000-4000"),
+    ("$2,100", "$2000-4000"),
+    ("$900", "$500-1000"),
+    ("$100", "$0-250"),
+    ("Luxury", "luxury"),
+])
+def test_budget_band(budget, band):
+    assert budget_band(budget) == band
+
+
+@pytest.mark.parametrize("start, bucket", [
+    (datetime(2025, 7, 1), "2025-summer"),
+    (datetime(2025, 3, 1), "2025-spring"),
+    (datetime(2025, 12, 20), "2026-winter"),
+    (datetime(2026, 1, 5), "2026-winter"),
+])
+def test_date_bucket(start, bucket):
+    assert date_bucket(start) == bucket
+
+
+def test_requests_that_differ_only_in_wording_share_a_key():
+    key = canonical_key(preferences())
+
+    assert canonical_key(preferences(
+        budget="2000 USD", destination=" paris ", interests=["food", "ART"], start_date=datetime(2025, 8, 15),
+        start_location="Berlin")) == key
+    assert canonical_key(preferences(duration=4)) != key
+    assert canonical_key(preferences(interests=["Art"])) != key
+    assert canonical_key(preferences(), kind="json") != key
+
+
+def test_preference_differences_lists_the_reworded_fields():
+    stored = preferences().model_dump(mode="json")
+
+    differences = preference_differences(stored, preferences(budget="2000 USD", interests=["Food", "Art"]))
+
+    assert differences == {"budget": ("$2000", "2000 USD")}
+
+
+def test_stored_itinerary_needs_a_body():
+    entry = {"body": "Day 1: Louvre", "preferences": {}}
+
+    assert stored_itinerary(json.dumps(entry)) == entry
+    assert stored_itinerary(json.dumps({"body": ""})) is None
+    assert stored_itinerary("not json") is None
+    assert stored_itinerary(None) is None
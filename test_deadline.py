@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.deadline import (DeadlineExceeded, check_deadline, current_deadline, deadline_after, deadline_at,
+                            remaining, stage_deadline, stage_timeout)
+
+
+def test_without_a_deadline_nothing_is_limited():
+    assert current_deadline() is None
+    assert remaining() is None
+    assert stage_timeout(30) == 30
+    check_deadline()
+    with stage_deadline(0.5) as deadline:
+        assert deadline is None
+
+
+def test_a_nested_deadline_only_tightens_the_current_one():
+    with deadline_after(10) as outer:
+        with deadline_after(60) as looser:
+            assert looser == outer
+        with deadline_after(1) as tighter:
+            assert tighter < outer
+            assert current_deadline() == tighter
+        assert current_deadline() == outer
+    assert current_deadline() is None
+
+
+def test_step_timeouts_take_a_share_of_the_time_left():
+    with deadline_after(10):
+        assert stage_timeout(30) == pytest.approx(10, abs=0.1)
+        assert stage_timeout(30, share=0.5) == pytest.approx(5, abs=0.1)
+        assert stage_timeout(2) == 2
+        with stage_deadline(0.25):
+            assert remaining() == pytest.approx(2.5, abs=0.1)
+
+
+def test_a_passed_deadline_stops_the_next_step():
+    with deadline_at(time.monotonic() - 1):
+        assert stage_timeout(30) == 0.0
+        with pytest.raises(DeadlineExceeded, match="before parsing"):
+            check_deadline("parsing")
+
+
+def test_the_deadline_follows_the_request_into_tasks():
+    async def step():
+        return remaining()
+
+    async def main():
+        with deadline_after(5):
+            return await asyncio.create_task(step())
+
+    assert asyncio.run(main()) == pytest.approx(5, abs=0.5)
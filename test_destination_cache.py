@@ -0,0 +1,52 @@
+from utils.travel_agent import FALLBACK_DESTINATION_INFO, DestinationCache
+
+INFO = {"attractions": ["Louvre"], "hidden_gems": [], "restaurants": ["Le Procope"], "events": []}
+
+
+def test_entries_are_found_under_any_spelling_of_the_destination():
+    cache = DestinationCache(path=None)
+    cache.set("  Paris ", INFO)
+
+    assert cache.get("PARIS") == INFO
+    assert cache.get("Rome") is None
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["disk_entries"]) == (1, 1, 0)
+
+
+def test_the_disk_tier_outlives_the_process_and_refills_memory(tmp_path):
+    path = str(tmp_path / "destination_info.sqlite3")
+    DestinationCache(path=path).set("Paris", INFO)
+
+    cache = DestinationCache(path=path)
+
+    assert cache.get("Paris") == INFO
+    assert cache.get("Paris") == INFO
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_expired_entries_are_misses_in_both_tiers(tmp_path):
+    cache = DestinationCache(path=str(tmp_path / "destination_info.sqlite3"))
+    cache.set("Paris", INFO, ttl_seconds=-1)
+
+    assert cache.get("Paris") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_the_memory_tier_evicts_its_least_recently_used_entry():
+    cache = DestinationCache(path=None, max_memory_entries=2)
+    for destination in ("Paris", "Rome", "Lisbon"):
+        cache.get("Paris")
+        cache.set(destination, INFO)
+
+    assert cache.get("Rome") is None
+    assert cache.get("Paris") == INFO
+    assert cache.stats()["memory_evictions"] == 1
+
+
+def test_placeholder_info_is_not_cached():
+    cache = DestinationCache(path=None)
+    cache.set("Paris", FALLBACK_DESTINATION_INFO)
+    cache.set("Rome", {"attractions": [], "hidden_gems": [], "restaurants": [], "events": []})
+
+    assert cache.stats()["writes"] == 0
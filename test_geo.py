@@ -0,0 +1,76 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from utils.geo import cluster, haversine_matrix, order_route, plan_routes, walking_budget_km
+from utils.preferences import walking_amount
+
+# Two tight groups of places a kilometre apart; five days leave a group empty on a plain capacity pass.
+CROWDED = np.array([
+    [48.8205, 2.3493], [48.8296, 2.3507], [48.8206, 2.3499], [48.8201, 2.3482],
+    [48.8302, 2.3541], [48.8215, 2.3484], [48.8296, 2.3525], [48.8314, 2.3535],
+])
+
+
+def test_cluster_keeps_nearby_points_together_in_equal_groups():
+    rng = np.random.default_rng(0)
+    west = np.array([48.85, 2.29]) + rng.normal(0, 0.002, (6, 2))
+    east = np.array([48.85, 2.40]) + rng.normal(0, 0.002, (6, 2))
+
+    labels = cluster(np.vstack((west, east)), 2)
+
+    assert len(set(labels[:6])) == 1
+    assert len(set(labels[6:])) == 1
+    assert labels[0] != labels[6]
+
+
+@pytest.mark.parametrize("groups", range(1, len(CROWDED) + 1))
+def test_cluster_gives_every_group_a_point_and_no_group_too_many(groups):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        labels = cluster(CROWDED, groups)
+
+    sizes = np.bincount(labels, minlength=groups)
+    assert len(sizes) == groups
+    assert sizes.min() >= 1
+    assert sizes.max() <= -(-len(CROWDED) // groups)
+
+
+def test_order_route_walks_a_line_end_to_end():
+    line = np.array([[48.85, 2.30 + 0.01 * step] for step in (3, 0, 4, 1, 2)])
+
+    route = order_route(haversine_matrix(line))
+
+    assert route in ([1, 3, 4, 0, 2], [2, 0, 4, 3, 1])
+
+
+@pytest.mark.parametrize("tolerance, km", [
+    ("2-4 km", 3.0),
+    ("3 kilometres", 3.0),
+    ("1 mile", 1.609),
+    ("4 hours", 8.0),
+    ("90 minutes", 3.0),
+    ("Minimal (under 1 hour)", 2.0),
+    (None, 6.0),
+])
+def test_walking_budget_km(tolerance, km):
+    assert walking_budget_km(tolerance) == pytest.approx(km)
+
+
+def test_walking_amount_reads_ranges_and_units():
+    assert walking_amount("happy to walk 2 to 3 hrs a day") == (2.0, 3.0, "hours")
+    assert walking_amount("walk about 5 km") == (5.0, None, "km")
+    assert walking_amount("love walking") is None
+
+
+def test_plan_routes_spreads_known_places_over_the_days():
+    places = ["Louvre Museum", "Eiffel Tower", "Notre-Dame Cathedral", "Arc de Triomphe",
+              "Musee d'Orsay", "Sainte-Chapelle", "Somewhere Unknown"]
+
+    routes = plan_routes("Paris", places, 2, "3 hours")
+
+    assert routes is not None and len(routes) == 2
+    planned = [stop for route in routes for stop in route.stops]
+    assert "Somewhere Unknown" not in planned
+    assert len(planned) == len(set(planned)) == 6
@@ -0,0 +1,50 @@
+import pytest
+
+from utils.hedging import HedgePolicy, hedge_policy_from_env
+
+
+def test_a_stage_is_hedged_at_its_percentile_once_it_has_enough_samples():
+    policy = HedgePolicy(percentile=0.9, min_samples=10, min_delay_s=0.1)
+
+    for seconds in range(1, 10):
+        policy.observe("itinerary", seconds)
+    assert policy.delay("itinerary") is None
+    policy.observe("itinerary", 10)
+
+    assert policy.delay("itinerary") == 10
+    assert policy.delay("refinement") is None
+
+
+def test_the_delay_never_drops_below_the_minimum():
+    policy = HedgePolicy(min_samples=1, min_delay_s=0.5)
+    policy.observe("preference_parsing", 0.01)
+
+    assert policy.delay("preference_parsing") == 0.5
+
+
+def test_hedges_are_capped_by_share_of_calls_and_in_flight():
+    policy = HedgePolicy(max_fraction=0.1, max_in_flight=1)
+    assert not policy.try_start()
+    for _ in range(20):
+        policy.observe("itinerary", 1.0)
+
+    assert policy.try_start()
+    assert not policy.try_start()
+    policy.finish(won=True)
+    assert policy.try_start()
+    policy.finish(won=False)
+    assert not policy.try_start()
+
+    assert policy.stats() == {"calls": 20, "hedged": 2, "won": 1, "skipped": 3, "in_flight": 0}
+
+
+@pytest.mark.parametrize("value, enabled", [("1", True), ("yes", True), ("0", False), ("", False)])
+def test_hedging_is_switched_on_from_the_environment(monkeypatch, value, enabled):
+    monkeypatch.setenv("TRAVEL_AGENT_HEDGE", value)
+    monkeypatch.setenv("TRAVEL_AGENT_HEDGE_MAX_FRACTION", "0.2")
+
+    policy = hedge_policy_from_env()
+
+    assert (policy is not None) == enabled
+    if enabled:
+        assert policy.max_fraction == 0.2
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from utils.jobs import CANCELLED, DONE, FAILED, QUEUED, JobQueue, JobQueueFull
+
+
+def wait_for_status(jobs, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.status(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {jobs.status(job_id)['status']}")
+
+
+@pytest.fixture
+def jobs():
+    queue = JobQueue(max_workers=1, max_queued=2)
+    yield queue
+    queue.shutdown()
+
+
+def test_a_job_reports_progress_and_its_result(jobs):
+    def run(job):
+        job.add_partial("Day 1")
+        job.add_partial(", Day 2")
+        return job.partial_text()
+
+    job = wait_for_status(jobs, jobs.submit(run), (DONE,))
+
+    assert job["result"] == "Day 1, Day 2"
+    assert job["partial"] == "Day 1, Day 2"
+    assert jobs.stats()["running"] == 0
+
+
+def test_a_cancelled_job_stops_at_its_next_progress_report(jobs):
+    started, reported = threading.Event(), []
+
+    def run(job):
+        started.set()
+        while True:
+            job.add_partial(".")
+            reported.append(1)
+            time.sleep(0.01)
+
+    job_id = jobs.submit(run)
+    assert started.wait(5)
+    assert jobs.cancel(job_id)
+    wait_for_status(jobs, job_id, (CANCELLED,))
+    count = len(reported)
+    time.sleep(0.05)
+
+    assert len(reported) == count
+    assert jobs.stats()["running"] == 0
+    assert not jobs.cancel(job_id)
+
+
+def test_a_queued_job_is_cancelled_without_running(jobs):
+    release, ran = threading.Event(), []
+    first = jobs.submit(lambda job: release.wait(5))
+    second = jobs.submit(lambda job: ran.append(1))
+
+    assert jobs.status(second)["status"] == QUEUED
+    assert jobs.cancel(second)
+    release.set()
+    wait_for_status(jobs, first, (DONE,))
+
+    assert jobs.status(second)["status"] == CANCELLED
+    assert ran == []
+
+
+def test_a_full_queue_refuses_new_jobs(jobs):
+    release = threading.Event()
+    jobs.submit(lambda job: release.wait(5))
+    wait = time.monotonic() + 5
+    while jobs.stats()["running"] == 0 and time.monotonic() < wait:
+        time.sleep(0.01)
+    jobs.submit(lambda job: None)
+    jobs.submit(lambda job: None)
+
+    with pytest.raises(JobQueueFull):
+        jobs.submit(lambda job: None)
+    assert jobs.stats()["rejected"] == 1
+    release.set()
+
+
+def test_a_job_failing_outside_exception_still_finishes(jobs):
+    def run(job):
+        raise KeyboardInterrupt
+
+    job = wait_for_status(jobs, jobs.submit(run), (FAILED,))
+
+    assert job["error"] == "KeyboardInterrupt"
+    assert jobs.stats()["running"] == 0
+    assert wait_for_status(jobs, jobs.submit(lambda job: "next"), (DONE,))["result"] == "next"
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from utils.legs import leg_context, leg_days, plan_legs
+from utils.travel_agent import ItineraryStore, TravelAgent, TravelPreferences
+
+HEADINGS = [
+    "Day 1: Arrival and Old Town",
+    "Day 1 (May 1): Arrival and Old Town",
+    "Day 1 — Arrival and Old Town",
+    "**Day 1 - Arrival and Old Town**",
+    "### Day 1 (Friday, May 1)",
+    "Day 1, Friday",
+]
+
+
+def leg_text(heading):
+    second = heading.replace("1", "2")
+    return f"""Here is your plan for Rome.
+
+{heading}
+Morning:
+- 9:00 AM: Colosseum - guided tour (Cost: $25)
+Evening:
+- 7:30 PM: Dinner in Trastevere
+
+{second}
+Morning:
+- 9:00 AM: Vatican Museums
+"""
+
+
+@pytest.fixture(scope="module")
+def agent():
+    return TravelAgent("test-key")
+
+
+@pytest.fixture(scope="module")
+def plans():
+    preferences = TravelPreferences(
+        budget="$2000", duration=5, start_date=datetime(2026, 5, 1), end_date=datetime(2026, 5, 6),
+        start_location="London", destination="Italy", purpose="Leisure",
+        legs=[{"destination": "Florence", "days": 2}, {"destination": "Rome", "days": 3}],
+    )
+    return plan_legs(preferences)
+
+
+@pytest.fixture(scope="module")
+def plan(plans):
+    return plans[1]
+
+
+@pytest.mark.parametrize("heading", HEADINGS)
+def test_leg_days_keep_the_generated_plan(agent, plan, heading):
+    days = leg_days(plan, agent._parse_leg(leg_text(heading), "text"))
+
+    assert [day.number for day in days] == [3, 4, 5]
+    assert days[0].title == "Transfer from Florence to Rome"
+    assert days[1].segments[0].activities[0].place == "Colosseum"
+    assert days[2].segments[0].activities[0].place == "Vatican Museums"
+
+
+def test_a_leg_without_readable_days_is_rejected(agent):
+    with pytest.raises(ValueError):
+        agent._parse_leg("Rome is lovely in May. Visit the Colosseum and the Vatican.", "text")
+
+
+def test_a_stored_leg_is_not_reused_as_a_standalone_trip(plans, plan):
+    agent = TravelAgent("test-key", itinerary_store=ItineraryStore(path=None))
+    context = leg_context(plan, plans)
+    agent._store_itinerary(plan.preferences, leg_text("Day 1: Arrival"), context=context)
+
+    assert context == "leg 2/2: Florence > Rome"
+    assert agent._reuse_itinerary(plan.preferences) == ""
+    assert agent._reuse_itinerary(plan.preferences, context=context).startswith("Here is your plan for Rome.")
@@ -0,0 +1,65 @@
+import time
+
+from utils.memory import ConversationMemory
+from utils.tokens import CHARS_PER_TOKEN
+
+
+def turn(tokens, text="x"):
+    return text * (tokens * CHARS_PER_TOKEN)
+
+
+def test_a_session_keeps_its_itinerary_summary_and_turns():
+    memory = ConversationMemory()
+    memory.set_itinerary("s1", "Day 1: Louvre")
+    memory.add_turn("s1", "more food")
+    memory.set_summary("s1", "Wants a slower pace.")
+
+    assert memory.context("s1") == {"itinerary": "Day 1: Louvre", "summary": "Wants a slower pace.",
+                                    "turns": ["more food"]}
+    assert memory.context("s2")["turns"] == []
+    assert memory.get_summary("unknown") == ""
+
+
+def test_turns_over_the_token_cap_are_handed_back_oldest_first():
+    memory = ConversationMemory(max_history_tokens=100)
+    memory.set_summary("s1", turn(20))
+
+    assert memory.add_turn("s1", turn(40, "a")) == []
+    assert memory.add_turn("s1", turn(30, "b")) == []
+    assert memory.add_turn("s1", turn(30, "c")) == [turn(40, "a")]
+    assert memory.add_turn("s1", turn(500, "d")) == [turn(30, "b"), turn(30, "c")]
+    assert memory.context("s1")["turns"] == [turn(500, "d")]
+    assert memory.stats()["summarized_turns"] == 3
+
+
+def test_the_least_recently_used_session_is_evicted():
+    memory = ConversationMemory(max_sessions=2)
+    memory.set_itinerary("s1", "one")
+    memory.set_itinerary("s2", "two")
+    memory.context("s1")
+    memory.set_itinerary("s3", "three")
+
+    assert memory.context("s1")["itinerary"] == "one"
+    assert memory.context("s2")["itinerary"] == ""
+    assert memory.stats()["evicted"] >= 1
+
+
+def test_idle_sessions_expire():
+    memory = ConversationMemory(idle_ttl_s=0.01)
+    memory.set_itinerary("s1", "one")
+    time.sleep(0.02)
+    memory.set_itinerary("s2", "two")
+
+    assert memory.stats()["expired"] == 1
+    assert memory.stats()["sessions"] == 1
+
+
+def test_clear_forgets_one_session_or_all():
+    memory = ConversationMemory()
+    for session_id in ("s1", "s2", "s3"):
+        memory.set_itinerary(session_id, session_id)
+
+    memory.clear("s1")
+    assert memory.stats()["sessions"] == 2
+    memory.clear()
+    assert memory.stats()["sessions"] == 0
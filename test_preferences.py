@@ -0,0 +1,48 @@
+import pytest
+
+from utils.preferences import extract_preferences, missing_fields
+
+
+def test_a_full_description_is_resolved_without_the_model():
+    preferences = extract_preferences(
+        "I'm vegetarian and love museums and street food, happy to walk 2-3 hours a day, budget around $2,500")
+
+    assert preferences == {
+        "dietary_preferences": ["Vegetarian"],
+        "specific_interests": ["Food & Dining", "Art & Museums"],
+        "walking_tolerance": "2-3 hours",
+        "budget": "$2500",
+    }
+    assert missing_fields(preferences) == ()
+
+
+@pytest.mark.parametrize("text, budget", [
+    ("Budget: 1.5k euros", "€1500"),
+    ("budget between 1000 and 2000 USD", "$1000-2000"),
+    ("spend up to £800", "Up to £800"),
+    ("a luxury trip", "Luxury"),
+    ("5 days for 2 people", None),
+])
+def test_budget(text, budget):
+    assert extract_preferences(text).get("budget") == budget
+
+
+def test_decimal_amounts_are_not_split_into_sentences():
+    assert extract_preferences("I can walk 1.5 hours. Vegan.")["walking_tolerance"] == "1.5 hours"
+
+
+def test_negated_and_contradictory_mentions_are_left_to_the_model():
+    assert extract_preferences("Vegan, no museums, I love hiking")["specific_interests"] == ["Nature & Outdoors"]
+    assert extract_preferences("love museums but no museums please") == {}
+
+
+def test_no_restrictions_stands_alone():
+    assert extract_preferences("no dietary restrictions")["dietary_preferences"] == ["None"]
+    assert extract_preferences("no restrictions, but halal")["dietary_preferences"] == ["Halal"]
+
+
+def test_unmentioned_fields_are_missing():
+    preferences = extract_preferences("moderate walking")
+
+    assert preferences == {"walking_tolerance": "Moderate (2-4 hours)"}
+    assert missing_fields(preferences) == ("dietary_preferences", "specific_interests", "budget")
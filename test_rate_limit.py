@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.rate_limit import RateLimiter, backoff_delay
+
+
+def test_no_more_calls_than_the_concurrency_limit_run_at_once():
+    limiter = RateLimiter(max_concurrency=2)
+
+    assert limiter.try_acquire(10)
+    assert limiter.try_acquire(10)
+    assert not limiter.try_acquire(10)
+    limiter.release(10, 10)
+    assert limiter.try_acquire(10)
+    assert limiter.stats()["in_flight"] == 2
+
+
+def test_a_waiting_call_starts_when_a_slot_is_released():
+    limiter = RateLimiter(max_concurrency=1)
+    assert limiter.acquire(10)
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire(10, timeout=5)))
+    waiter.start()
+
+    limiter.release(10, 10)
+    waiter.join(5)
+
+    assert acquired == [True]
+    assert limiter.stats()["waited"] == 1
+
+
+def test_throttling_halves_the_limit_and_successes_grow_it_back():
+    limiter = RateLimiter(max_concurrency=8, min_concurrency=1)
+
+    for _ in range(3):
+        limiter.try_acquire(10)
+        limiter.release(10, throttled=True)
+    assert limiter.stats()["concurrency_limit"] == 1.0
+    limiter.try_acquire(10)
+    limiter.release(10, throttled=True)
+    assert limiter.stats()["concurrency_limit"] == 1.0
+
+    for _ in range(10):
+        limiter.try_acquire(10)
+        limiter.release(10)
+    stats = limiter.stats()
+    assert 1.0 < stats["concurrency_limit"] <= 8
+    assert stats["throttled"] == 4
+
+
+def test_requests_beyond_the_quota_time_out():
+    # One request per second, with no burst beyond a single request.
+    limiter = RateLimiter(requests_per_minute=60, utilization=1, burst_seconds=1)
+
+    assert limiter.acquire(1, timeout=0.1)
+    limiter.release(1, 1)
+    assert not limiter.acquire(1, timeout=0.05)
+    assert not asyncio.run(limiter.aacquire(1, timeout=0.05))
+
+
+def test_tokens_used_beyond_the_reservation_are_charged():
+    # 60 tokens a second, so the bucket holds 60 tokens.
+    limiter = RateLimiter(tokens_per_minute=3600, utilization=1, burst_seconds=1)
+
+    assert limiter.try_acquire(10)
+    limiter.release(10, used_tokens=60)
+    assert not limiter.try_acquire(10)
+
+
+@pytest.mark.parametrize("attempt, ceiling", [(0, 1.0), (2, 4.0), (10, 30.0)])
+def test_backoff_delay_stays_under_its_ceiling(attempt, ceiling):
+    assert all(0 <= backoff_delay(attempt) <= ceiling for _ in range(50))
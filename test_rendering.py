@@ -0,0 +1,32 @@
+from utils.itinerary import itinerary_from_text
+from utils.rendering import render_day, render_itinerary_text, render_partial_text
+
+STREAMED = """# Lisbon in 3 days
+
+Day 1: Alfama
+Morning:
+- 9:00 AM: Sao Jorge Castle (Cost: €15)
+
+Day 2: Belem
+Morning:
+- 10:00 AM: Jeronimos Monastery
+
+Day 3: Sintra
+Morning:
+- 9:30 AM: Pena Pal"""
+
+
+def test_partial_text_renders_finished_days_once_and_skips_the_text_cache():
+    render_itinerary_text.cache_clear()
+    render_day.cache_clear()
+    cut = STREAMED.index("Day 3")
+
+    for end in range(cut, len(STREAMED) + 1):
+        html = render_partial_text(STREAMED[:end])
+
+    assert render_itinerary_text.cache_info().currsize == 0
+    assert render_day.cache_info().misses == 2
+    finished = itinerary_from_text(STREAMED).days[:2]
+    assert all(render_day(day) in html for day in finished)
+    assert "<h1>Lisbon in 3 days</h1>" in html
+    assert "Pena Pal" in html
@@ -0,0 +1,54 @@
+import pytest
+
+from utils.travel_agent import MemoryResponseCache, ResponseCache, SQLiteResponseCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(max_bytes):
+        if request.param == "memory":
+            return MemoryResponseCache(max_bytes=max_bytes)
+        return SQLiteResponseCache(str(tmp_path / "responses.sqlite3"), max_bytes=max_bytes)
+    return make
+
+
+def test_a_response_is_returned_for_its_key(make_cache):
+    cache = make_cache(1024)
+    cache.set("a", "Day 1: Louvre")
+    cache.set("a", "Day 1: Orsay")
+
+    assert cache.get("a") == "Day 1: Orsay"
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == len("Day 1: Orsay")
+
+
+def test_the_least_recently_used_responses_go_once_the_cache_is_full(make_cache):
+    cache = make_cache(10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+    cache.set("c", "cccc")
+    cache.set("huge", "x" * 11)
+
+    assert cache.get("b") is None
+    assert cache.get("huge") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_the_sqlite_cache_is_shared_through_its_file(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    SQLiteResponseCache(path).set("a", "Day 1: Louvre")
+
+    assert SQLiteResponseCache(path).get("a") == "Day 1: Louvre"
+
+
+def test_a_cache_must_implement_the_whole_interface():
+    class GetOnly(ResponseCache):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
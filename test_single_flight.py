@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.deadline import DeadlineExceeded, check_deadline, deadline_after
+from utils.jobs import CANCELLED, DONE, JobQueue, check_cancelled
+from utils.single_flight import SingleFlight
+
+
+def wait_for_status(jobs, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.status(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {jobs.status(job_id)['status']}")
+
+
+def test_concurrent_calls_for_a_key_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions, results = [], []
+
+    def lookup():
+        executions.append(1)
+        release.wait(5)
+        return "destination info"
+
+    callers = [threading.Thread(target=lambda: results.append(flight.do("Paris", lookup))) for _ in range(4)]
+    for caller in callers:
+        caller.start()
+    while flight.stats()["calls"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for caller in callers:
+        caller.join(5)
+
+    assert results == ["destination info"] * 4
+    assert executions == [1]
+    assert flight.stats() == {"calls": 4, "executions": 1, "coalesced": 3, "handed_off": 0, "in_flight": 0}
+    assert flight.do("Paris", lambda: "fresh") == "fresh"
+
+
+def test_waiting_callers_get_the_call_s_error():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def lookup():
+        started.set()
+        release.wait(5)
+        raise ValueError("no such destination")
+
+    def caller():
+        try:
+            flight.do("Atlantis", lookup)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=caller)
+    follower.start()
+    while flight.stats()["coalesced"] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert errors == ["no such destination"] * 2
+    assert flight.stats()["executions"] == 1
+
+
+def test_async_callers_share_one_execution():
+    flight = SingleFlight()
+    executions = []
+
+    async def lookup():
+        executions.append(1)
+        await asyncio.sleep(0.05)
+        return "destination info"
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("Paris", lookup) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["destination info"] * 3
+    assert executions == [1]
+    with pytest.raises(ZeroDivisionError):
+        flight.do("Rome", lambda: 1 / 0)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelling_one_coalesced_job_leaves_the_other_running():
+    flight = SingleFlight()
+    jobs = JobQueue(max_workers=2)
+    started = threading.Event()
+    executions = []
+
+    def lookup():
+        executions.append(1)
+        started.set()
+        for _ in range(20):
+            check_cancelled()
+            time.sleep(0.01)
+        return "destination info"
+
+    first = jobs.submit(lambda job: flight.do("Paris", lookup))
+    assert started.wait(5)
+    second = jobs.submit(lambda job: flight.do("Paris", lookup))
+    time.sleep(0.05)
+    jobs.cancel(first)
+
+    assert wait_for_status(jobs, first, (CANCELLED,))["status"] == CANCELLED
+    result = wait_for_status(jobs, second, (DONE, CANCELLED))
+    assert result["status"] == DONE
+    assert result["result"] == "destination info"
+    assert len(executions) == 2
+    assert flight.stats()["handed_off"] == 1
+    jobs.shutdown()
+
+
+def test_a_leader_out_of_time_hands_the_call_to_a_caller_with_time_left():
+    flight = SingleFlight()
+    started = threading.Event()
+    results = {}
+
+    def call():
+        started.set()
+        for _ in range(20):
+            check_deadline("call")
+            time.sleep(0.01)
+        return "itinerary"
+
+    def hurried():
+        with deadline_after(0.05):
+            try:
+                results["hurried"] = flight.do("prompt", call)
+            except DeadlineExceeded:
+                results["hurried"] = "deadline"
+
+    leader = threading.Thread(target=hurried)
+    leader.start()
+    assert started.wait(5)
+    with deadline_after(30):
+        results["patient"] = flight.do("prompt", call)
+    leader.join()
+
+    assert results == {"hurried": "deadline", "patient": "itinerary"}
+    assert flight.stats()["handed_off"] == 1
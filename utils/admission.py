@@ -0,0 +1,83 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from utils.deadline import DeadlineExceeded
+from utils.metrics import Metrics
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request arrives while the wait queue is full.
+
+    ``retry_after_s`` estimates when a slot is likely to be free.
+    """
+
+    def __init__(self, message: str, retry_after_s: float):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionControl:
+    """Bound the work one server process takes on.
+
+    At most ``max_in_flight`` requests run at once and up to ``max_queued``
+    more wait for a slot in arrival order. A request that finds the queue
+    full is rejected straight away with ``Overloaded``, and one whose
+    deadline passes while it waits gives up with ``DeadlineExceeded``
+    without running. Rejecting early keeps latency bounded under overload;
+    the client (or a load balancer) can retry elsewhere.
+
+    Used from a single event loop.
+    """
+
+    def __init__(self, max_in_flight: int = 8, max_queued: int = 32, metrics: Optional[Metrics] = None):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._queued = 0
+        self._run_ewma: Optional[float] = None
+        self._counters = {"admitted": 0, "rejected": 0, "expired": 0}
+
+    def retry_after_s(self) -> float:
+        """Rough time until a queued request would start: the queue drained at the observed run time."""
+        run_s = self._run_ewma or 1.0
+        return max(1.0, math.ceil(run_s * (self._queued + 1) / self.max_in_flight))
+
+    @asynccontextmanager
+    async def admit(self, deadline: float, label: str = "request") -> AsyncIterator[None]:
+        """Hold a slot for the block; ``deadline`` is a ``time.monotonic()`` timestamp."""
+        if self._slots.locked() and self._queued >= self.max_queued:
+            self._counters["rejected"] += 1
+            self.metrics.increment("admission", outcome="rejected", label=label)
+            raise Overloaded(f"{self._queued} requests are already waiting", self.retry_after_s())
+        waited = time.monotonic()
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._counters["expired"] += 1
+            self.metrics.increment("admission", outcome="expired", label=label)
+            raise DeadlineExceeded("deadline passed while waiting for a worker") from None
+        finally:
+            self._queued -= 1
+        started = time.monotonic()
+        self._in_flight += 1
+        self._counters["admitted"] += 1
+        self.metrics.observe("admission_wait", started - waited, label=label)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            elapsed = time.monotonic() - started
+            self._run_ewma = elapsed if self._run_ewma is None else 0.8 * self._run_ewma + 0.2 * elapsed
+
+    def stats(self) -> Dict[str, float]:
+        stats = dict(self._counters)
+        stats["in_flight"] = self._in_flight
+        stats["queued"] = self._queued
+        return stats
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import math
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.preferences import extract_preferences
+
+# Budgets are banded on a doubling scale, so "$2000" and "2000 USD" (and
+# "$2100") share a band while "$900" and "$4000" do not.
+BUDGET_BAND_BASE = 250
+
+_BUDGET_RE = re.compile(r"^(up to )?([^\d]*)(\d+(?:\.\d+)?)(?:-(\d+(?:\.\d+)?))?$")
+_SEASONS = ("winter", "winter", "spring", "spring", "spring", "summer",
+            "summer", "summer", "autumn", "autumn", "autumn", "winter")
+
+
+def _text(value) -> str:
+    return " ".join(str(value or "").casefold().split())
+
+
+def _sorted_unique(values) -> List[str]:
+    """Case- and order-insensitive form of a multi-select list; "None" means no entries."""
+    cleaned = {_text(value) for value in values or []}
+    cleaned.discard("")
+    cleaned.discard("none")
+    return sorted(cleaned)
+
+
+def budget_band(budget: str) -> str:
+    """Band a free-text budget: "$2000", "2000 USD" and "$2,100" all give "$2000-4000".
+
+    Ranges are banded by their midpoint and "up to" amounts by the amount.
+    Levels ("Low", "Luxury") and budgets that cannot be parsed are kept as
+    normalized text.
+    """
+    resolved = extract_preferences(f"budget: {budget}").get("budget")
+    if not resolved:
+        return _text(budget)
+    match = _BUDGET_RE.match(resolved.casefold())
+    if not match:
+        return _text(resolved)
+    _, currency, low, high = match.groups()
+    amount = (float(low) + float(high)) / 2 if high else float(low)
+    if amount < BUDGET_BAND_BASE:
+        return f"{currency}0-{BUDGET_BAND_BASE}"
+    lower = BUDGET_BAND_BASE * 2 ** int(math.log2(amount / BUDGET_BAND_BASE))
+    return f"{currency}{lower}-{lower * 2}"
+
+
+def date_bucket(start: datetime) -> str:
+    """Season of the trip start, e.g. "2025-summer"; December counts towards the next winter."""
+    year = start.year + 1 if start.month == 12 else start.year
+    return f"{year}-{_SEASONS[start.month - 1]}"
+
+
+def canonical_preferences(preferences) -> Dict:
+    """The parts of a ``TravelPreferences`` that shape the itinerary, in a normalized form.
+
+    Requests that differ only in budget wording, the order of list entries,
+    letter case or a start date within the same season map to the same dict.
+    Fields that never reach the itinerary prompts (start location, cuisine and
+    amenity picks) are left out.
+    """
+    return {
+        "destination": _text(preferences.destination),
+        "duration": preferences.duration,
+        "budget": budget_band(preferences.budget),
+        "season": date_bucket(preferences.start_date),
+        "purpose": _text(preferences.purpose),
+        "interests": _sorted_unique(preferences.interests),
+        "dietary_preferences": _sorted_unique(preferences.dietary_preferences),
+        "mobility_requirements": _text(preferences.mobility_requirements),
+        "walking_tolerance": _text(preferences.walking_tolerance),
+        "accommodation_type": _text(preferences.accommodation_type),
+        "hidden_gems_preference": bool(preferences.hidden_gems_preference),
+    }
+
+
+def canonical_key(preferences, kind: str = "text") -> str:
+    """Hex digest of ``canonical_preferences``; ``kind`` separates text and JSON itineraries."""
+    payload = json.dumps({"kind": kind, **canonical_preferences(preferences)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def preference_differences(stored: Dict, preferences) -> Dict[str, Tuple[str, str]]:
+    """Prompt-visible fields whose wording differs between stored and requested preferences.
+
+    ``stored`` is a ``model_dump(mode="json")`` of the preferences the stored
+    itinerary was generated for. Returns field -> (stored, requested) as text.
+    """
+    requested = preferences.model_dump(mode="json")
+    differences = {}
+    for field in ("budget", "start_date", "end_date", "interests", "dietary_preferences", "walking_tolerance"):
+        before, after = stored.get(field), requested.get(field)
+        if isinstance(after, list):
+            before, after = ", ".join(sorted(before or [])), ", ".join(sorted(after))
+        if field.endswith("_date"):
+            before, after = (before or "")[:10], (after or "")[:10]
+        if _text(before) != _text(after):
+            differences[field] = (str(before or ""), str(after or ""))
+    return differences
+
+
+def stored_itinerary(text: Optional[str]) -> Optional[Dict]:
+    """Decode an itinerary store entry: ``{"body": ..., "preferences": ...}``, or ``None``."""
+    if not text:
+        return None
+    try:
+        entry = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict) or not entry.get("body"):
+        return None
+    return entry
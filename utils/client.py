@@ -0,0 +1,132 @@
+from typing import Dict, Iterator, Optional
+
+import requests
+
+from utils.itinerary import Itinerary, itinerary_from_dict
+from utils.jobs import check_cancelled
+
+# Extra time given to the HTTP call on top of the request's own deadline,
+# so the server's 504 arrives before the client gives up.
+TIMEOUT_MARGIN_S = 5
+
+
+class ApiError(RuntimeError):
+    def __init__(self, message: str, status: int, retry_after_s: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+    @property
+    def overloaded(self) -> bool:
+        return self.status == 429
+
+
+def _from_dict(data: Dict) -> Itinerary:
+    """Inverse of ``Itinerary.to_dict``, header included."""
+    return itinerary_from_dict(data, tuple(data.get("header") or ()))
+
+
+class _RemoteMemory:
+    """The part of ``ConversationMemory`` the app uses, forwarded to the server."""
+
+    def __init__(self, client: "TravelAgentClient"):
+        self._client = client
+
+    def clear(self, session_id: str) -> None:
+        # Best effort: a session left behind expires on the server after its idle TTL.
+        try:
+            self._client._request("DELETE", f"/v1/sessions/{session_id}", timeout_s=10)
+        except ApiError:
+            pass
+
+
+class TravelAgentClient:
+    """Drop-in for the ``TravelAgent`` methods the app uses, served by ``server.py``.
+
+    One pooled HTTP session is shared by every call, so connections to the
+    server are reused. Errors from the server raise ``ApiError``; a 429
+    (``overloaded``) carries the server's Retry-After.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 16):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.conversation_memory = _RemoteMemory(self)
+
+    def _request(self, method: str, path: str, body: Optional[Dict] = None, timeout_s: float = 60,
+                 stream: bool = False) -> requests.Response:
+        try:
+            response = self.session.request(method, self.base_url + path, json=body, stream=stream,
+                                            timeout=timeout_s + TIMEOUT_MARGIN_S)
+        except requests.RequestException as e:
+            raise ApiError(f"travel agent API unreachable: {e}", status=0) from e
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("error", response.reason)
+            except ValueError:
+                message = response.reason
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                message = f"{message}; retry in {retry_after}s"
+            raise ApiError(message, response.status_code, float(retry_after) if retry_after else None)
+        return response
+
+    def _post(self, path: str, body: Dict, timeout_s: Optional[float]) -> Dict:
+        if timeout_s is not None:
+            body["timeout_s"] = timeout_s
+        return self._request("POST", path, body, timeout_s or 180).json()
+
+    def gather_preferences(self, user_input: str, timeout_s: Optional[float] = None) -> Dict:
+        return self._post("/v1/preferences", {"user_input": user_input}, timeout_s)
+
+    def generate_itinerary(self, preferences, planning_mode: str = "single",
+                           timeout_s: Optional[float] = None) -> str:
+        body = {"preferences": preferences.model_dump(mode="json"), "planning_mode": planning_mode}
+        return self._post("/v1/itinerary", body, timeout_s)["itinerary"]
+
+    def generate_structured_itinerary(self, preferences, timeout_s: Optional[float] = None) -> Itinerary:
+        body = {"preferences": preferences.model_dump(mode="json"), "format": "json"}
+        return _from_dict(self._post("/v1/itinerary", body, timeout_s)["structured"])
+
+    def generate_itinerary_stream(self, preferences, timeout_s: float = 180) -> Iterator[str]:
+        """Yield the itinerary as the server streams it.
+
+        Raises ``ApiError`` if the stream is cut off (e.g. by the deadline).
+        Closing the generator, or cancelling the job it runs in, drops the
+        connection, which stops generation on the server.
+        """
+        body = {"preferences": preferences.model_dump(mode="json"), "stream": True, "timeout_s": timeout_s}
+        with self._request("POST", "/v1/itinerary", body, timeout_s, stream=True) as response:
+            response.encoding = "utf-8"
+            try:
+                for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                    check_cancelled()
+                    if chunk:
+                        yield chunk
+            except requests.RequestException as e:
+                raise ApiError(f"itinerary stream was cut off: {e}", status=0) from e
+
+    def refine_suggestions(self, preferences, feedback: str, itinerary: Optional[str] = None,
+                           session_id: Optional[str] = None, timeout_s: Optional[float] = None) -> str:
+        body = {"preferences": preferences.model_dump(mode="json"), "feedback": feedback,
+                "itinerary": itinerary, "session_id": session_id}
+        return self._post("/v1/refine", body, timeout_s)["itinerary"]
+
+    def refine_itinerary(self, preferences, itinerary: Itinerary, feedback: str,
+                         session_id: Optional[str] = None, timeout_s: Optional[float] = None) -> Itinerary:
+        body = {"preferences": preferences.model_dump(mode="json"), "feedback": feedback,
+                "itinerary": itinerary.to_dict(), "session_id": session_id}
+        return _from_dict(self._post("/v1/refine", body, timeout_s)["structured"])
+
+    def prefetch_destination_info(self, destination: str) -> None:
+        """Best effort: a failed prefetch only means the first request loads the destination itself."""
+        try:
+            self._post("/v1/prefetch", {"destination": destination}, timeout_s=5)
+        except ApiError:
+            pass
+
+    def health(self) -> Dict:
+        return self._request("GET", "/healthz", timeout_s=5).json()
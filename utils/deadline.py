@@ -0,0 +1,79 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request's deadline leaves no time for its next step."""
+
+
+# ``time.monotonic()`` by which the current request must finish, if it has a deadline.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def deadline_in(timeout_s: Optional[float]) -> Optional[float]:
+    """Deadline ``timeout_s`` from now, or the current one if that is sooner (or ``timeout_s`` is None)."""
+    current = _deadline.get()
+    if timeout_s is None:
+        return current
+    deadline = time.monotonic() + timeout_s
+    return deadline if current is None else min(current, deadline)
+
+
+@contextmanager
+def deadline_at(deadline: Optional[float]) -> Iterator[Optional[float]]:
+    """Run the block under ``deadline``; a nested deadline can only tighten the current one.
+
+    The deadline is held in a context variable, so it follows the request
+    into model calls, ``_in_caller_context`` workers and asyncio tasks
+    without being passed around. ``None`` keeps the current deadline.
+    """
+    current = _deadline.get()
+    if deadline is None or (current is not None and current <= deadline):
+        yield current
+        return
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_after(timeout_s: Optional[float]):
+    """``deadline_at`` for a deadline ``timeout_s`` seconds from now."""
+    return deadline_at(deadline_in(timeout_s))
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (negative once passed), or ``None`` without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(step: str = "request") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"deadline passed before {step}")
+
+
+def stage_timeout(limit_s: float, share: float = 1.0) -> float:
+    """Timeout for one step: its own ``limit_s``, or ``share`` of the time left if that is less."""
+    left = remaining()
+    if left is None:
+        return limit_s
+    return max(0.0, min(limit_s, left * share))
+
+
+def stage_deadline(share: float):
+    """Give the block ``share`` of the time left; a no-op without a deadline.
+
+    For optional steps whose failure the caller can absorb: they give up
+    early and leave the rest of the time to the steps that matter.
+    """
+    left = remaining()
+    return deadline_after(None if left is None else max(0.0, left * share))
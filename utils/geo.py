@@ -0,0 +1,325 @@
+import csv
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.preferences import walking_amount
+
+EARTH_RADIUS_KM = 6371.0088
+# Offline coordinates: destination,name,latitude,longitude; "|" separates alternative names.
+GAZETTEER_PATH = os.getenv(
+    "TRAVEL_AGENT_GAZETTEER",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "gazetteer.csv"),
+)
+
+WALKING_SPEED_KMH = 4.0
+# Share of the walking time left for getting from one stop to the next; the
+# rest is spent walking around the stops themselves.
+TRANSFER_SHARE = 0.5
+# Legs longer than this are taken by public transport whatever the budget.
+MAX_WALKING_LEG_KM = 2.5
+MAX_STOPS_PER_DAY = 6
+# Nearby restaurants suggested per day: one each for breakfast, lunch and dinner.
+MEALS_PER_DAY = 3
+
+# Words too common in place names to identify a place on their own.
+_GENERIC_WORDS = {
+    "the", "of", "and", "de", "del", "la", "le", "el", "di", "st", "saint", "museum", "museums", "park",
+    "market", "palace", "church", "tower", "square", "garden", "gardens", "temple", "shrine", "mosque",
+    "bridge", "street", "avenue", "district", "quarter", "beach", "cathedral", "basilica", "gallery", "house",
+    "bazaar", "old", "town", "city", "national", "center", "centre", "visit", "tour",
+}
+_WALK_LEVELS = (("minimal", 1.0), ("moderate", 3.0), ("high", 5.0))
+
+
+class Place(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+
+
+class DayRoute(NamedTuple):
+    """One day's stops in visiting order.
+
+    ``stops`` and ``restaurants`` are the caller's items, not gazetteer
+    names. ``walking_km`` is the walking between stops; ``transit_legs``
+    are the (from, to) legs better covered by public transport.
+    """
+    day: int
+    stops: Tuple[str, ...]
+    walking_km: float
+    transit_legs: Tuple[Tuple[str, str], ...] = ()
+    restaurants: Tuple[str, ...] = ()
+
+
+def _tokens(name: str) -> Tuple[str, ...]:
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii").casefold()
+    return tuple(re.findall(r"[a-z0-9]+", text))
+
+
+def _destination_key(destination: str) -> str:
+    # "Paris, France" and "paris" share gazetteer entries.
+    return " ".join(_tokens(destination.split(",")[0]))
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path: str = GAZETTEER_PATH) -> Dict[str, List[Tuple[Tuple[str, ...], Place]]]:
+    """Destination key -> [(name tokens, place)], one entry per alternative name."""
+    gazetteer: Dict[str, List[Tuple[Tuple[str, ...], Place]]] = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                names = row["name"].split("|")
+                place = Place(names[0], float(row["latitude"]), float(row["longitude"]))
+                entries = gazetteer.setdefault(_destination_key(row["destination"]), [])
+                entries.extend((_tokens(name), place) for name in names)
+    except (OSError, KeyError, ValueError):
+        # Without a gazetteer nothing geocodes and the model plans routes itself.
+        return {}
+    return gazetteer
+
+
+def place_name(item: str) -> str:
+    """The name part of a destination-info entry such as "Louvre Museum: art" or "name: X; description: Y"."""
+    if item.startswith("name:"):
+        item = item[len("name:"):].split(";", 1)[0]
+    for separator in (" - ", " – ", ": ", " ("):
+        item = item.split(separator, 1)[0]
+    return item.strip()
+
+
+def geocode(items: Sequence[str], destination: str, path: str = GAZETTEER_PATH) -> List[Optional[Place]]:
+    """Look each item up in the offline gazetteer; ``None`` where there is no confident match.
+
+    A gazetteer name matches when all of its words appear in the item (or
+    the other way round) and they share at least one distinctive word, so
+    "the Louvre" finds "Louvre Museum" but "Museum" alone finds nothing.
+    """
+    entries = load_gazetteer(path).get(_destination_key(destination), [])
+    places: List[Optional[Place]] = []
+    for item in items:
+        words = set(_tokens(place_name(item)))
+        best, best_score = None, 0
+        for name_words, place in entries:
+            shared = words.intersection(name_words)
+            if not shared - _GENERIC_WORDS:
+                continue
+            if not (set(name_words) <= words or words <= set(name_words)):
+                continue
+            score = len(shared) * 2 - len(words.symmetric_difference(name_words))
+            if best is None or score > best_score:
+                best, best_score = place, score
+        places.append(best)
+    return places
+
+
+def haversine_matrix(coordinates: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km between every pair of (latitude, longitude) rows, in degrees."""
+    radians = np.radians(np.asarray(coordinates, dtype=float))
+    latitude, longitude = radians[:, 0:1], radians[:, 1:2]
+    half_dlat = (latitude - latitude.T) / 2
+    half_dlon = (longitude - longitude.T) / 2
+    a = np.sin(half_dlat) ** 2 + np.cos(latitude) * np.cos(latitude.T) * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def walking_budget_km(walking_tolerance: Optional[str]) -> float:
+    """Walking distance between stops a day allows, from "4 hours", "2-3 km", "Minimal (under 1 hour)"..."""
+    text = (walking_tolerance or "").casefold()
+    amount = walking_amount(text)
+    if amount:
+        low, high, unit = amount
+        distance = (low + high) / 2 if high is not None else low
+        if unit == "km":
+            return distance
+        if unit == "miles":
+            return distance * 1.609
+        hours = distance / 60 if unit == "minutes" else distance
+        return hours * WALKING_SPEED_KMH * TRANSFER_SHARE
+    for word, hours in _WALK_LEVELS:
+        if word in text:
+            return hours * WALKING_SPEED_KMH * TRANSFER_SHARE
+    return 3.0 * WALKING_SPEED_KMH * TRANSFER_SHARE
+
+
+def cluster(coordinates: np.ndarray, groups: int, iterations: int = 20) -> np.ndarray:
+    """Split points into ``groups`` compact clusters of near-equal size; returns a label per point.
+
+    Capacity-constrained k-means on an equirectangular projection, which is
+    accurate enough within a city. Seeded with the first point and then the
+    farthest points, so the result is deterministic.
+    """
+    points = len(coordinates)
+    groups = max(1, min(groups, points))
+    latitude = np.radians(coordinates[:, 0].mean())
+    xy = np.column_stack((coordinates[:, 1] * math.cos(latitude), coordinates[:, 0])) * (math.pi / 180 * EARTH_RADIUS_KM)
+
+    seeds = [0]
+    nearest = np.linalg.norm(xy - xy[0], axis=1)
+    for _ in range(1, groups):
+        seeds.append(int(nearest.argmax()))
+        nearest = np.minimum(nearest, np.linalg.norm(xy - xy[seeds[-1]], axis=1))
+    centers = xy[seeds]
+
+    capacity = math.ceil(points / groups)
+    labels = np.full(points, -1)
+    for _ in range(iterations):
+        distances = np.linalg.norm(xy[:, None, :] - centers[None, :, :], axis=2)
+        new_labels = _assign(distances, capacity)
+        # Capacity can leave a cluster with no points; it takes the point
+        # farthest from its own centre among clusters that can spare one.
+        for group in range(groups):
+            sizes = np.bincount(new_labels, minlength=groups)
+            if sizes[group]:
+                continue
+            spread = np.linalg.norm(xy - centers[new_labels], axis=1)
+            new_labels[int(np.where(sizes[new_labels] > 1, spread, -1.0).argmax())] = group
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        centers = np.array([xy[labels == group].mean(axis=0) for group in range(groups)])
+    return labels
+
+
+def _assign(distances: np.ndarray, capacity: int) -> np.ndarray:
+    """Label each point (row) with a cluster (column) of at most ``capacity`` points.
+
+    In rounds: every unassigned point picks its nearest cluster that still
+    has room, and each cluster takes the closest of the points that picked
+    it, up to its room. Each round fills a cluster or assigns every point.
+    """
+    points, groups = distances.shape
+    labels = np.full(points, -1)
+    room = np.full(groups, capacity)
+    while True:
+        pending = np.flatnonzero(labels == -1)
+        if not len(pending):
+            return labels
+        candidates = np.where(room > 0, distances[pending], np.inf)
+        choice = candidates.argmin(axis=1)
+        # Grouped by chosen cluster, closest first; rank is the position within the cluster.
+        order = np.lexsort((candidates[np.arange(len(pending)), choice], choice))
+        chosen = choice[order]
+        rank = np.arange(len(order)) - np.searchsorted(chosen, chosen)
+        taken = rank < room[chosen]
+        labels[pending[order[taken]]] = chosen[taken]
+        room -= np.bincount(chosen[taken], minlength=groups)
+
+
+def order_route(distances: np.ndarray) -> List[int]:
+    """Short open path through every point: best nearest-neighbour tour, then 2-opt."""
+    count = len(distances)
+    if count <= 2:
+        return list(range(count))
+
+    def length(route: List[int]) -> float:
+        return float(distances[route[:-1], route[1:]].sum())
+
+    best = None
+    # Trying every start is quadratic per start; a dozen is plenty for a day.
+    for start in range(min(count, 12)):
+        route, unvisited = [start], set(range(count)) - {start}
+        while unvisited:
+            last = route[-1]
+            route.append(min(unvisited, key=lambda point: distances[last, point]))
+            unvisited.remove(route[-1])
+        if best is None or length(route) < length(best):
+            best = route
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(count - 2):
+            for j in range(i + 2, count):
+                # Reverse best[i+1..j]; for an open path the leg after j may not exist.
+                before = distances[best[i], best[i + 1]] + (distances[best[j], best[j + 1]] if j + 1 < count else 0)
+                after = distances[best[i], best[j]] + (distances[best[i + 1], best[j + 1]] if j + 1 < count else 0)
+                if after < before - 1e-9:
+                    best[i + 1:j + 1] = reversed(best[i + 1:j + 1])
+                    improved = True
+    return best
+
+
+def _unique_places(items: Sequence[str], destination: str, path: str) -> List[Tuple[str, Place]]:
+    """Geocoded items, keeping the first item for each place."""
+    seen, unique = set(), []
+    for item, place in zip(items, geocode(items, destination, path)):
+        if place is not None and place.name not in seen:
+            seen.add(place.name)
+            unique.append((item, place))
+    return unique
+
+
+def plan_routes(destination: str, items: Sequence[str], days: int, walking_tolerance: Optional[str] = None,
+                restaurants: Sequence[str] = (), path: str = GAZETTEER_PATH) -> Optional[List[DayRoute]]:
+    """Group ``items`` into one walkable cluster per day, each in visiting order.
+
+    ``items`` are in priority order: when there are more geocoded places than
+    ``MAX_STOPS_PER_DAY`` allows, the later ones are left out. Items that do
+    not geocode are left out too, for the model to place. Within a day, the
+    longest legs move to public transport until the walking between stops
+    fits ``walking_tolerance``. Geocoded ``restaurants`` go to the day whose
+    stops they are closest to. Returns ``None`` when fewer than two items
+    geocode.
+    """
+    days = max(1, days)
+    stops = _unique_places(items, destination, path)[:days * MAX_STOPS_PER_DAY]
+    if len(stops) < 2:
+        return None
+
+    coordinates = np.array([(place.latitude, place.longitude) for _, place in stops])
+    distances = haversine_matrix(coordinates)
+    labels = cluster(coordinates, days)
+    budget = walking_budget_km(walking_tolerance)
+    # The day with the highest-priority place comes first.
+    groups = sorted(set(labels.tolist()), key=lambda label: int(np.argmax(labels == label)))
+
+    meals: Dict[int, List[str]] = {group: [] for group in groups}
+    eateries = _unique_places(restaurants, destination, path)
+    if eateries:
+        eatery_coordinates = np.array([(place.latitude, place.longitude) for _, place in eateries])
+        nearest = haversine_matrix(np.vstack((eatery_coordinates, coordinates)))[:len(eateries), len(eateries):]
+        for index, (item, _) in enumerate(eateries):
+            group = int(labels[nearest[index].argmin()])
+            if len(meals[group]) < MEALS_PER_DAY:
+                meals[group].append(item)
+
+    routes = []
+    for group in groups:
+        members = np.flatnonzero(labels == group)
+        order = [int(members[index]) for index in order_route(distances[np.ix_(members, members)])]
+        legs = [(order[index], order[index + 1]) for index in range(len(order) - 1)]
+        walking = {leg for leg in legs if distances[leg] <= MAX_WALKING_LEG_KM}
+        for leg in sorted(walking, key=lambda leg: distances[leg], reverse=True):
+            if sum(distances[walk] for walk in walking) <= budget:
+                break
+            walking.discard(leg)
+        routes.append(DayRoute(
+            day=len(routes) + 1,
+            stops=tuple(stops[index][0] for index in order),
+            walking_km=round(float(sum(distances[leg] for leg in walking)), 1),
+            transit_legs=tuple((stops[a][0], stops[b][0]) for a, b in legs if (a, b) not in walking),
+            restaurants=tuple(meals[group]),
+        ))
+    return routes
+
+
+def format_routes(routes: List[DayRoute]) -> str:
+    """Plain-text day plans for a prompt."""
+    lines = []
+    for route in routes:
+        line = (f"Day {route.day}: {' -> '.join(place_name(stop) for stop in route.stops)}"
+                f" (about {route.walking_km:g} km on foot between stops")
+        if route.transit_legs:
+            line += "; public transport for " + ", ".join(
+                f"{place_name(a)} -> {place_name(b)}" for a, b in route.transit_legs)
+        line += ")"
+        if route.restaurants:
+            line += "; nearby restaurants: " + ", ".join(place_name(item) for item in route.restaurants)
+        lines.append(line)
+    return "\n".join(lines)
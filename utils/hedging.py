@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class HedgePolicy:
+    """Decide when to duplicate a slow model call, and cap how often.
+
+    A call that is still running after ``percentile`` of its stage's recent
+    latencies gets one duplicate; whichever answers first is used and the
+    other is cancelled. A stage is only hedged once it has ``min_samples``
+    latencies. Hedges are capped at ``max_fraction`` of calls and
+    ``max_in_flight`` at once. Each hedge also needs a rate-limiter slot
+    that is free right away, so hedging never queues for the quota or
+    overdraws it.
+    """
+
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, window: int = 200,
+                 max_fraction: float = 0.05, max_in_flight: int = 4, min_delay_s: float = 0.1):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_fraction = max_fraction
+        self.max_in_flight = max_in_flight
+        self.min_delay_s = min_delay_s
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._in_flight = 0
+        self._counters = {"calls": 0, "hedged": 0, "won": 0, "skipped": 0}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the latency of one successful call on ``stage``."""
+        with self._lock:
+            latencies = self._latencies.get(stage)
+            if latencies is None:
+                latencies = self._latencies[stage] = deque(maxlen=self.window)
+            latencies.append(seconds)
+            self._counters["calls"] += 1
+
+    def delay(self, stage: str) -> Optional[float]:
+        """How long to wait before hedging a call on ``stage``; ``None`` if it is not hedged yet."""
+        with self._lock:
+            latencies = self._latencies.get(stage)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay_s, ordered[index])
+
+    def try_start(self) -> bool:
+        """Claim a hedge if the limits allow one; pair with ``finish``."""
+        with self._lock:
+            allowed = (self._in_flight < self.max_in_flight
+                       and self._counters["hedged"] < self.max_fraction * self._counters["calls"])
+            if allowed:
+                self._in_flight += 1
+                self._counters["hedged"] += 1
+            else:
+                self._counters["skipped"] += 1
+            return allowed
+
+    def finish(self, won: bool) -> None:
+        """Release a hedge; ``won`` if the duplicate answered first."""
+        with self._lock:
+            self._in_flight -= 1
+            if won:
+                self._counters["won"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = self._in_flight
+        return stats
+
+
+def hedge_policy_from_env() -> Optional[HedgePolicy]:
+    """Hedging is on when ``TRAVEL_AGENT_HEDGE`` is 1/true/yes.
+
+    ``TRAVEL_AGENT_HEDGE_MAX_FRACTION`` caps hedges as a share of calls.
+    """
+    if os.getenv("TRAVEL_AGENT_HEDGE", "").lower() not in ("1", "true", "yes"):
+        return None
+    return HedgePolicy(max_fraction=float(os.getenv("TRAVEL_AGENT_HEDGE_MAX_FRACTION", "0.05")))
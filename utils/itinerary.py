@@ -0,0 +1,322 @@
+import json
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Activity(NamedTuple):
+    time: str = ""
+    place: str = ""
+    description: str = ""
+    cost: str = ""
+    transport: str = ""
+
+
+class Segment(NamedTuple):
+    name: str
+    activities: Tuple[Activity, ...] = ()
+
+
+class Day(NamedTuple):
+    number: int
+    title: str = ""
+    segments: Tuple[Segment, ...] = ()
+
+
+class Itinerary(NamedTuple):
+    """Compact, immutable itinerary: header lines, days -> segments -> activities, notes.
+
+    Built from tuples so it is cheap to keep in session state, hashable, and
+    safe to share between reruns without copying.
+    """
+    header: Tuple[str, ...] = ()
+    days: Tuple[Day, ...] = ()
+    notes: Tuple[str, ...] = ()
+
+    def to_text(self) -> str:
+        return itinerary_to_text(self)
+
+    def to_dict(self) -> Dict:
+        return itinerary_to_dict(self)
+
+
+def _string_schema() -> Dict:
+    return {"type": "STRING"}
+
+
+# Gemini response_schema for one day of a JSON itinerary.
+DAY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "day": {"type": "INTEGER"},
+        "title": _string_schema(),
+        "segments": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "name": _string_schema(),
+                    "activities": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "time": _string_schema(),
+                                "place": _string_schema(),
+                                "description": _string_schema(),
+                                "cost": _string_schema(),
+                                "transport": _string_schema(),
+                            },
+                            "required": ["time", "place"],
+                        },
+                    },
+                },
+                "required": ["name", "activities"],
+            },
+        },
+    },
+    "required": ["day", "segments"],
+}
+
+# Gemini response_schema for the JSON itinerary output mode.
+ITINERARY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "days": {"type": "ARRAY", "items": DAY_SCHEMA},
+        "notes": {"type": "ARRAY", "items": _string_schema()},
+    },
+    "required": ["days"],
+}
+
+
+def _clean(value) -> str:
+    return " ".join(str(value).split()) if value is not None else ""
+
+
+def itinerary_from_dict(data: Dict, header: Tuple[str, ...] = (), notes: Tuple[str, ...] = ()) -> Itinerary:
+    """Build an ``Itinerary`` from JSON matching ``ITINERARY_SCHEMA``.
+
+    ``header`` and ``notes`` are added around what the model produced.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("days"), list):
+        raise ValueError("Itinerary JSON must be an object with a 'days' list")
+
+    days = []
+    for index, raw_day in enumerate(data["days"], start=1):
+        if not isinstance(raw_day, dict):
+            continue
+        segments = []
+        for raw_segment in raw_day.get("segments") or []:
+            if not isinstance(raw_segment, dict):
+                continue
+            activities = tuple(
+                Activity(
+                    time=_clean(raw.get("time")),
+                    place=_clean(raw.get("place")),
+                    description=_clean(raw.get("description")),
+                    cost=_clean(raw.get("cost")),
+                    transport=_clean(raw.get("transport")),
+                )
+                for raw in raw_segment.get("activities") or []
+                if isinstance(raw, dict)
+            )
+            segments.append(Segment(_clean(raw_segment.get("name")), activities))
+        try:
+            number = int(raw_day.get("day") or index)
+        except (TypeError, ValueError):
+            number = index
+        days.append(Day(number, _clean(raw_day.get("title")), tuple(segments)))
+
+    model_notes = tuple(_clean(note) for note in data.get("notes") or [] if _clean(note))
+    return Itinerary(tuple(header), tuple(days), model_notes + tuple(notes))
+
+
+def itinerary_from_json(text: str, header: Tuple[str, ...] = (), notes: Tuple[str, ...] = ()) -> Itinerary:
+    return itinerary_from_dict(json.loads(text), header, notes)
+
+
+def itinerary_to_dict(itinerary: Itinerary) -> Dict:
+    return {
+        "header": list(itinerary.header),
+        "days": [
+            {
+                "day": day.number,
+                "title": day.title,
+                "segments": [
+                    {"name": segment.name, "activities": [activity._asdict() for activity in segment.activities]}
+                    for segment in day.segments
+                ],
+            }
+            for day in itinerary.days
+        ],
+        "notes": list(itinerary.notes),
+    }
+
+
+def format_activity(activity: Activity) -> str:
+    """Render one activity as a single line of plain text."""
+    text = activity.place
+    if activity.description:
+        text = f"{text} - {activity.description}" if text else activity.description
+    if activity.cost:
+        text = f"{text} (Cost: {activity.cost})"
+    if activity.time:
+        text = f"{activity.time}: {text}"
+    return text
+
+
+def itinerary_to_text(itinerary: Itinerary) -> str:
+    """Render the itinerary back to the plain-text layout used for export and prompts."""
+    lines: List[str] = list(itinerary.header)
+    for day in itinerary.days:
+        lines.append("")
+        lines.append(f"Day {day.number}: {day.title}" if day.title else f"Day {day.number}:")
+        for segment in day.segments:
+            if segment.name:
+                lines.append(f"{segment.name}:")
+            for activity in segment.activities:
+                lines.append(f"- {format_activity(activity)}")
+                if activity.transport:
+                    lines.append(f"  Transportation: {activity.transport}")
+    if itinerary.notes:
+        lines.append("")
+        lines.append("Notes:")
+        lines.extend(f"- {note}" for note in itinerary.notes)
+    return "\n".join(lines).strip()
+
+
+# "Day 1: Arrival", "Day 1 — Arrival", "Day 1 (May 1): Arrival", "Day 1, Friday"
+_DAY_RE = re.compile(r"^day\s+(\d+)\s*(?:\(([^)]*)\))?\s*(?:[:\-–—.,|]\s*(.*))?$", re.IGNORECASE)
+_SEGMENT_RE = re.compile(
+    r"^(early morning|late morning|morning|midday|late afternoon|afternoon|evening|night|"
+    r"breakfast|brunch|lunch|dinner)\s*(?:\(([^)]*)\))?\s*:\s*(.*)$",
+    re.IGNORECASE,
+)
+_TIME_RE = re.compile(
+    r"^(\d{1,2}(?::\d{2})?\s*(?:am|pm)(?:\s*[-–]\s*\d{1,2}(?::\d{2})?\s*(?:am|pm))?)\s*[:\-–]?\s*(.*)$",
+    re.IGNORECASE,
+)
+_COST_RE = re.compile(r"\s*\(((?:cost:?\s*)?[^()]*(?:\d|free)[^()]*)\)\s*$", re.IGNORECASE)
+# Section headings that end the day-by-day part of a text itinerary.
+_NOTES_RE = re.compile(r"^(notes|tips|practical information)\s*:\s*$", re.IGNORECASE)
+
+
+def _strip_markup(line: str) -> str:
+    line = line.strip().replace("**", "")
+    line = line.lstrip("#").strip()
+    if line[:2] in ("* ", "- ", "• "):
+        line = line[2:].strip()
+    return line
+
+
+def _parse_activity(text: str, time: str = "") -> Activity:
+    cost = ""
+    match = _COST_RE.search(text)
+    if match:
+        cost = re.sub(r"^cost:?\s*", "", match.group(1), flags=re.IGNORECASE).strip()
+        text = text[:match.start()].rstrip()
+    place, description = text, ""
+    for separator in (" - ", " – ", ": "):
+        if separator in text:
+            place, description = (part.strip() for part in text.split(separator, 1))
+            break
+    return Activity(time=time, place=place, description=description, cost=cost)
+
+
+def itinerary_from_text(text: str) -> Itinerary:
+    """Parse free-text itinerary output into an ``Itinerary`` in a single pass.
+
+    Used for text produced by streaming or refinement. Lines that do not fit
+    the day/segment/activity structure are kept as plain-description activities
+    so nothing the model wrote is lost.
+    """
+    header: List[str] = []
+    notes: List[str] = []
+    days: List[Day] = []
+    segments: List[Segment] = []
+    activities: List[Activity] = []
+    segment_name: Optional[str] = None
+    day: Optional[Tuple[int, str]] = None
+    in_notes = False
+
+    def close_segment():
+        nonlocal activities
+        if segment_name is not None or activities:
+            segments.append(Segment(segment_name or "", tuple(activities)))
+        activities = []
+
+    def close_day():
+        nonlocal segments, segment_name
+        close_segment()
+        if day is not None:
+            days.append(Day(day[0], day[1], tuple(segments)))
+        segments = []
+        segment_name = None
+
+    for raw_line in text.split("\n"):
+        line = _strip_markup(raw_line)
+        if not line:
+            continue
+
+        match = _DAY_RE.match(line)
+        if match:
+            close_day()
+            title, date = (match.group(3) or "").strip(), (match.group(2) or "").strip()
+            if date:
+                title = f"{title} ({date})" if title else date
+            day = (int(match.group(1)), title)
+            in_notes = False
+            continue
+
+        match = _NOTES_RE.match(line)
+        if match and day is not None:
+            close_day()
+            day = None
+            in_notes = True
+            continue
+
+        if in_notes:
+            notes.append(line)
+            continue
+        if day is None:
+            header.append(line)
+            continue
+
+        match = _SEGMENT_RE.match(line)
+        if match:
+            name = match.group(1).title()
+            if name != segment_name:
+                close_segment()
+                segment_name = name
+            if match.group(3):
+                activities.append(_parse_activity(match.group(3), (match.group(2) or "").strip()))
+            continue
+
+        if line.lower().startswith("transportation:"):
+            transport = line.split(":", 1)[1].strip()
+            if activities and not activities[-1].transport:
+                activities[-1] = activities[-1]._replace(transport=transport)
+            else:
+                activities.append(Activity(transport=transport))
+            continue
+
+        match = _TIME_RE.match(line)
+        if match:
+            activities.append(_parse_activity(match.group(2), match.group(1).strip()))
+        else:
+            activities.append(Activity(description=line))
+
+    close_day()
+    return Itinerary(tuple(header), tuple(days), tuple(notes))
+
+
+def split_days(text: str) -> List[str]:
+    """Split itinerary text before each day heading: the text before the first day, then one chunk per day.
+
+    Anything after the last day (notes, tips) stays in the last chunk.
+    """
+    chunks: List[List[str]] = [[]]
+    for line in text.split("\n"):
+        if _DAY_RE.match(_strip_markup(line)):
+            chunks.append([])
+        chunks[-1].append(line)
+    return ["\n".join(chunk) for chunk in chunks]
@@ -0,0 +1,234 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from utils.metrics import Metrics, metrics_from_env
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job once it has been cancelled.
+
+    Like ``asyncio.CancelledError`` it derives from ``BaseException``, so the
+    ``except Exception`` fallbacks along the pipeline let it through.
+    """
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class Job:
+    """One unit of background work, and what pollers can see of it.
+
+    The work function receives its ``Job`` and reports progress through
+    ``add_partial``, which raises ``JobCancelled`` once the job is
+    cancelled; ``partial_text`` is what has been produced so far.
+    """
+
+    def __init__(self, job_id: str, function: Callable[["Job"], object], label: str = "job"):
+        self.id = job_id
+        self.label = label
+        self.function = function
+        self.status = QUEUED
+        self.result = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._partial: List[str] = []
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def add_partial(self, chunk: str) -> None:
+        self.check_cancelled()
+        self._partial.append(chunk)
+
+    def partial_text(self) -> str:
+        return "".join(self._partial)
+
+    def check_cancelled(self) -> None:
+        if self.cancelled:
+            raise JobCancelled(self.id)
+
+
+# The job running in the current thread (or copied context), if any.
+_current_job: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("current_job", default=None)
+
+
+def check_cancelled() -> None:
+    """Raise ``JobCancelled`` if the job this code runs for has been cancelled.
+
+    Called before every model call, so cancelling a job stops its
+    outstanding calls; a no-op outside a job.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.check_cancelled()
+
+
+class JobQueue:
+    """Process-wide queue of background jobs served by a bounded worker pool.
+
+    ``submit`` returns a job id at once; callers poll ``status`` for the
+    state, queue position and partial output, and ``cancel`` stops a job:
+    a queued job never starts, a running one is stopped at its next model
+    call or progress report. At most ``max_queued`` jobs wait for a worker;
+    beyond that ``submit`` raises ``JobQueueFull``. Finished jobs are kept
+    for ``retention_s`` (and at most ``max_finished`` of them) so late
+    polls still see the result.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queued: int = 100, retention_s: float = 15 * 60,
+                 max_finished: int = 1000, metrics: Optional[Metrics] = None):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention_s = retention_s
+        self.max_finished = max_finished
+        self.metrics = metrics if metrics is not None else Metrics(enabled=False)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="travel-agent-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: "OrderedDict[str, Job]" = OrderedDict()
+        self._running = 0
+        self._counters = {"submitted": 0, "rejected": 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+        self._last_wait_s = 0.0
+
+    def submit(self, function: Callable[[Job], object], label: str = "job") -> str:
+        """Queue ``function(job)`` and return the new job's id."""
+        job = Job(uuid.uuid4().hex, function, label)
+        with self._lock:
+            self._expire(time.monotonic())
+            if len(self._queue) >= self.max_queued:
+                self._counters["rejected"] += 1
+                self.metrics.increment("jobs", status="rejected", label=label)
+                raise JobQueueFull(f"{len(self._queue)} jobs are already waiting")
+            self._jobs[job.id] = job
+            self._queue[job.id] = job
+            self._counters["submitted"] += 1
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def _run(self, job: Job) -> None:
+        with self._lock:
+            self._queue.pop(job.id, None)
+            if job.cancelled:
+                return
+            job.status = RUNNING
+            job.started_at = time.monotonic()
+            self._running += 1
+            self._last_wait_s = job.started_at - job.submitted_at
+        self.metrics.observe("job_wait", job.started_at - job.submitted_at, label=job.label)
+        token = _current_job.set(job)
+        status = FAILED
+        try:
+            result = job.function(job)
+            job.check_cancelled()
+            status, job.result = DONE, result
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+        except BaseException as e:
+            # KeyboardInterrupt, SystemExit and the like fail the job and carry on up.
+            job.error = type(e).__name__
+            raise
+        finally:
+            _current_job.reset(token)
+            self._finish(job, status)
+
+    def _finish(self, job: Job, status: str) -> None:
+        with self._lock:
+            if job.status == RUNNING:
+                self._running -= 1
+            job.status = status
+            job.finished_at = time.monotonic()
+            self._counters[status] += 1
+        if job.started_at is not None:
+            self.metrics.observe("job_run", job.finished_at - job.started_at, label=job.label, status=status)
+        self.metrics.increment("jobs", status=status, label=job.label)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it is unknown or already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            job._cancelled.set()
+            queued = self._queue.pop(job_id, None) is not None
+        if queued:
+            # It never reached a worker; the worker that picks it up returns at once.
+            self._finish(job, CANCELLED)
+        return True
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Snapshot of a job for pollers, or ``None`` if the id is unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            position = None
+            if job.status == QUEUED:
+                position = list(self._queue).index(job_id) + 1 if job_id in self._queue else 0
+            return {
+                "id": job.id,
+                "status": job.status,
+                "queue_position": position,
+                "wait_s": round((job.started_at or now) - job.submitted_at, 3),
+                "partial": job.partial_text(),
+                "result": job.result,
+                "error": job.error,
+            }
+
+    def _expire(self, now: float) -> None:
+        """Forget finished jobs past their retention. Holds the lock."""
+        finished = [job for job in self._jobs.values() if job.status in FINISHED]
+        excess = len(finished) - self.max_finished
+        for job in finished:
+            if excess > 0 or now - job.finished_at > self.retention_s:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["queued"] = len(self._queue)
+            stats["running"] = self._running
+            stats["last_wait_s"] = round(self._last_wait_s, 3)
+        return stats
+
+    def shutdown(self) -> None:
+        """Cancel every unfinished job and stop the workers."""
+        with self._lock:
+            pending = [job.id for job in self._jobs.values() if job.status not in FINISHED]
+        for job_id in pending:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=False)
+
+
+_default_queue: Optional[JobQueue] = None
+_default_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, configured from the environment on first use."""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue(
+                max_workers=int(os.getenv("TRAVEL_AGENT_JOB_WORKERS", "4")),
+                max_queued=int(os.getenv("TRAVEL_AGENT_MAX_QUEUED_JOBS", "100")),
+                metrics=metrics_from_env(),
+            )
+    return _default_queue
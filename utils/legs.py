@@ -0,0 +1,160 @@
+from datetime import timedelta
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from utils.itinerary import Activity, Day, Itinerary, Segment
+
+
+class TripLeg(BaseModel):
+    """One stop of a multi-destination trip and the days spent there.
+
+    On every leg after the first, the first of its days is the transfer day
+    from the previous stop.
+    """
+    destination: str
+    days: int
+
+
+class LegPlan(NamedTuple):
+    leg: TripLeg
+    # Trip day number of the leg's first day (its transfer day, if it has one).
+    first_day: int
+    # Previous stop, or None on the first leg.
+    origin: Optional[str]
+    # Preferences for the leg's sightseeing days alone.
+    preferences: Optional[BaseModel]
+
+    @property
+    def full_days(self) -> int:
+        return self.leg.days - (1 if self.origin else 0)
+
+    @property
+    def first_full_day(self) -> int:
+        return self.first_day + (1 if self.origin else 0)
+
+
+def check_legs(legs: Sequence[TripLeg], duration: int) -> None:
+    """Raise ``ValueError`` unless the legs' days add up to ``duration``.
+
+    Every leg after the first needs a day for the transfer and at least one
+    day at the stop.
+    """
+    for index, leg in enumerate(legs):
+        if not leg.destination.strip():
+            raise ValueError(f"leg {index + 1} has no destination")
+        if index and leg.days < 2:
+            raise ValueError(f"leg {index + 1} ({leg.destination}) needs at least 2 days, one for the transfer")
+        if leg.days < 1:
+            raise ValueError(f"leg {index + 1} ({leg.destination}) needs at least 1 day")
+    total = sum(leg.days for leg in legs)
+    if total != duration:
+        raise ValueError(f"legs add up to {total} days, but the trip lasts {duration}")
+
+
+def route_label(legs: Sequence[TripLeg]) -> str:
+    """``Paris (3 days) → Rome (4 days)``."""
+    return " → ".join(f"{leg.destination} ({leg.days} day{'s' if leg.days != 1 else ''})" for leg in legs)
+
+
+def plan_legs(preferences) -> List[LegPlan]:
+    """Split a ``TravelPreferences`` with ``legs`` into one plan per leg, in trip order.
+
+    Each leg's preferences cover only its sightseeing days: destination,
+    duration and dates are the leg's, and ``start_location`` is the
+    previous stop, so each leg can be generated, cached and stored like a
+    trip of its own.
+    """
+    plans = []
+    first_day = 1
+    origin = None
+    for leg in preferences.legs:
+        plan = LegPlan(leg, first_day, origin, None)
+        start = preferences.start_date + timedelta(days=plan.first_full_day - 1)
+        leg_preferences = preferences.model_copy(update={
+            "destination": leg.destination,
+            "duration": plan.full_days,
+            "start_date": start,
+            "end_date": start + timedelta(days=plan.full_days),
+            "start_location": origin or preferences.start_location,
+            "legs": None,
+        })
+        plans.append(plan._replace(preferences=leg_preferences))
+        first_day += leg.days
+        origin = leg.destination
+    return plans
+
+
+def leg_context(plan: LegPlan, plans: Sequence[LegPlan]) -> str:
+    """``leg 2/3: Paris > Rome > Naples`` — where a leg sits in its trip.
+
+    A leg's preferences look like a trip of their own, but its plan is
+    written for its place in the route, so anything keyed by them needs this
+    too.
+    """
+    index = plans.index(plan)
+    following = plans[index + 1].leg.destination if index + 1 < len(plans) else ""
+    stops = " > ".join(stop for stop in (plan.origin or "", plan.leg.destination, following) if stop)
+    return f"leg {index + 1}/{len(plans)}: {stops}"
+
+
+def transfer_day(number: int, origin: str, destination: str) -> Day:
+    """The day spent moving between two stops; planned locally, with no model call."""
+    return Day(number, f"Transfer from {origin} to {destination}", (
+        Segment("Morning", (
+            Activity(place=origin, description=f"Breakfast, check out and leave for {destination}",
+                     transport=f"Compare train, coach and flight times from {origin} to {destination} "
+                               "and book ahead"),
+        )),
+        Segment("Afternoon", (
+            Activity(place=destination, description="Arrive, check in and rest after the journey"),
+        )),
+        Segment("Evening", (
+            Activity(place=destination, description="Short walk and dinner near the accommodation"),
+        )),
+    ))
+
+
+def free_day(number: int, destination: str) -> Day:
+    """Stands in for a day the model left out, so later days keep their numbers."""
+    return Day(number, f"{destination}: Free day", (
+        Segment("Morning", (Activity(place=destination, description="Explore at your own pace"),)),
+    ))
+
+
+def leg_days(plan: LegPlan, itinerary: Itinerary) -> Tuple[Day, ...]:
+    """The leg's days numbered for the whole trip, its transfer day first.
+
+    Days are titled with their stop. Days the model added beyond the leg's
+    allocation are dropped, and missing ones become free days. Raises
+    ``ValueError`` if the leg has no days at all: its text was not in a
+    layout the parser knows, and free days would throw the plan away.
+    """
+    generated = itinerary.days[:plan.full_days]
+    if plan.full_days and not generated:
+        raise ValueError(f"No days could be read from the itinerary for {plan.leg.destination}")
+    days = [transfer_day(plan.first_day, plan.origin, plan.leg.destination)] if plan.origin else []
+    for offset in range(plan.full_days):
+        number = plan.first_full_day + offset
+        if offset >= len(generated):
+            days.append(free_day(number, plan.leg.destination))
+            continue
+        day = generated[offset]
+        title = f"{plan.leg.destination}: {day.title}" if day.title else plan.leg.destination
+        days.append(day._replace(number=number, title=title))
+    return tuple(days)
+
+
+def merge_legs(plans: Sequence[LegPlan], itineraries: Sequence[Itinerary],
+               header: Tuple[str, ...] = (), notes: Tuple[str, ...] = ()) -> Itinerary:
+    """One itinerary for the whole trip from the per-leg itineraries, in order.
+
+    Notes the legs share are kept once, followed by ``notes``.
+    """
+    days: List[Day] = []
+    merged_notes: List[str] = []
+    for plan, itinerary in zip(plans, itineraries):
+        days.extend(leg_days(plan, itinerary))
+        merged_notes.extend(note for note in itinerary.notes if note not in merged_notes)
+    merged_notes.extend(note for note in notes if note not in merged_notes)
+    return Itinerary(tuple(header), tuple(days), tuple(merged_notes))
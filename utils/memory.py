@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from utils.tokens import estimate_tokens
+
+
+class Session:
+    """What a refinement conversation remembers.
+
+    ``itinerary`` is the latest version of the itinerary and anchors every
+    refinement prompt. ``turns`` holds the most recent user requests
+    verbatim. Older requests are folded into ``summary``.
+    """
+    __slots__ = ("itinerary", "summary", "turns", "last_used")
+
+    def __init__(self):
+        self.itinerary = ""
+        self.summary = ""
+        self.turns: List[str] = []
+        self.last_used = time.monotonic()
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(turn) for turn in self.turns)
+
+
+class ConversationMemory:
+    """Process-wide, bounded store of refinement sessions.
+
+    Each session's history (summary plus recent turns) is kept under
+    ``max_history_tokens``: ``add_turn`` returns the oldest turns that no
+    longer fit, for the caller to summarize into ``set_summary``. Sessions
+    are evicted least recently used first, once there are more than
+    ``max_sessions`` of them or after ``idle_ttl_s`` without use.
+    """
+
+    def __init__(self, max_sessions: int = 2000, max_history_tokens: int = 600,
+                 idle_ttl_s: float = 2 * 60 * 60):
+        self.max_sessions = max_sessions
+        self.max_history_tokens = max_history_tokens
+        self.idle_ttl_s = idle_ttl_s
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._counters = {"created": 0, "evicted": 0, "expired": 0, "summarized_turns": 0}
+
+    def _session(self, session_id: str) -> Session:
+        """Return the session, creating it if needed, and mark it most recently used. Holds the lock."""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = Session()
+            self._counters["created"] += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = now
+        self._evict(now)
+        return session
+
+    def _evict(self, now: float) -> None:
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_used > self.idle_ttl_s:
+                self._counters["expired"] += 1
+            elif len(self._sessions) > self.max_sessions:
+                self._counters["evicted"] += 1
+            else:
+                return
+            del self._sessions[session_id]
+
+    def context(self, session_id: str) -> Dict:
+        """Snapshot of what a refinement prompt needs: itinerary, summary and recent turns."""
+        with self._lock:
+            session = self._session(session_id)
+            return {"itinerary": session.itinerary, "summary": session.summary, "turns": list(session.turns)}
+
+    def set_itinerary(self, session_id: str, itinerary: str) -> None:
+        with self._lock:
+            self._session(session_id).itinerary = itinerary
+
+    def add_turn(self, session_id: str, request: str) -> List[str]:
+        """Record a user request; return the oldest turns pushed out by the token cap.
+
+        The newest turn always stays, however long it is.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            session.turns.append(request)
+            overflow = []
+            while len(session.turns) > 1 and session.history_tokens() > self.max_history_tokens:
+                overflow.append(session.turns.pop(0))
+            self._counters["summarized_turns"] += len(overflow)
+            return overflow
+
+    def set_summary(self, session_id: str, summary: str) -> None:
+        with self._lock:
+            self._session(session_id).summary = summary
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.summary if session is not None else ""
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        """Forget one session, or every session when ``session_id`` is None."""
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["sessions"] = len(self._sessions)
+        return stats
+
+
+_default_memory: Optional[ConversationMemory] = None
+_default_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    """Return the process-wide conversation memory shared by every agent."""
+    global _default_memory
+    with _default_memory_lock:
+        if _default_memory is None:
+            _default_memory = ConversationMemory()
+    return _default_memory
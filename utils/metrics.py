@@ -0,0 +1,198 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Latency histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_SPAN = nullcontext()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class MetricEvent(NamedTuple):
+    """A single measurement, as passed to hooks.
+
+    ``kind`` is ``"counter"`` (``value`` is the increment) or ``"timing"``
+    (``value`` is the duration in seconds).
+    """
+    kind: str
+    name: str
+    value: float
+    labels: Dict[str, str]
+
+
+Hook = Callable[[MetricEvent], None]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "started")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        labels = self.labels
+        if exc_type is not None:
+            labels = dict(labels, error=exc_type.__name__)
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **labels)
+        return False
+
+
+class Metrics:
+    """In-process counters and latency histograms with pluggable hooks.
+
+    Spans time a block of code; counters count retries, fallbacks, cache hits
+    and the like. Every measurement is also handed to each registered hook,
+    which is the place to forward it to a tracing or metrics backend.
+    ``render_text`` dumps everything in the Prometheus text format.
+
+    A disabled instance returns a shared no-op span and ignores counters,
+    so instrumented code pays one attribute check per call site.
+    """
+
+    def __init__(self, enabled: bool = True, prefix: str = "travel_agent"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._hooks: List[Hook] = []
+
+    def add_hook(self, hook: Hook) -> None:
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: Hook) -> None:
+        self._hooks.remove(hook)
+
+    def span(self, name: str, **labels: str):
+        """Context manager that records the duration of its block under ``name``."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+        self._emit(MetricEvent("timing", name, seconds, labels))
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._emit(MetricEvent("counter", name, amount, labels))
+
+    def _emit(self, event: MetricEvent) -> None:
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                # A broken exporter must not break itinerary generation.
+                pass
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Return counters and histogram summaries keyed by ``name{labels}``."""
+        with self._lock:
+            counters = {_series(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {
+                _series(name, labels): {
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "buckets": dict(zip([str(bound) for bound in histogram.buckets] + ["+Inf"],
+                                        _cumulative(histogram.counts))),
+                }
+                for (name, labels), histogram in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_text(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Render all metrics, plus optional point-in-time ``gauges``, as Prometheus text."""
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(histogram.counts), histogram.buckets, histogram.sum, histogram.count)
+                          for key, histogram in histograms]
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{_series(metric, labels)} {_number(value)}")
+
+        for (name, labels), counts, buckets, total, count in histograms:
+            metric = f"{self.prefix}_{name}_seconds"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, cumulative in zip(list(buckets) + ["+Inf"], _cumulative(counts)):
+                lines.append(f"{_series(metric + '_bucket', labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{_series(metric + '_sum', labels)} {total:.6f}")
+            lines.append(f"{_series(metric + '_count', labels)} {count}")
+
+        for name, value in sorted((gauges or {}).items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _series(name: str, labels: Labels) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{str(value)}"' for key, value in labels)
+    return f"{name}{{{rendered}}}"
+
+
+def _cumulative(counts: List[int]) -> List[int]:
+    total, result = 0, []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.6f}"
+
+
+def metrics_from_env() -> Metrics:
+    """Metrics are collected when ``TRAVEL_AGENT_METRICS`` is set to 1/true/yes."""
+    return Metrics(enabled=os.getenv("TRAVEL_AGENT_METRICS", "").lower() in ("1", "true", "yes"))
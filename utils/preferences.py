@@ -0,0 +1,181 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Fields ``extract_preferences`` tries to resolve, in the shape ``gather_preferences`` returns them.
+PREFERENCE_FIELDS = ("dietary_preferences", "walking_tolerance", "specific_interests", "budget")
+
+# Canonical names match the options offered in app.py.
+DIETARY_TERMS = {
+    "Vegetarian": r"vegetarian|veggie",
+    "Vegan": r"vegan|plant[- ]based",
+    "Halal": r"halal",
+    "Kosher": r"kosher",
+    "Gluten-free": r"gluten[- ]free|coeliac|celiac|no gluten",
+    "Pescatarian": r"pescatarian|pescetarian",
+    "Dairy-free": r"dairy[- ]free|lactose[- ]intolerant|no dairy",
+    "Nut allergy": r"(?:pea)?nut allerg\w*|allergic to (?:pea)?nuts",
+    "None": r"no dietary (?:restrictions|requirements|preferences)|no (?:food )?restrictions|eat (?:anything|everything)",
+}
+
+INTEREST_TERMS = {
+    "History & Culture": r"history|historic(?:al)?|culture|cultural|heritage|castles?|ancient|ruins|architecture|temples?",
+    "Food & Dining": r"food(?:ie)?s?|dining|restaurants?|cuisine|street food|culinary|wine|cooking classes?",
+    "Nature & Outdoors": r"nature|outdoors?|hik(?:e|es|ing)|parks?|mountains?|beach(?:es)?|wildlife|trekking",
+    "Shopping": r"shopping|shops?|markets?|boutiques?|souvenirs?",
+    "Art & Museums": r"art|arts|museums?|galler(?:y|ies)|exhibitions?",
+    "Nightlife": r"nightlife|bars?|clubs?|clubbing|pubs?|live music",
+    "Local Experiences": r"local experiences?|like a local|off the beaten (?:path|track)|authentic|hidden gems?",
+}
+
+_NEGATION_RE = re.compile(r"(?:\b(?:no|not|don'?t|do not|never|hate|dislike|avoid|without)\b|\bnon-?)[\w\s'-]{0,20}$")
+
+_DIETARY_RES = {name: re.compile(rf"\b(?:{pattern})\b") for name, pattern in DIETARY_TERMS.items()}
+_INTEREST_RES = {name: re.compile(rf"\b(?:{pattern})\b") for name, pattern in INTEREST_TERMS.items()}
+
+# Clauses end at sentence punctuation or ", " (so "$2,000" and "1.5 hours" stay in one piece).
+_CLAUSE_RE = re.compile(r"(?:[;!?\n]|\.(?!\d))+|,\s+|\s+but\s+")
+_WALK_RE = re.compile(r"\bwalk")
+_WALK_AMOUNT_RE = re.compile(
+    r"(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:\.\d+)?))?\s*"
+    r"(hours?|hrs?|h|minutes?|mins?|km|kilometers?|kilometres?|miles?)\b"
+)
+_WALK_LEVELS = (
+    ("Minimal (under 1 hour)", re.compile(
+        r"\b(?:little|minimal|not much|limited|short|can'?t|cannot|unable|avoid|no long)\b")),
+    ("High (5+ hours)", re.compile(r"\b(?:lots|a lot|plenty|love|all day|long|tons)\b")),
+    ("Moderate (2-4 hours)", re.compile(r"\b(?:moderate|some|a bit|fair amount)\b")),
+)
+_UNIT_NAMES = {"h": "hours", "hr": "hours", "hrs": "hours", "hour": "hours", "hours": "hours",
+               "min": "minutes", "mins": "minutes", "minute": "minutes", "minutes": "minutes",
+               "km": "km", "mile": "miles", "miles": "miles"}
+
+_CURRENCIES = {
+    "$": "$", "usd": "$", "dollar": "$", "dollars": "$",
+    "€": "€", "eur": "€", "euro": "€", "euros": "€",
+    "£": "£", "gbp": "£", "pound": "£", "pounds": "£",
+    "₹": "₹", "inr": "₹", "rupee": "₹", "rupees": "₹",
+    "aed": "AED ", "dirham": "AED ", "dirhams": "AED ",
+}
+_CURRENCY = r"(?:[$€£₹]|usd|eur|euros?|gbp|pounds?|inr|rupees?|aed|dirhams?|dollars?)"
+_AMOUNT = r"(\d[\d,]*(?:\.\d+)?)\s*(k)?"
+_BUDGET_RANGE_RE = re.compile(
+    rf"({_CURRENCY})?\s?{_AMOUNT}\s*(?:-|–|to|and)\s*({_CURRENCY})?\s?{_AMOUNT}\s*({_CURRENCY})?(?!\s*(?:days?|nights?|hours?|people))"
+)
+_BUDGET_AMOUNT_RE = re.compile(
+    rf"(under|below|less than|max(?:imum)?|up to|at most|around|about|roughly)?\s*"
+    rf"({_CURRENCY})?\s?{_AMOUNT}\s*({_CURRENCY})?(?!\s*(?:days?|nights?|hours?|people|-|–))"
+)
+_BUDGET_CONTEXT_RE = re.compile(r"\b(?:budget|spend|spending|afford|cost)\b")
+_BUDGET_LEVELS = (
+    ("Low", re.compile(r"\b(?:cheap|shoestring|backpack\w*|budget[- ]friendly|low[- ]budget|tight budget|frugal)\b")),
+    ("Luxury", re.compile(r"\b(?:luxury|luxurious|splurge|high[- ]end|5[- ]star|five[- ]star)\b")),
+    ("Mid-range", re.compile(r"\b(?:mid[- ]range|moderate budget|mid[- ]budget)\b")),
+)
+
+
+def _clauses(text: str) -> List[str]:
+    return [clause.strip() for clause in _CLAUSE_RE.split(text.lower()) if clause.strip()]
+
+
+def _match_terms(clauses: List[str], patterns: Dict[str, "re.Pattern"]) -> Optional[List[str]]:
+    """Return the canonical terms mentioned, or ``None`` if a term is both wanted and negated."""
+    wanted, negated = [], set()
+    for clause in clauses:
+        for name, pattern in patterns.items():
+            for match in pattern.finditer(clause):
+                if _NEGATION_RE.search(clause[:match.start()]):
+                    negated.add(name)
+                elif name not in wanted:
+                    wanted.append(name)
+    if negated & set(wanted):
+        return None
+    return wanted
+
+
+def walking_amount(text: str) -> Optional[Tuple[float, Optional[float], str]]:
+    """``(low, high, unit)`` of the first walking amount in lower-case ``text``, or ``None``.
+
+    "2-3 km" gives ``(2.0, 3.0, "km")``; ``high`` is ``None`` for a single
+    amount, and ``unit`` is one of hours, minutes, km or miles.
+    """
+    match = _WALK_AMOUNT_RE.search(text)
+    if not match:
+        return None
+    low, high, unit = match.groups()
+    return float(low), float(high) if high else None, _UNIT_NAMES.get(unit, "km" if unit.startswith("kilo") else unit)
+
+
+def _walking_tolerance(clauses: List[str]) -> Optional[str]:
+    for clause in clauses:
+        if not _WALK_RE.search(clause):
+            continue
+        amount = walking_amount(clause)
+        if amount:
+            low, high, unit = amount
+            return f"{low:g}-{high:g} {unit}" if high is not None else f"{low:g} {unit}"
+        for level, pattern in _WALK_LEVELS:
+            if pattern.search(clause):
+                return level
+    return None
+
+
+def _amount(digits: str, thousands: Optional[str]) -> str:
+    value = float(digits.replace(",", ""))
+    if thousands:
+        value *= 1000
+    return f"{value:.0f}" if value.is_integer() else f"{value:.2f}"
+
+
+def _budget(clauses: List[str]) -> Optional[str]:
+    for clause in clauses:
+        in_context = bool(_BUDGET_CONTEXT_RE.search(clause))
+        match = _BUDGET_RANGE_RE.search(clause)
+        if match:
+            before, low, low_k, middle, high, high_k, after = match.groups()
+            currency = before or middle or after
+            if currency or in_context:
+                symbol = _CURRENCIES.get(currency or "", "")
+                return f"{symbol}{_amount(low, low_k or high_k)}-{_amount(high, high_k)}"
+        match = _BUDGET_AMOUNT_RE.search(clause)
+        if match:
+            qualifier, before, digits, thousands, after = match.groups()
+            currency = before or after
+            if currency or in_context:
+                value = _CURRENCIES.get(currency or "", "") + _amount(digits, thousands)
+                if qualifier in ("under", "below", "less than", "max", "maximum", "up to", "at most"):
+                    return f"Up to {value}"
+                return value
+        for level, pattern in _BUDGET_LEVELS:
+            if pattern.search(clause):
+                return level
+    return None
+
+
+def extract_preferences(text: str) -> Dict:
+    """Resolve what plain rules can from free-text travel preferences.
+
+    Returns only the fields of ``PREFERENCE_FIELDS`` that were resolved
+    confidently. Fields that are not mentioned, or that are mentioned in a
+    contradictory way ("love museums ... no museums"), are left out for the
+    model to handle.
+    """
+    clauses = _clauses(text)
+    resolved: Dict = {}
+    dietary = _match_terms(clauses, _DIETARY_RES)
+    if dietary:
+        # "No restrictions" only stands alone.
+        resolved["dietary_preferences"] = [item for item in dietary if item != "None"] or ["None"]
+    interests = _match_terms(clauses, _INTEREST_RES)
+    if interests:
+        resolved["specific_interests"] = interests
+    walking = _walking_tolerance(clauses)
+    if walking:
+        resolved["walking_tolerance"] = walking
+    budget = _budget(clauses)
+    if budget:
+        resolved["budget"] = budget
+    return resolved
+
+
+def missing_fields(preferences: Dict) -> Tuple[str, ...]:
+    return tuple(field for field in PREFERENCE_FIELDS if not preferences.get(field))
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+# Errors worth retrying. Quota errors additionally shrink the concurrency limit.
+THROTTLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = THROTTLE_ERRORS + (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    return isinstance(error, THROTTLE_ERRORS)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class _TokenBucket:
+    """Refills continuously at ``rate`` per second up to ``capacity``. May go into debt."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Client-side limiter for requests/tokens per minute with AIMD concurrency.
+
+    Requests and tokens are drawn from token buckets that refill at
+    ``utilization`` of the quota and hold at most ``burst_seconds`` of it, so
+    usage in any one-minute window stays just under the quota. The number of
+    calls in flight is capped by a limit that grows by roughly one per round
+    trip on success and halves whenever the API reports throttling.
+
+    One limiter is meant to be shared by every agent in the process.
+    """
+
+    def __init__(self, requests_per_minute: float = 1000, tokens_per_minute: float = 1_000_000,
+                 max_concurrency: int = 16, min_concurrency: int = 1,
+                 utilization: float = 0.85, burst_seconds: float = 10):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        request_rate = requests_per_minute * utilization / 60
+        token_rate = tokens_per_minute * utilization / 60
+        self._requests = _TokenBucket(request_rate, max(1.0, request_rate * burst_seconds))
+        self._tokens = _TokenBucket(token_rate, max(1.0, token_rate * burst_seconds))
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._counters = {"acquired": 0, "waited": 0, "throttled": 0, "errors": 0}
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take a slot and quota if available; otherwise return how long to wait."""
+        now = time.monotonic()
+        if self._in_flight >= max(self.min_concurrency, int(self._limit)):
+            return -1.0
+        wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self._in_flight += 1
+        self._counters["acquired"] += 1
+        return 0.0
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take a slot and quota only if both are available right now."""
+        with self._lock:
+            return self._try_acquire(tokens) == 0.0
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> bool:
+        """Block until a call estimated at ``tokens`` tokens may start.
+
+        Gives up and returns False once ``timeout`` seconds have passed.
+        """
+        waited = False
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                wait = self._try_acquire(tokens)
+                if wait == 0.0:
+                    break
+                left = None if give_up is None else give_up - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                waited = True
+                # A negative wait means no free slot: sleep until one is released.
+                wait = None if wait < 0 else wait
+                self._slot_freed.wait(timeout=wait if left is None else min(wait or left, left))
+            if waited:
+                self._counters["waited"] += 1
+        return True
+
+    async def aacquire(self, tokens: int, timeout: Optional[float] = None) -> bool:
+        """Async counterpart of ``acquire``; polls instead of holding a thread."""
+        waited = False
+        give_up = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                wait = self._try_acquire(tokens)
+                if wait == 0.0:
+                    if waited:
+                        self._counters["waited"] += 1
+                    return True
+            left = None if give_up is None else give_up - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            waited = True
+            wait = 0.05 if wait < 0 else wait
+            await asyncio.sleep(wait if left is None else min(wait, left))
+
+    def release(self, reserved_tokens: int = 0, used_tokens: Optional[int] = None,
+                throttled: bool = False, failed: bool = False) -> None:
+        """Finish a call, reconcile its token reservation and adapt concurrency."""
+        with self._lock:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                difference = used_tokens - reserved_tokens
+                if difference > 0:
+                    self._tokens.take(difference)
+                else:
+                    self._tokens.refund(-difference)
+            if throttled:
+                self._counters["throttled"] += 1
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+            elif failed:
+                self._counters["errors"] += 1
+            else:
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / max(self._limit, 1.0))
+            self._slot_freed.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = self._in_flight
+            stats["concurrency_limit"] = round(self._limit, 2)
+        return stats
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter, configured from the environment on first use."""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter(
+                requests_per_minute=float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "1000")),
+                tokens_per_minute=float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000")),
+                max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")),
+            )
+    return _default_limiter
@@ -0,0 +1,155 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from utils.itinerary import Day, Itinerary, Segment
+
+# Scope of a refinement: day number -> names of the segments to change.
+# An empty tuple means the whole day.
+Scope = Dict[int, Tuple[str, ...]]
+
+SEGMENT_NAMES = ("Morning", "Afternoon", "Evening")
+
+# Segment headings found in parsed itineraries, and meal words in feedback,
+# folded onto the three segments every generated day has.
+_SEGMENT_WORDS = {
+    "Morning": r"early morning|late morning|mornings?|breakfast|brunch",
+    "Afternoon": r"late afternoon|afternoons?|midday|lunch",
+    "Evening": r"evenings?|night|nights|dinner|tonight",
+}
+_SEGMENT_RES = {name: re.compile(rf"\b(?:{pattern})\b") for name, pattern in _SEGMENT_WORDS.items()}
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+}
+_ORDINAL_WORDS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7,
+    "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11, "twelfth": 12, "thirteenth": 13, "fourteenth": 14,
+}
+_NUMBER = rf"(?:\d+|{'|'.join(_NUMBER_WORDS)})"
+# "day 3", "days 2-4", "days 2, 3 and 5", "day one"
+_DAY_LIST_RE = re.compile(rf"\bdays?\s+({_NUMBER}(?:\s*(?:,|and|&|-|–|to|through)\s*{_NUMBER})*)\b")
+_DAY_TOKEN_RE = re.compile(rf"{_NUMBER}|-|–|\bto\b|\bthrough\b")
+# "the second day", "3rd day", "last day"
+_ORDINAL_DAY_RE = re.compile(rf"\b(\d+(?:st|nd|rd|th)|{'|'.join(_ORDINAL_WORDS)}|last|final)\s+day\b")
+_EVERY_DAY_RE = re.compile(r"\b(?:every|each|all)\s+days?\b|\b(?:whole|entire)\s+(?:trip|itinerary)\b")
+_CLAUSE_RE = re.compile(r"[.;!?\n]+|,\s+but\s+|\s+but\s+")
+# Places shorter than this are too likely to match ordinary words.
+_MIN_PLACE_CHARS = 4
+
+
+def segment_key(name: str) -> Optional[str]:
+    """Fold a segment heading ("Late Morning", "Dinner", ...) onto Morning/Afternoon/Evening."""
+    lowered = name.lower()
+    for key, pattern in _SEGMENT_RES.items():
+        if pattern.search(lowered):
+            return key
+    return None
+
+
+def _number(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+def _days_in_clause(clause: str, last_day: int) -> List[int]:
+    days: List[int] = []
+    for match in _DAY_LIST_RE.finditer(clause):
+        tokens = _DAY_TOKEN_RE.findall(match.group(1))
+        index = 0
+        while index < len(tokens):
+            start = _number(tokens[index])
+            end = start
+            if index + 2 < len(tokens) and tokens[index + 1] in ("-", "–", "to", "through"):
+                end = _number(tokens[index + 2])
+                index += 2
+            # Only days the itinerary has: "days 1 to 20000000" must not build a huge list.
+            days.extend(range(max(start, 1), min(end, last_day) + 1))
+            index += 1
+    for match in _ORDINAL_DAY_RE.finditer(clause):
+        word = match.group(1)
+        if word in ("last", "final"):
+            days.append(last_day)
+        elif word in _ORDINAL_WORDS:
+            days.append(_ORDINAL_WORDS[word])
+        else:
+            days.append(int(word[:-2]))
+    return days
+
+
+def _add(scope: Scope, day: int, segments: Tuple[str, ...]) -> None:
+    if day in scope and (not scope[day] or not segments):
+        scope[day] = ()
+    else:
+        scope[day] = tuple(name for name in SEGMENT_NAMES if name in scope.get(day, ()) + segments)
+
+
+def feedback_scope(feedback: str, itinerary: Itinerary) -> Optional[Scope]:
+    """Work out which days and segments of ``itinerary`` the feedback is about.
+
+    Days are found from explicit references ("day 3", "days 2-4", "the
+    last day") and from places in the itinerary the feedback names; segment
+    words ("mornings", "dinner") narrow a day down to those segments, or
+    apply to every day when no day is named. Returns ``None`` when the
+    feedback names neither, leaving the decision to the model.
+    """
+    numbers = [day.number for day in itinerary.days]
+    if not numbers:
+        return None
+    last_day = max(numbers)
+    text = feedback.lower()
+    scope: Scope = {}
+
+    for clause in (part.strip() for part in _CLAUSE_RE.split(text)):
+        if not clause:
+            continue
+        segments = tuple(name for name, pattern in _SEGMENT_RES.items() if pattern.search(clause))
+        days = _days_in_clause(clause, last_day)
+        if _EVERY_DAY_RE.search(clause):
+            days = numbers
+        elif not days and segments:
+            # "more relaxed evenings": every day, but only that part of it.
+            days = numbers
+        for day in days:
+            _add(scope, day, segments)
+
+    for day in itinerary.days:
+        for segment in day.segments:
+            for activity in segment.activities:
+                place = activity.place.lower()
+                if len(place) >= _MIN_PLACE_CHARS and place in text:
+                    key = segment_key(segment.name)
+                    _add(scope, day.number, (key,) if key else ())
+
+    scope = {day: segments for day, segments in scope.items() if day in numbers}
+    return scope or None
+
+
+def splice_day(original: Day, regenerated: Day, segments: Tuple[str, ...]) -> Day:
+    """Take ``segments`` from the regenerated day and everything else from the original.
+
+    With no segments the regenerated day replaces the original outright.
+    Regenerated segments with no counterpart in the original are appended.
+    """
+    if not segments:
+        return regenerated._replace(number=original.number)
+    replacements = {}
+    for segment in regenerated.segments:
+        key = segment_key(segment.name)
+        if key in segments and key not in replacements:
+            replacements[key] = segment
+    kept: List[Segment] = []
+    for segment in original.segments:
+        key = segment_key(segment.name)
+        if key in replacements:
+            if replacements[key] not in kept:
+                kept.append(replacements[key])
+        else:
+            kept.append(segment)
+    kept.extend(segment for segment in replacements.values() if segment not in kept)
+    return original._replace(segments=tuple(kept))
+
+
+def changed_days(before: Itinerary, after: Itinerary) -> Tuple[int, ...]:
+    """Numbers of the days that differ between two versions of an itinerary."""
+    previous = {day.number: day for day in before.days}
+    return tuple(day.number for day in after.days if previous.get(day.number) != day)
@@ -0,0 +1,157 @@
+import html
+import re
+from functools import lru_cache
+from typing import List
+
+from utils.itinerary import Day, Itinerary, format_activity, itinerary_from_text, split_days
+
+# Rendered HTML is memoized by itinerary content, so a Streamlit rerun with an
+# unchanged itinerary costs a hash and a dictionary lookup.
+RENDER_CACHE_SIZE = 256
+
+_TIME_MARKERS = ("am:", "pm:", "am-", "pm-")
+_COST_RE = re.compile(r"\((?:[^()]*\b(?:AED|USD|EUR|GBP|INR|Cost)\b|[^()]*[$€£₹])[^()]*\)")
+
+
+def _mark_cost(line: str) -> str:
+    return _COST_RE.sub(lambda match: f'<span class="cost">{match.group(0)}</span>', line, count=1)
+
+
+class ItineraryTokenizer:
+    """Single-pass tokenizer that turns itinerary text into HTML, one line at a time.
+
+    Each line is classified once (heading, day title, transport, note or list
+    item) and emitted with its markup, so it also works on streamed output.
+    """
+
+    def __init__(self):
+        self.in_list = False
+
+    def feed(self, line: str) -> List[str]:
+        """Tokenize one line and return the HTML lines it produces."""
+        line = html.escape(line.strip().replace("**", ""), quote=False)
+        if not line:
+            return []
+
+        if line.startswith("## "):
+            return self._block(f"<h2>{line[3:]}</h2>")
+        if line.startswith("# "):
+            return self._block(f"<h1>{line[2:]}</h1>")
+        if line[:2] in ("* ", "• ", "- "):
+            line = line[2:]
+        if line.startswith("Day ") and ":" in line:
+            return self._block(f'<div class="day-title">{line}</div>')
+        if line.lower().startswith("transportation:"):
+            return self._block(f'<div class="transport-info">{_mark_cost(line)}</div>')
+        if line.startswith(("Note:", "Important:")):
+            return self._block(f'<div class="note">{line}</div>')
+
+        lowered = line.lower()
+        if any(marker in lowered for marker in _TIME_MARKERS):
+            time, _, rest = line.partition(":")
+            line = f'<span class="time">{time}</span>{rest}'
+        return self._item(f"<li>{_mark_cost(line)}</li>")
+
+    def close(self) -> List[str]:
+        """Return the HTML needed to close any open list."""
+        if self.in_list:
+            self.in_list = False
+            return ["</ul>"]
+        return []
+
+    def _block(self, markup: str) -> List[str]:
+        return self.close() + [markup]
+
+    def _item(self, markup: str) -> List[str]:
+        if self.in_list:
+            return [markup]
+        self.in_list = True
+        return ["<ul>", markup]
+
+
+def _render_text(text: str) -> str:
+    tokenizer = ItineraryTokenizer()
+    lines: List[str] = []
+    for line in text.split("\n"):
+        lines.extend(tokenizer.feed(line))
+    lines.extend(tokenizer.close())
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_itinerary_text(text: str) -> str:
+    """Render free-text itinerary output to HTML, memoized by content."""
+    return _render_text(text)
+
+
+def render_partial_text(text: str) -> str:
+    """Render an itinerary that is still streaming in.
+
+    Days before the last heading are complete: they are parsed and go
+    through the per-day cache, so each is rendered once. The text before
+    them and the day still arriving change on every poll, so they are
+    rendered without the text cache, which they would otherwise fill.
+    """
+    header, *days = split_days(text)
+    if len(days) < 2:
+        return _render_text(text)
+    parts = [_render_text(header)]
+    parts.extend(render_day(day) for day in itinerary_from_text("\n".join(days[:-1])).days)
+    parts.append(_render_text(days[-1]))
+    return "\n".join(part for part in parts if part)
+
+
+def _render_model(itinerary: Itinerary) -> str:
+    parts = []
+    for index, line in enumerate(itinerary.header):
+        parts.append(f"<h1>{html.escape(line)}</h1>" if index == 0 else f"<p>{html.escape(line)}</p>")
+    for day in itinerary.days:
+        parts.append(render_day(day))
+    if itinerary.notes:
+        parts.append("<h2>Notes</h2>")
+        parts.append("<ul>")
+        parts.extend(f"<li>{html.escape(note)}</li>" for note in itinerary.notes)
+        parts.append("</ul>")
+    return "\n".join(parts)
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_itinerary(itinerary: Itinerary) -> str:
+    """Render an ``Itinerary`` model to HTML, memoized by content."""
+    return _render_model(itinerary)
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE * 8)
+def render_day(day: Day) -> str:
+    """Render a single ``Day``; shared between itineraries that contain the same day."""
+    title = f"Day {day.number}: {day.title}" if day.title else f"Day {day.number}"
+    parts = [f'<div class="day-title">{html.escape(title)}</div>']
+    for segment in day.segments:
+        if segment.name:
+            parts.append(f"<p><strong>{html.escape(segment.name)}</strong></p>")
+        if not segment.activities:
+            continue
+        parts.append("<ul>")
+        for activity in segment.activities:
+            text = html.escape(format_activity(activity._replace(time="", cost="")))
+            if activity.time:
+                text = f'<span class="time">{html.escape(activity.time)}</span> {text}'
+            if activity.cost:
+                text = f'{text} <span class="cost">({html.escape(activity.cost)})</span>'
+            if activity.transport:
+                text += f'<div class="transport-info">Transportation: {html.escape(activity.transport)}</div>'
+            parts.append(f"<li>{text}</li>")
+        parts.append("</ul>")
+    return "\n".join(parts)
+
+
+def render_stats() -> dict:
+    """Return hit/miss counts for the render caches."""
+    return {
+        name: function.cache_info()._asdict()
+        for name, function in (
+            ("text", render_itinerary_text),
+            ("itinerary", render_itinerary),
+            ("day", render_day),
+        )
+    }
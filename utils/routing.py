@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import google.generativeai as genai
+
+
+class ModelProfile(NamedTuple):
+    """How calls routed to one tier are made.
+
+    ``max_output_tokens`` caps whatever output budget the caller asks for,
+    ``timeout_s`` is the per-request deadline, and ``fallback`` names the
+    tier to try when this one is failing or slow.
+    """
+    model_id: str
+    temperature: float
+    max_output_tokens: int
+    timeout_s: float
+    fallback: Optional[str] = None
+
+
+def default_profiles() -> Dict[str, ModelProfile]:
+    """Three tiers; model ids can be overridden with GEMINI_FAST_MODEL and GEMINI_MODEL."""
+    fast_model = os.getenv("GEMINI_FAST_MODEL", "gemini-2.0-flash-lite")
+    model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+    return {
+        # Extraction into JSON: short, deterministic, latency sensitive.
+        "fast": ModelProfile(fast_model, temperature=0.1, max_output_tokens=1024, timeout_s=20, fallback="standard"),
+        # Conversational turns.
+        "standard": ModelProfile(model, temperature=0.7, max_output_tokens=2048, timeout_s=40, fallback="large"),
+        # Itinerary generation: long, creative output.
+        "large": ModelProfile(model, temperature=0.9, max_output_tokens=8192, timeout_s=120, fallback="standard"),
+    }
+
+
+DEFAULT_STAGE_TIERS = {
+    "destination_info": "fast",
+    "preference_parsing": "fast",
+    "summary": "fast",
+    # One day at a time; whole revised or adapted itineraries need the large tier's output cap.
+    "refinement": "standard",
+    "itinerary_refinement": "large",
+    "refinement_scope": "fast",
+    "adaptation": "large",
+    "itinerary": "large",
+    "structured_itinerary": "large",
+    "schedule_segment": "large",
+}
+
+
+class _TierHealth:
+    __slots__ = ("calls", "failures", "consecutive_failures", "latency_ewma", "cooldown_until")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.cooldown_until = 0.0
+
+
+class ModelRouter:
+    """Map pipeline stages to model tiers, and steer around unhealthy tiers.
+
+    A tier cools down for ``cooldown_s`` after ``failure_threshold``
+    consecutive failures, or when its smoothed latency passes
+    ``slow_fraction`` of its timeout. While a tier cools down, stages routed
+    to it go to its fallback first. Once the cooldown ends, the tier is
+    tried again with a clean slate.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, ModelProfile]] = None,
+                 stage_tiers: Optional[Dict[str, str]] = None, default_tier: str = "large",
+                 base_config: Optional[Dict] = None,
+                 model_factory: Optional[Callable[[ModelProfile, Dict], object]] = None,
+                 failure_threshold: int = 3, cooldown_s: float = 30.0, slow_fraction: float = 0.8):
+        self.profiles = profiles if profiles is not None else default_profiles()
+        self.stage_tiers = dict(DEFAULT_STAGE_TIERS, **(stage_tiers or {}))
+        self.default_tier = default_tier
+        self.base_config = dict(base_config or {})
+        self.model_factory = model_factory or (
+            lambda profile, config: genai.GenerativeModel(profile.model_id, generation_config=config))
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.slow_fraction = slow_fraction
+        self._lock = threading.Lock()
+        self._models: Dict[str, object] = {}
+        self._health = {tier: _TierHealth() for tier in self.profiles}
+
+    def tier_for(self, stage: str) -> str:
+        tier = self.stage_tiers.get(stage, self.default_tier)
+        return tier if tier in self.profiles else self.default_tier
+
+    def candidates(self, stage: str) -> List[str]:
+        """Tiers to try for ``stage``, in order: healthy tiers of the fallback chain first."""
+        chain = []
+        tier = self.tier_for(stage)
+        while tier is not None and tier in self.profiles and tier not in chain:
+            chain.append(tier)
+            tier = self.profiles[tier].fallback
+        now = time.monotonic()
+        with self._lock:
+            return sorted(chain, key=lambda name: self._health[name].cooldown_until > now)
+
+    def generation_config(self, tier: str, overrides: Optional[Dict] = None) -> Dict:
+        """Full generation config for a call on ``tier``; the caller's output cap is clamped to the tier's."""
+        profile = self.profiles[tier]
+        config = dict(self.base_config, temperature=profile.temperature, max_output_tokens=profile.max_output_tokens)
+        config.update(overrides or {})
+        config["max_output_tokens"] = min(int(config["max_output_tokens"]), profile.max_output_tokens)
+        return config
+
+    def request_options(self, tier: str) -> Dict:
+        return {"timeout": self.profiles[tier].timeout_s}
+
+    def model(self, tier: str):
+        with self._lock:
+            model = self._models.get(tier)
+            if model is None:
+                profile = self.profiles[tier]
+                model = self._models[tier] = self.model_factory(profile, self.generation_config(tier))
+            return model
+
+    def set_model(self, model) -> None:
+        """Serve every tier from ``model``, e.g. a local fake in tests and benchmarks."""
+        with self._lock:
+            for tier in self.profiles:
+                self._models[tier] = model
+
+    def record(self, tier: str, seconds: float, failed: bool = False) -> None:
+        """Feed the outcome of one call on ``tier`` into its health."""
+        with self._lock:
+            health = self._health[tier]
+            health.calls += 1
+            if failed:
+                health.failures += 1
+                health.consecutive_failures += 1
+            else:
+                health.consecutive_failures = 0
+                previous = health.latency_ewma
+                health.latency_ewma = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+            slow = (health.latency_ewma is not None
+                    and health.latency_ewma > self.slow_fraction * self.profiles[tier].timeout_s)
+            if health.consecutive_failures >= self.failure_threshold or slow:
+                health.cooldown_until = time.monotonic() + self.cooldown_s
+                health.consecutive_failures = 0
+                health.latency_ewma = None
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                tier: {
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "latency_ewma_s": round(health.latency_ewma or 0.0, 3),
+                    "cooling_down": int(health.cooldown_until > now),
+                }
+                for tier, health in self._health.items()
+            }
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+from typing import Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from utils.deadline import DeadlineExceeded, remaining
+from utils.jobs import check_cancelled
+
+T = TypeVar("T")
+
+# How often a caller waiting on someone else's call checks whether its own job was cancelled.
+WAIT_SLICE_S = 0.2
+
+# Published instead of a failure that belongs to the caller who ran the call,
+# not to the call: waiting callers then run it again themselves.
+_HANDED_OFF = object()
+
+
+def _caller_failure(error: BaseException) -> bool:
+    """Failures of one caller rather than of the work: its job or task was cancelled, or its deadline passed.
+
+    ``JobCancelled`` and ``CancelledError`` derive from ``BaseException``, as
+    does anything else that is about the caller (``KeyboardInterrupt``). The
+    work runs under its caller's deadline, which says nothing about how
+    long the other callers can wait.
+    """
+    return not isinstance(error, Exception) or isinstance(error, DeadlineExceeded)
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the work; everyone who arrives while it is
+    in flight waits on the same future and gets the same result or exception.
+    Threaded (``do``) and asyncio (``ado``) callers share in-flight work, since
+    both wait on a ``concurrent.futures.Future``. Once a call finishes, the
+    next caller for that key starts a fresh one.
+
+    If the caller running the work is cancelled or runs out of time, the
+    others are not: the first of them to notice runs the work again in its
+    own name. Each waiting caller still stops when its own job is
+    cancelled or its own deadline passes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._counters = {"calls": 0, "executions": 0, "coalesced": 0, "handed_off": 0}
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            self._counters["calls"] += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            self._counters["executions"] += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result=None, error: Optional[BaseException] = None) -> None:
+        # Forget the key before publishing so later callers start a new call.
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if error is not None and _caller_failure(error):
+                self._counters["handed_off"] += 1
+        if error is None:
+            future.set_result(result)
+        elif _caller_failure(error):
+            future.set_result(_HANDED_OFF)
+        else:
+            future.set_exception(error)
+
+    def _wait(self, future: Future):
+        """Wait for another caller's call, stopping at this caller's own cancellation or deadline."""
+        while True:
+            check_cancelled()
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded("deadline passed waiting for a shared call")
+            done, _ = wait([future], timeout=WAIT_SLICE_S if left is None else min(WAIT_SLICE_S, left))
+            if done:
+                return future.result()
+
+    def do(self, key: Hashable, function: Callable[[], T]) -> T:
+        """Run ``function`` unless a call for ``key`` is already in flight, and return its result."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            result = self._wait(future)
+            if result is not _HANDED_OFF:
+                return result
+        try:
+            result = function()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """Async counterpart of ``do``; ``factory`` creates the coroutine to run."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                # Run the work as its own task so a cancelled caller does not
+                # cancel the call other callers are waiting on.
+                task = asyncio.ensure_future(factory())
+
+                def publish(done: asyncio.Future) -> None:
+                    if done.cancelled():
+                        self._finish(key, future, error=asyncio.CancelledError())
+                    elif done.exception() is not None:
+                        self._finish(key, future, error=done.exception())
+                    else:
+                        self._finish(key, future, done.result())
+
+                task.add_done_callback(publish)
+                # The caller that ran the work gets its own failure as it is.
+                return await asyncio.shield(task)
+            waiter = asyncio.wrap_future(future)
+            done, _ = await asyncio.wait({waiter}, timeout=remaining())
+            if not done:
+                raise DeadlineExceeded("deadline passed waiting for a shared call")
+            result = waiter.result()
+            if result is not _HANDED_OFF:
+                return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._in_flight)
+        return stats
@@ -0,0 +1,133 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Gemini averages roughly four characters per token for English text. Good
+# enough for budgeting without a network round trip to ``count_tokens``.
+CHARS_PER_TOKEN = 4
+
+# Upper bound on output tokens per call for gemini-2.0-flash.
+MODEL_MAX_OUTPUT_TOKENS = 8192
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text``."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _shorten(item: str, max_chars: int) -> str:
+    if len(item) <= max_chars:
+        return item
+    return item[:max_chars - 1].rstrip() + "…"
+
+
+def fit_lists(lists: Dict[str, List[str]], max_tokens: int, max_item_chars: int = 160) -> Dict[str, List[str]]:
+    """Trim named lists so that, joined with ", ", together they fit in ``max_tokens``.
+
+    Over-long items are shortened first, then items are taken round-robin
+    across the lists in their original order. Every list keeps its leading
+    entries, so a tight budget still covers each category instead of
+    spending everything on the first one.
+    """
+    items = {name: [_shorten(item, max_item_chars) for item in values] for name, values in lists.items()}
+    fitted: Dict[str, List[str]] = {name: [] for name in items}
+    remaining = max_tokens * CHARS_PER_TOKEN
+    for index in range(max((len(values) for values in items.values()), default=0)):
+        for name, values in items.items():
+            if index >= len(values):
+                continue
+            cost = len(values[index]) + 2
+            if cost > remaining:
+                return fitted
+            fitted[name].append(values[index])
+            remaining -= cost
+    return fitted
+
+
+def usage_counts(response) -> Tuple[Optional[int], Optional[int]]:
+    """Return ``(prompt_tokens, output_tokens)`` reported by the API, if any."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None) or None
+    output_tokens = getattr(usage, "candidates_token_count", None) or None
+    return prompt_tokens, output_tokens
+
+
+class TokenBudget:
+    """Size limits for prompts and responses.
+
+    ``input_tokens`` caps the destination lists placed in the itinerary
+    prompt, and ``context_tokens`` the "already planned" list in each
+    segment prompt. The itinerary output cap grows with trip length:
+    ``base_output_tokens`` plus ``output_tokens_per_day`` per day, clamped
+    to ``[min_output_tokens, max_output_tokens]``.
+    """
+
+    def __init__(self, input_tokens: int = 1500, context_tokens: int = 300,
+                 base_output_tokens: int = 400, output_tokens_per_day: int = 600,
+                 min_output_tokens: int = 1024, max_output_tokens: int = MODEL_MAX_OUTPUT_TOKENS,
+                 segment_output_tokens: int = 768, structured_overhead: float = 1.5):
+        self.input_tokens = input_tokens
+        self.context_tokens = context_tokens
+        self.base_output_tokens = base_output_tokens
+        self.output_tokens_per_day = output_tokens_per_day
+        self.min_output_tokens = min_output_tokens
+        self.max_output_tokens = max_output_tokens
+        self.segment_output_tokens = segment_output_tokens
+        # JSON keys and quoting make structured output longer than prose.
+        self.structured_overhead = structured_overhead
+
+    def output_tokens(self, duration: int, structured: bool = False) -> int:
+        """Output cap for a whole itinerary of ``duration`` days."""
+        tokens = self.base_output_tokens + self.output_tokens_per_day * max(1, duration)
+        if structured:
+            tokens = int(tokens * self.structured_overhead)
+        return max(self.min_output_tokens, min(self.max_output_tokens, tokens))
+
+
+class TokenUsage:
+    """Thread-safe per-stage tally of model calls and the tokens they used.
+
+    Counts come from the API's usage metadata; when a response carries none,
+    they are estimated from the prompt and response text and the call is
+    counted under ``estimated``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, prompt: str, response=None, text: str = "",
+               prompt_tokens: Optional[int] = None, output_tokens: Optional[int] = None) -> None:
+        if response is not None:
+            reported_prompt, reported_output = usage_counts(response)
+            prompt_tokens = prompt_tokens or reported_prompt
+            output_tokens = output_tokens or reported_output
+        estimated = prompt_tokens is None or output_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt)
+        if output_tokens is None:
+            output_tokens = estimate_tokens(text)
+        with self._lock:
+            counters = self._stages.setdefault(
+                stage, {"calls": 0, "prompt_tokens": 0, "output_tokens": 0, "estimated": 0}
+            )
+            counters["calls"] += 1
+            counters["prompt_tokens"] += prompt_tokens
+            counters["output_tokens"] += output_tokens
+            counters["estimated"] += int(estimated)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-stage counters plus a ``total`` entry summed across stages."""
+        with self._lock:
+            stats = {stage: dict(counters) for stage, counters in self._stages.items()}
+        total = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0, "estimated": 0}
+        for counters in stats.values():
+            for key in total:
+                total[key] += counters[key]
+        for counters in list(stats.values()) + [total]:
+            counters["total_tokens"] = counters["prompt_tokens"] + counters["output_tokens"]
+        stats["total"] = total
+        return stats
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
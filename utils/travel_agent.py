@@ -1,14 +1,44 @@
 import os
-from typing import Dict, List, Optional, Tuple
+import asyncio
+import contextvars
+import copy
+import hashlib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 from datetime import datetime, timedelta
 import google.generativeai as genai
-from pydantic import BaseModel
-import requests
+from pydantic import BaseModel, model_validator
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.memory import ConversationBufferMemory
-from langchain.chains import ConversationChain
-from langchain.prompts import PromptTemplate
+
+from utils.canonical import canonical_key, preference_differences, stored_itinerary
+from utils.deadline import (
+    DeadlineExceeded, check_deadline, deadline_after, deadline_at, deadline_in, remaining, stage_deadline,
+    stage_timeout,
+)
+from utils.hedging import HedgePolicy, hedge_policy_from_env
+from utils.jobs import check_cancelled
+from utils.itinerary import (
+    DAY_SCHEMA, ITINERARY_SCHEMA, Day, Itinerary, itinerary_from_dict, itinerary_from_json, itinerary_from_text,
+    itinerary_to_text,
+)
+from utils.legs import LegPlan, TripLeg, check_legs, leg_context, leg_days, merge_legs, plan_legs, route_label
+from utils.memory import ConversationMemory, get_conversation_memory
+from utils.metrics import Metrics, metrics_from_env
+from utils.preferences import PREFERENCE_FIELDS, extract_preferences, missing_fields
+from utils.refinement import SEGMENT_NAMES, feedback_scope, segment_key, splice_day
+from utils.routing import ModelRouter
+from utils.rate_limit import RateLimiter, backoff_delay, get_rate_limiter, is_retryable_error, is_throttle_error
+from utils.single_flight import SingleFlight
+from utils.tokens import TokenBudget, TokenUsage, estimate_tokens, fit_lists
+
+if TYPE_CHECKING:
+    # utils.geo loads numpy and the gazetteer code; it is imported where routes are planned.
+    from utils.geo import DayRoute
 
 class TravelPreferences(BaseModel):
     budget: str
@@ -26,11 +56,619 @@ class TravelPreferences(BaseModel):
     specific_interests: Optional[Dict[str, List[str]]] = None
     meal_preferences: Optional[Dict[str, str]] = None
     hidden_gems_preference: Optional[bool] = False
+    # Multi-destination trip: the stops in order, with their days adding up to
+    # ``duration``; ``destination`` then names the trip as a whole.
+    legs: Optional[List[TripLeg]] = None
+
+    @model_validator(mode="after")
+    def _check_legs(self):
+        if self.legs:
+            check_legs(self.legs, self.duration)
+        return self
+
+
+def preferences_from_dict(data: Dict) -> TravelPreferences:
+    """``TravelPreferences`` from JSON-style fields; ``end_date`` defaults to ``start_date`` plus ``duration``."""
+    data = dict(data)
+    if "end_date" not in data and "start_date" in data and "duration" in data:
+        start = datetime.fromisoformat(str(data["start_date"]))
+        data["end_date"] = start + timedelta(days=int(data["duration"]))
+    return TravelPreferences(**data)
+
+
+DEFAULT_CACHE_DIR = os.getenv("TRAVEL_AGENT_CACHE_DIR", ".cache")
+# Itineraries kept by canonical preferences, when an itinerary store is enabled.
+ITINERARY_STORE_PATH = os.path.join(DEFAULT_CACHE_DIR, "itineraries.sqlite3")
+
+# Destinations ``prewarm_destinations`` loads into the cache by default:
+# a comma-separated list, empty to disable.
+PREWARM_DESTINATIONS = tuple(
+    name.strip()
+    for name in os.getenv(
+        "TRAVEL_AGENT_PREWARM_DESTINATIONS",
+        "Paris,London,Rome,Barcelona,Tokyo,New York,Dubai,Bangkok,Istanbul,Amsterdam",
+    ).split(",")
+    if name.strip()
+)
+
+# Returned when destination info cannot be generated. It is a placeholder,
+# not a real answer, so it must never be written to the destination cache.
+FALLBACK_DESTINATION_INFO = {
+    "attractions": [
+        "Popular Landmark 1",
+        "Historic Site 1",
+        "Cultural Center",
+        "Local Market",
+        "City Park"
+    ],
+    "hidden_gems": [
+        "Local Secret Spot 1",
+        "Off-beaten Path Location",
+        "Local Favorite Place"
+    ],
+    "restaurants": [
+        "Local Cuisine Restaurant",
+        "Fine Dining Option",
+        "Casual Eatery",
+        "Street Food Spot",
+        "Cultural Restaurant"
+    ],
+    "events": [
+        "Local Festival",
+        "Cultural Event",
+        "Seasonal Activity"
+    ]
+}
+
+DESTINATION_INFO_KEYS = ("attractions", "hidden_gems", "restaurants", "events")
+
+# Under a deadline, destination info may take this share of the time left
+# before the itinerary is planned without it; with less than
+# MIN_ENRICHMENT_S left, it is not waited for at all.
+DESTINATION_INFO_SHARE = 0.3
+MIN_ENRICHMENT_S = 2.0
+# Share of the time left an optional adaptation of a stored itinerary may take.
+ADAPTATION_SHARE = 0.5
+
+# The text methods return one of these, instead of raising, when they fail.
+ITINERARY_ERROR = "An error occurred while generating the itinerary"
+NO_ITINERARY = "Unable to generate itinerary. Please try again."
+REFINEMENT_ERROR = "Sorry, I couldn't refine the itinerary right now"
+
+
+def is_error_text(text: str) -> bool:
+    """Whether ``text`` is a failure message from a text method rather than its result."""
+    return text.strip().startswith((ITINERARY_ERROR, NO_ITINERARY, REFINEMENT_ERROR))
+
+
+PRACTICAL_INFORMATION = (
+    "Emergency Numbers: Save local emergency contacts",
+    "Weather: Check daily forecast",
+    "Transportation: Download local transit apps",
+    "Bookings: Make reservations in advance",
+    "Local Customs: Research and respect local traditions",
+)
+
+# Generation config overrides for calls whose output is parsed as JSON.
+JSON_OUTPUT_CONFIG = {"response_mime_type": "application/json"}
+
+DESTINATION_INFO_CONFIG = dict(
+    JSON_OUTPUT_CONFIG,
+    response_schema={
+        "type": "OBJECT",
+        "properties": {key: {"type": "ARRAY", "items": {"type": "STRING"}} for key in DESTINATION_INFO_KEYS},
+        "required": list(DESTINATION_INFO_KEYS),
+    },
+)
+
+PREFERENCE_SCHEMAS = {
+    "dietary_preferences": {"type": "ARRAY", "items": {"type": "STRING"}},
+    "walking_tolerance": {"type": "STRING", "nullable": True},
+    "specific_interests": {"type": "ARRAY", "items": {"type": "STRING"}},
+    "budget": {"type": "STRING", "nullable": True},
+}
+
+
+def preferences_config(fields=PREFERENCE_FIELDS) -> Dict:
+    """JSON-mode config asking the model for ``fields`` only."""
+    return dict(
+        JSON_OUTPUT_CONFIG,
+        response_schema={"type": "OBJECT", "properties": {field: PREFERENCE_SCHEMAS[field] for field in fields}},
+    )
+
+
+ITINERARY_CONFIG = dict(JSON_OUTPUT_CONFIG, response_schema=ITINERARY_SCHEMA)
+
+# One regenerated day, and which days a refinement affects.
+DAY_CONFIG = dict(JSON_OUTPUT_CONFIG, response_schema=DAY_SCHEMA)
+SCOPE_CONFIG = dict(
+    JSON_OUTPUT_CONFIG,
+    response_schema={
+        "type": "OBJECT",
+        "properties": {
+            "days": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "day": {"type": "INTEGER"},
+                        "segments": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    },
+                    "required": ["day"],
+                },
+            },
+        },
+        "required": ["days"],
+    },
+)
+
+# Parts of the day generated separately in the day-level planning mode.
+SCHEDULE_SEGMENTS = ("Morning", "Afternoon", "Evening")
+
+SEGMENT_GUIDANCE = {
+    "Morning": ("Breakfast", "Start the day with a breakfast recommendation."),
+    "Afternoon": ("Lunch", "Include rest periods and alternative indoor options in case of bad weather."),
+    "Evening": ("Dinner", "Include evening activities or entertainment and transportation back to accommodation."),
+}
+
+T = TypeVar("T")
+
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop that runs all async model calls.
+
+    The SDK's async client is bound to the loop it was first used on, so every
+    coroutine that talks to the model is scheduled on this one background loop.
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="travel-agent-loop", daemon=True).start()
+            _event_loop = loop
+    return _event_loop
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run ``coro`` on the shared event loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+async def _on_shared_loop(coro: Awaitable[T]) -> T:
+    """Await ``coro`` on the shared event loop, whichever loop the caller runs on."""
+    loop = get_event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def normalize_destination(destination: str) -> str:
+    """Normalize a destination name so "  Paris " and "paris" share a cache key."""
+    return " ".join(destination.casefold().split())
+
+
+def _in_caller_context(function):
+    """Wrap ``function`` to run on worker threads in a copy of the caller's context.
+
+    Keeps context such as the current job visible to fanned-out model calls.
+    """
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(function, *args)
+
+
+def _is_destination_info(data) -> bool:
+    """Check that parsed model output looks like real destination info."""
+    if not isinstance(data, dict) or data == FALLBACK_DESTINATION_INFO:
+        return False
+    lists = [data.get(key) for key in DESTINATION_INFO_KEYS]
+    if any(value is not None and not isinstance(value, list) for value in lists):
+        return False
+    return any(lists)
+
+
+def _stringify_items(items) -> List[str]:
+    """Flatten destination info entries (strings or dicts) into prompt-ready strings."""
+    result = []
+    for item in items:
+        if isinstance(item, dict):
+            result.append("; ".join(f"{k}: {v}" for k, v in item.items()))
+        else:
+            result.append(str(item))
+    return result
+
+
+class DestinationCache:
+    """Two-tier destination info cache: an in-memory LRU in front of SQLite.
+
+    Entries expire ``ttl_seconds`` after they are written. Each tier is size
+    bounded and evicts its least recently used entries first. The SQLite tier
+    survives process restarts; pass ``path=None`` to keep the cache in memory.
+    """
+
+    def __init__(self, path: Optional[str] = os.path.join(DEFAULT_CACHE_DIR, "destination_info.sqlite3"),
+                 ttl_seconds: float = 7 * 24 * 3600, max_memory_entries: int = 256,
+                 max_disk_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                          "writes": 0, "memory_evictions": 0, "disk_evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+                self._db.execute(
+                    """CREATE TABLE IF NOT EXISTS destination_info (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL)"""
+                )
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS destination_info_last_access "
+                    "ON destination_info (last_access)"
+                )
+                self._db.commit()
+            except (sqlite3.Error, OSError):
+                # The disk tier is an optimization; fall back to memory only.
+                self._db = None
+
+    def get(self, destination: str) -> Optional[Dict]:
+        """Return cached info for ``destination`` or ``None`` on a miss."""
+        key = normalize_destination(destination)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            value = self._disk_get(key, now)
+            if value is not None:
+                self._remember(key, value[0], value[1])
+                self._counters["hits"] += 1
+                self._counters["disk_hits"] += 1
+                return value[1]
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, destination: str, info: Dict, ttl_seconds: Optional[float] = None) -> None:
+        """Store ``info`` for ``destination``. Placeholder data is ignored."""
+        if not _is_destination_info(info):
+            return
+        key = normalize_destination(destination)
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, expires_at, info)
+            self._disk_set(key, info, expires_at, now)
+            self._counters["writes"] += 1
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM destination_info")
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._disk_count()
+        return stats
+
+    def _remember(self, key: str, expires_at: float, value: Dict) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Dict]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM destination_info WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._db.execute("DELETE FROM destination_info WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE destination_info SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+            return row[1], json.loads(row[0])
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def _disk_set(self, key: str, value: Dict, expires_at: float, now: float) -> None:
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO destination_info (key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._db.execute("DELETE FROM destination_info WHERE expires_at <= ?", (now,))
+            excess = self._disk_count() - self.max_disk_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM destination_info WHERE key IN ("
+                    "SELECT key FROM destination_info ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self._counters["disk_evictions"] += excess
+            self._db.commit()
+        except sqlite3.Error:
+            pass
+
+    def _disk_count(self) -> int:
+        if self._db is None:
+            return 0
+        try:
+            return self._db.execute("SELECT COUNT(*) FROM destination_info").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+class IncompleteItinerary(ValueError):
+    """An itinerary with fewer days than the trip it was asked for."""
+
+
+class ResponseCache(ABC):
+    """Interface for content-addressed model response caches.
+
+    Keys are hex digests built by ``TravelAgent._response_cache_key``; values
+    are the plain text returned by the model.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """The cached text for ``key``, or None."""
+
+    @abstractmethod
+    def set(self, key: str, text: str) -> None:
+        """Cache ``text`` under ``key``, replacing any earlier entry."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and size counters."""
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU response cache bounded by the total size of stored text."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return text
+
+    def set(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.encode("utf-8"))
+            self._entries[key] = text
+            self._bytes += size
+            self._counters["writes"] += 1
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.encode("utf-8"))
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        return stats
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk response cache that can be shared by several processes.
+
+    The least recently used entries are evicted once the stored text exceeds
+    ``max_bytes``.
+    """
+
+    def __init__(self, path: str = os.path.join(DEFAULT_CACHE_DIR, "responses.sqlite3"),
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL)"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._db.commit()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            return row[0]
+
+    def set(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, text, size, time.time()),
+                )
+                self._counters["writes"] += 1
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._db.execute(
+                        "SELECT key, size FROM responses ORDER BY last_access"
+                    ).fetchall()
+                    stale = []
+                    for stale_key, stale_size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        stale.append((stale_key,))
+                        total -= stale_size
+                    self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
+                    self._counters["evictions"] += len(stale)
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            try:
+                entries, total = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            except sqlite3.Error:
+                entries, total = 0, 0
+            stats["entries"] = entries
+            stats["bytes"] = total
+        return stats
+
+
+class ItineraryStore:
+    """Generated itineraries kept by their canonical preferences (see utils/canonical.py).
+
+    Unlike a ``ResponseCache``, which answers an identical prompt, the store
+    answers near-identical requests: entries are ``{"body": ...,
+    "preferences": ...}`` and are keyed by ``TravelAgent._itinerary_key``.
+    Entries are kept in an SQLite file at ``path``, or in memory with
+    ``path=None``.
+    """
+
+    def __init__(self, path: Optional[str] = ITINERARY_STORE_PATH):
+        self._entries = SQLiteResponseCache(path) if path is not None else MemoryResponseCache()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The entry stored under ``key``, or None if there is none or it cannot be read."""
+        return stored_itinerary(self._entries.get(key))
+
+    def put(self, key: str, body: str, preferences: Dict) -> None:
+        self._entries.set(key, json.dumps({"body": body, "preferences": preferences}))
+
+    def stats(self) -> Dict[str, int]:
+        return self._entries.stats()
+
 
 class TravelAgent:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, destination_cache: Optional[DestinationCache] = None,
+                 response_cache: Optional[ResponseCache] = None, max_concurrent_requests: int = 8,
+                 max_schedule_workers: int = 6, rate_limiter: Optional[RateLimiter] = None,
+                 max_retries: int = 4, token_budget: Optional[TokenBudget] = None,
+                 metrics: Optional[Metrics] = None, router: Optional[ModelRouter] = None,
+                 conversation_memory: Optional[ConversationMemory] = None, max_prefetch_workers: int = 2,
+                 itinerary_store: Optional[ItineraryStore] = None, adapt_stored_itineraries: bool = False,
+                 hedge_policy: Optional[HedgePolicy] = None):
         
         genai.configure(api_key=api_key)
+        self.destination_cache = destination_cache if destination_cache is not None else DestinationCache()
+        # Optional; when set, identical model calls are answered from the cache.
+        self.response_cache = response_cache
+        # Optional; when set, generated itineraries are kept by their canonical
+        # preferences and near-identical requests reuse them (see utils/canonical.py).
+        self.itinerary_store = itinerary_store
+        self.adapt_stored_itineraries = adapt_stored_itineraries
+        # Every model call waits on the limiter, which is shared process-wide by default.
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.max_retries = max_retries
+        # Optional; when set, slow model calls get a duplicate (see utils/hedging.py).
+        self.hedge_policy = hedge_policy if hedge_policy is not None else hedge_policy_from_env()
+        # Concurrent identical lookups and model calls share one in-flight request.
+        self.single_flight = SingleFlight()
+        # Prompt/output size limits, and the tokens actually spent per pipeline stage.
+        self.token_budget = token_budget if token_budget is not None else TokenBudget()
+        self.token_usage = TokenUsage()
+        # Latency spans and counters; a no-op unless enabled (see ``metrics_from_env``).
+        self.metrics = metrics if metrics is not None else metrics_from_env()
+        # Refinement sessions: bounded per session and LRU-evicted, shared process-wide by default.
+        self.conversation_memory = (
+            conversation_memory if conversation_memory is not None else get_conversation_memory()
+        )
+        # Caps in-flight async model calls. Only ever used on the shared loop.
+        self._request_semaphore = asyncio.Semaphore(max_concurrent_requests)
+        # Worker pool shared by all day-level planning calls on this agent.
+        self.max_schedule_workers = max_schedule_workers
+        self._schedule_executor = ThreadPoolExecutor(
+            max_workers=max_schedule_workers, thread_name_prefix="travel-agent-schedule"
+        )
+        # Background destination lookups started ahead of a request (see ``prefetch_destination_info``).
+        self._prefetch_executor = ThreadPoolExecutor(
+            max_workers=max_prefetch_workers, thread_name_prefix="travel-agent-prefetch"
+        )
+        self._prefetch_lock = threading.Lock()
+        self._prefetches: Dict[str, Future] = {}
         
         generation_config = {
             "temperature": 0.9,
@@ -40,17 +678,25 @@ class TravelAgent:
             "response_mime_type": "text/plain",
         }
 
-        # Initialize model (use a stable, widely available Gemini model id)
-        self.model = genai.GenerativeModel(
-        "gemini-2.0-flash",
-        generation_config=generation_config
-)
+        # Each pipeline stage is served by a model tier (see utils/routing.py);
+        # tier profiles override the temperature and output cap.
+        self.generation_config = generation_config
+        self.router = router if router is not None else ModelRouter(base_config=generation_config)
 
-        
-    def _response_to_text(self, response) -> str:
+    @property
+    def model(self):
+        """Model of the default tier. Assigning one serves every tier from it (e.g. a fake)."""
+        return self.router.model(self.router.default_tier)
+
+    @model.setter
+    def model(self, model) -> None:
+        self.router.set_model(model)
+
+    def _response_to_text(self, response, strip: bool = True) -> str:
         """Extract plain text from Gemini responses that may contain multiple parts.
 
         Handles candidates/content.parts structures and falls back gracefully.
+        Pass ``strip=False`` for streamed chunks, whose edge whitespace matters.
         """
         try:
             # Fast path if SDK still provides .text for simple responses
@@ -78,7 +724,8 @@ class TravelAgent:
                     if isinstance(text_val, str):
                         parts_text.append(text_val)
 
-            return "".join(parts_text).strip()
+            text = "".join(parts_text)
+            return text.strip() if strip else text
         except Exception:
             return ""
 
@@ -96,62 +743,452 @@ class TravelAgent:
             t = "\n".join(lines).strip()
         return t
 
-    def _generate_plain_text(self, prompt: str) -> str:
-        """Generate content and extract plain text with a simple retry."""
+    def _response_cache_key(self, prompt: str, generation_config: Optional[Dict] = None,
+                            stage: str = "other") -> str:
+        """Hash the prompt together with everything else that shapes the response."""
+        tier = self.router.tier_for(stage)
+        payload = json.dumps(
+            {
+                "model": self.router.profiles[tier].model_id,
+                "generation_config": self.router.generation_config(tier, generation_config),
+                "prompt": prompt,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _generate_plain_text(self, prompt: str, cache: bool = True,
+                             generation_config: Optional[Dict] = None, stage: str = "other",
+                             validate: Optional[Callable[[str], object]] = None) -> str:
+        """Generate content and extract plain text with a simple retry.
+
+        Pass ``cache=False`` for calls whose output should vary between runs;
+        such calls are neither cached nor coalesced with identical calls.
+        ``generation_config`` overrides the model defaults for this call only,
+        and ``stage`` names the pipeline step its tokens are recorded under.
+        Only responses that pass ``validate`` (by default, for JSON-mode
+        calls, that they parse) are cached; a malformed one is returned for
+        the caller to handle but never replayed.
+        """
+        if not cache:
+            return self._generate_uncached(prompt, generation_config, stage)
+
+        cache_key = self._response_cache_key(prompt, generation_config, stage)
+        cached = self._cached_response(cache_key, generation_config, stage, validate)
+        if cached is not None:
+            return cached
+        return self.single_flight.do(
+            ("response", cache_key),
+            lambda: self._generate_and_store(prompt, generation_config, cache_key, stage, validate),
+        )
+
+    def _generate_and_store(self, prompt: str, generation_config: Optional[Dict], cache_key: str,
+                            stage: str, validate: Optional[Callable[[str], object]] = None) -> str:
+        text = self._generate_uncached(prompt, generation_config, stage)
+        if self.response_cache is not None and self._usable(text, generation_config, stage, validate):
+            self.response_cache.set(cache_key, text)
+        return text
+
+    async def _agenerate_plain_text(self, prompt: str, cache: bool = True,
+                                    generation_config: Optional[Dict] = None, stage: str = "other",
+                                    validate: Optional[Callable[[str], object]] = None) -> str:
+        """Async counterpart of ``_generate_plain_text``."""
+        if not cache:
+            return await _on_shared_loop(self._agenerate_uncached(prompt, generation_config, stage))
+
+        cache_key = self._response_cache_key(prompt, generation_config, stage)
+        cached = self._cached_response(cache_key, generation_config, stage, validate)
+        if cached is not None:
+            return cached
+        return await self.single_flight.ado(
+            ("response", cache_key),
+            lambda: self._agenerate_and_store(prompt, generation_config, cache_key, stage, validate),
+        )
+
+    async def _agenerate_and_store(self, prompt: str, generation_config: Optional[Dict], cache_key: str,
+                                   stage: str, validate: Optional[Callable[[str], object]] = None) -> str:
+        text = await _on_shared_loop(self._agenerate_uncached(prompt, generation_config, stage))
+        if self.response_cache is not None and self._usable(text, generation_config, stage, validate):
+            self.response_cache.set(cache_key, text)
+        return text
+
+    def _cached_response(self, cache_key: str, generation_config: Optional[Dict], stage: str,
+                         validate: Optional[Callable[[str], object]]) -> Optional[str]:
+        """The cached response for ``cache_key``, skipping an entry its consumer could not use."""
+        if self.response_cache is None:
+            return None
+        cached = self.response_cache.get(cache_key)
+        if cached is not None and not self._usable(cached, generation_config, stage, validate):
+            # Written before responses were checked; the next good response replaces it.
+            cached = None
+        self.metrics.increment("cache_hits" if cached is not None else "cache_misses",
+                               cache="response", stage=stage)
+        return cached
+
+    def _usable(self, text: str, generation_config: Optional[Dict], stage: str,
+                validate: Optional[Callable[[str], object]]) -> bool:
+        if not text:
+            return False
+        if validate is None and (generation_config or {}).get("response_mime_type") == "application/json":
+            validate = lambda text: json.loads(self._strip_code_fences(text))
+        if validate is None:
+            return True
+        try:
+            validate(text)
+        except Exception:
+            self.metrics.increment("invalid_responses", stage=stage)
+            return False
+        return True
+
+    def _estimate_tokens(self, prompt: str, generation_config: Optional[Dict] = None) -> int:
+        """Reserve the estimated input tokens plus the full output cap."""
+        config = dict(self.generation_config, **(generation_config or {}))
+        return estimate_tokens(prompt) + int(config.get("max_output_tokens") or 0)
+
+    def _used_tokens(self, response) -> Optional[int]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", None) or None
+
+    def _call_model(self, prompt: str, generation_config: Optional[Dict] = None, stream: bool = False,
+                    stage: str = "other"):
+        """Call the model through the rate limiter, retrying retryable errors with backoff.
+
+        Each attempt goes to a tier the router picks for ``stage``: after a
+        retryable failure the next attempt moves down the fallback chain, and
+        only backs off when it stays on the same tier.
+        Under a deadline (see utils/deadline.py) each attempt's timeout is cut
+        to the time left, and ``DeadlineExceeded`` is raised instead of
+        starting an attempt, or waiting for quota, past it.
+        With ``stream=True`` this returns ``(response, reserved_tokens)``; the
+        caller releases the limiter slot once the stream is consumed.
+        """
+        tiers = self.router.candidates(stage)
+        for attempt in range(self.max_retries + 1):
+            # A cancelled job stops here instead of starting another call.
+            check_cancelled()
+            check_deadline(f"{stage} call")
+            tier = tiers[min(attempt, len(tiers) - 1)]
+            config = self._tier_config(tier, generation_config, stage)
+            reserved = self._estimate_tokens(prompt, config)
+            if not self.rate_limiter.acquire(reserved, timeout=remaining()):
+                raise DeadlineExceeded(f"deadline passed waiting for quota for {stage} call")
+            started = time.perf_counter()
+            try:
+                with self.metrics.span("model_call", stage=stage, tier=tier):
+                    response = self.router.model(tier).generate_content(
+                        prompt, generation_config=config, stream=stream,
+                        request_options=self._request_options(tier))
+            except Exception as e:
+                self.router.record(tier, time.perf_counter() - started, failed=True)
+                self.rate_limiter.release(reserved, throttled=is_throttle_error(e), failed=True)
+                # A call timed out by the deadline reports the deadline, not an API error.
+                check_deadline(f"{stage} call")
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    raise
+                self.metrics.increment("retries", stage=stage, error=type(e).__name__)
+                if tiers[min(attempt + 1, len(tiers) - 1)] == tier:
+                    time.sleep(self._backoff(attempt))
+                continue
+            self.router.record(tier, time.perf_counter() - started)
+            if stream:
+                return response, reserved
+            if self.hedge_policy is not None:
+                self.hedge_policy.observe(stage, time.perf_counter() - started)
+            self.rate_limiter.release(reserved, used_tokens=self._used_tokens(response))
+            self.token_usage.record(stage, prompt, response, self._response_to_text(response))
+            return response
+
+    def _tier_config(self, tier: str, generation_config: Optional[Dict], stage: str) -> Dict:
+        """The call's config on ``tier``, counting calls whose output budget the tier cuts short."""
+        config = self.router.generation_config(tier, generation_config)
+        requested = int((generation_config or {}).get("max_output_tokens") or 0)
+        if requested > config["max_output_tokens"]:
+            self.metrics.increment("output_capped", stage=stage, tier=tier)
+        return config
+
+    def _request_options(self, tier: str) -> Dict:
+        """The tier's request options, with the timeout cut to what is left of the deadline."""
+        options = self.router.request_options(tier)
+        options["timeout"] = stage_timeout(options["timeout"])
+        return options
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff before retry ``attempt``, never sleeping past the deadline."""
+        left = remaining()
+        return backoff_delay(attempt) if left is None else max(0.0, min(backoff_delay(attempt), left))
+
+    async def _acall_model(self, prompt: str, generation_config: Optional[Dict] = None, stage: str = "other"):
+        """Async counterpart of ``_call_model``; this is also where calls are hedged."""
+        tiers = self.router.candidates(stage)
+        for attempt in range(self.max_retries + 1):
+            check_cancelled()
+            check_deadline(f"{stage} call")
+            tier = tiers[min(attempt, len(tiers) - 1)]
+            config = self._tier_config(tier, generation_config, stage)
+            reserved = self._estimate_tokens(prompt, config)
+            if not await self.rate_limiter.aacquire(reserved, timeout=remaining()):
+                raise DeadlineExceeded(f"deadline passed waiting for quota for {stage} call")
+            try:
+                async with self._request_semaphore:
+                    started = time.perf_counter()
+                    with self.metrics.span("model_call", stage=stage, tier=tier):
+                        response = await self._asend(prompt, config, tier, stage, reserved)
+            except asyncio.CancelledError:
+                self.rate_limiter.release(reserved, failed=True)
+                raise
+            except Exception as e:
+                self.router.record(tier, time.perf_counter() - started, failed=True)
+                self.rate_limiter.release(reserved, throttled=is_throttle_error(e), failed=True)
+                # A call timed out by the deadline reports the deadline, not an API error.
+                check_deadline(f"{stage} call")
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    raise
+                self.metrics.increment("retries", stage=stage, error=type(e).__name__)
+                if tiers[min(attempt + 1, len(tiers) - 1)] == tier:
+                    await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.router.record(tier, time.perf_counter() - started)
+            if self.hedge_policy is not None:
+                self.hedge_policy.observe(stage, time.perf_counter() - started)
+            self.rate_limiter.release(reserved, used_tokens=self._used_tokens(response))
+            self.token_usage.record(stage, prompt, response, self._response_to_text(response))
+            return response
+
+    async def _asend(self, prompt: str, config: Dict, tier: str, stage: str, reserved: int):
+        """Make one model call, hedged when the hedge policy allows it.
+
+        If the call is still running after the stage's hedge delay, and the
+        policy and rate limiter both have room right away, a duplicate goes
+        to the same tier. The first successful answer wins and the other
+        call is cancelled. The duplicate's limiter slot keeps its full
+        reservation, since a cancelled call's usage is unknown.
+        """
+        model = self.router.model(tier)
+        options = self._request_options(tier)
+
+        def send():
+            return asyncio.ensure_future(
+                model.generate_content_async(prompt, generation_config=config, request_options=options))
+
+        delay = self.hedge_policy.delay(stage) if self.hedge_policy is not None else None
+        left = remaining()
+        if delay is None or (left is not None and left <= delay):
+            return await send()
+        primary = send()
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.hedge_policy.try_start():
+            return await primary
+        if not self.rate_limiter.try_acquire(reserved):
+            self.hedge_policy.finish(won=False)
+            return await primary
+        self.metrics.increment("hedges", stage=stage, tier=tier)
+        hedge = send()
+        won = False
+        try:
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        won = task is hedge
+                        return task.result()
+            # Both failed: report the original call's error.
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                task.cancel()
+            self.hedge_policy.finish(won)
+            self.rate_limiter.release(reserved)
+            if won:
+                self.metrics.increment("hedge_wins", stage=stage, tier=tier)
+
+    async def _agenerate_uncached(self, prompt: str, generation_config: Optional[Dict] = None,
+                                  stage: str = "other") -> str:
         last_text = ""
         for _ in range(2):
-            response = self.model.generate_content(prompt)
+            response = await self._acall_model(prompt, generation_config, stage)
             text = self._response_to_text(response)
             if text:
                 return text.strip()
+            self.metrics.increment("empty_responses", stage=stage)
             last_text = text or ""
         return last_text
 
-    def _create_initial_prompt(self) -> str:
-        return """You are an expert travel agent AI assistant. Your goal is to help users plan 
-        their perfect trip by gathering necessary information and creating personalized itineraries.
-        
-        Please gather the following essential information from the user:
-        1. Budget (specific amount or range)
-        2. Trip duration and dates
-        3. Starting location and destination
-        4. Purpose of travel
-        
-        Then, dive deeper into preferences:
-        1. Dietary Requirements:
-           - Any specific dietary restrictions (vegetarian, vegan, gluten-free, etc.)
-           - Preferred cuisines
-           - Any food allergies
-        
-        2. Activity Preferences:
-           - Interest in local culture and history
-           - Adventure activities
-           - Shopping preferences
-           - Art and museum interests
-           - Nature and outdoor activities
-           - Nightlife preferences
-        
-        3. Mobility and Accessibility:
-           - Walking tolerance (hours per day)
-           - Need for accessibility accommodations
-           - Preferred transportation methods
-        
-        4. Accommodation Details:
-           - Preferred type (hotel, hostel, apartment)
-           - Must-have amenities
-           - Location preferences (city center, quiet area)
-        
-        5. Special Interests:
-           - Hidden gems vs. popular attractions
-           - Local experiences
-           - Photography spots
-           - Special events or festivals
-        
-        Be conversational and friendly while gathering this information."""
+    def _generate_uncached(self, prompt: str, generation_config: Optional[Dict] = None,
+                           stage: str = "other") -> str:
+        if self.hedge_policy is not None:
+            # Hedging races two calls and cancels the slower, which takes the async client.
+            return run_async(self._agenerate_uncached(prompt, generation_config, stage))
+        last_text = ""
+        for _ in range(2):
+            response = self._call_model(prompt, generation_config, stage=stage)
+            text = self._response_to_text(response)
+            if text:
+                return text.strip()
+            self.metrics.increment("empty_responses", stage=stage)
+            last_text = text or ""
+        return last_text
+
+    def prefetch_destination_info(self, destination: str) -> Optional[Future]:
+        """Start loading destination info in the background, as soon as the destination is known.
+
+        Returns the lookup's future, or ``None`` for a blank destination.
+        A request that needs the same destination while the lookup is still
+        running waits for it instead of starting another; once it is done,
+        the request is served from the cache. Repeated calls for a lookup
+        already under way return the same future.
+        """
+        return self._prefetch(destination, "prefetch")
+
+    def prewarm_destinations(self, destinations: Optional[List[str]] = None) -> List[Future]:
+        """Load ``destinations`` (default ``PREWARM_DESTINATIONS``) into the cache in the background.
+
+        Meant to run once at startup. Destinations already cached cost a
+        cache lookup; the rest are fetched one at a time on a daemon thread
+        of their own. They never queue ahead of a request's lookup on the
+        prefetch pool, and they never hold up interpreter exit.
+        """
+        pending = [(destination, Future())
+                   for destination in (PREWARM_DESTINATIONS if destinations is None else destinations)
+                   if normalize_destination(destination)]
+        if not pending:
+            return []
+
+        def run():
+            for destination, future in pending:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(self._get_destination_info(destination))
+                except BaseException as e:
+                    future.set_exception(e)
+
+        threading.Thread(target=run, name="travel-agent-prewarm", daemon=True).start()
+        self.metrics.increment("prefetches", len(pending), kind="prewarm")
+        return [future for _, future in pending]
+
+    def _prefetch(self, destination: str, kind: str) -> Optional[Future]:
+        key = normalize_destination(destination)
+        if not key:
+            return None
+        with self._prefetch_lock:
+            future = self._prefetches.get(key)
+            if future is not None:
+                return future
+            future = self._prefetches[key] = self._prefetch_executor.submit(
+                self._get_destination_info, destination)
+        self.metrics.increment("prefetches", kind=kind)
+        future.add_done_callback(lambda done: self._forget_prefetch(key, done))
+        return future
+
+    def _forget_prefetch(self, key: str, future: Future) -> None:
+        with self._prefetch_lock:
+            if self._prefetches.get(key) is future:
+                del self._prefetches[key]
 
     def _get_destination_info(self, destination: str) -> Dict:
+        """Return destination information, served from the cache when possible."""
+        cached = self.destination_cache.get(destination)
+        self.metrics.increment("cache_hits" if cached is not None else "cache_misses",
+                               cache="destination", stage="destination_info")
+        if cached is not None:
+            return cached
+        return self.single_flight.do(
+            ("destination", normalize_destination(destination)),
+            lambda: self._load_destination_info(destination),
+        )
+
+    def _load_destination_info(self, destination: str) -> Dict:
+        try:
+            with self.metrics.span("stage", stage="destination_info"):
+                destination_data = self._fetch_destination_info(destination)
+        except Exception:
+            # Never cache the placeholder: the next request should retry the model.
+            self.metrics.increment("fallbacks", kind="destination_info")
+            return copy.deepcopy(FALLBACK_DESTINATION_INFO)
+
+        self.destination_cache.set(destination, destination_data)
+        return destination_data
+
+    async def _aget_destination_info(self, destination: str) -> Dict:
+        """Async counterpart of ``_get_destination_info``."""
+        cached = self.destination_cache.get(destination)
+        self.metrics.increment("cache_hits" if cached is not None else "cache_misses",
+                               cache="destination", stage="destination_info")
+        if cached is not None:
+            return cached
+        return await self.single_flight.ado(
+            ("destination", normalize_destination(destination)),
+            lambda: self._aload_destination_info(destination),
+        )
+
+    async def _aload_destination_info(self, destination: str) -> Dict:
+        try:
+            with self.metrics.span("stage", stage="destination_info"):
+                info_text = await self._agenerate_plain_text(
+                    self._create_destination_prompt(destination), generation_config=DESTINATION_INFO_CONFIG,
+                    stage="destination_info", validate=self._parse_destination_info)
+                destination_data = self._parse_destination_info(info_text)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="destination_info")
+            return copy.deepcopy(FALLBACK_DESTINATION_INFO)
+
+        self.destination_cache.set(destination, destination_data)
+        return destination_data
+
+    def _destination_info_in_time(self, destination: str) -> Dict:
+        """Destination info, or empty lists when it cannot arrive in time under the current deadline.
+
+        Without a deadline this is ``_get_destination_info``. Under one, a
+        lookup that is not cached gets ``DESTINATION_INFO_SHARE`` of the time
+        left (none below ``MIN_ENRICHMENT_S``). The itinerary is then planned
+        from the model's own knowledge rather than failing the request.
+        The lookup runs on the prefetch pool, outside the deadline, so it
+        still completes and fills the cache for the next request.
+        """
+        left = remaining()
+        if left is None:
+            return self._get_destination_info(destination)
+        cached = self.destination_cache.get(destination)
+        if cached is not None:
+            return cached
+        lookup = self._prefetch(destination, "request")
+        if lookup is not None and left >= MIN_ENRICHMENT_S:
+            try:
+                return lookup.result(timeout=left * DESTINATION_INFO_SHARE)
+            except FutureTimeoutError:
+                pass
+        self.metrics.increment("degraded", kind="destination_info")
+        return {key: [] for key in DESTINATION_INFO_KEYS}
+
+    async def _adestination_info_in_time(self, destination: str) -> Dict:
+        """Async counterpart of ``_destination_info_in_time``."""
+        left = remaining()
+        if left is None:
+            return await self._aget_destination_info(destination)
+        cached = self.destination_cache.get(destination)
+        if cached is not None:
+            return cached
+        # Started in an empty context, so the request's deadline does not cut the lookup short.
+        lookup = contextvars.Context().run(asyncio.ensure_future, self._aget_destination_info(destination))
+        if left >= MIN_ENRICHMENT_S:
+            try:
+                return await asyncio.wait_for(asyncio.shield(lookup), timeout=left * DESTINATION_INFO_SHARE)
+            except asyncio.TimeoutError:
+                pass
+        self.metrics.increment("degraded", kind="destination_info")
+        return {key: [] for key in DESTINATION_INFO_KEYS}
+
+    def _fetch_destination_info(self, destination: str) -> Dict:
         """Use AI to generate destination information when web search is not available."""
-        destination_prompt = f"""Generate detailed travel information for {destination} including:
+        info_text = self._generate_plain_text(
+            self._create_destination_prompt(destination), generation_config=DESTINATION_INFO_CONFIG,
+            stage="destination_info", validate=self._parse_destination_info)
+        return self._parse_destination_info(info_text)
+
+    def _create_destination_prompt(self, destination: str) -> str:
+        return f"""Generate detailed travel information for {destination} including:
         1. Top 5 must-visit attractions
         2. 3 hidden gems or local secrets
         3. 5 recommended restaurants (mix of cuisines and price ranges)
@@ -160,76 +1197,121 @@ class TravelAgent:
         Format the response as a JSON with these keys: attractions, hidden_gems, restaurants, events.
         Each should be a list of strings with brief descriptions."""
 
+    def _parse_destination_info(self, info_text: str) -> Dict:
+        """Parse the destination info JSON, raising if it is not usable."""
+        info_text = self._strip_code_fences(info_text)
+        # Responses are requested as JSON; the brace search only covers models
+        # that ignore the response MIME type.
         try:
-            info_text = self._generate_plain_text(destination_prompt)
-            info_text = self._strip_code_fences(info_text)
-            # Be resilient: try to locate JSON braces if there is extra text
-            try:
-                destination_data = json.loads(info_text)
-            except Exception:
-                start = info_text.find('{')
-                end = info_text.rfind('}')
-                if start != -1 and end != -1 and end > start:
-                    destination_data = json.loads(info_text[start:end+1])
-                else:
-                    raise
-            return destination_data
-        except:
-          
-            return {
-                "attractions": [
-                    "Popular Landmark 1",
-                    "Historic Site 1",
-                    "Cultural Center",
-                    "Local Market",
-                    "City Park"
-                ],
-                "hidden_gems": [
-                    "Local Secret Spot 1",
-                    "Off-beaten Path Location",
-                    "Local Favorite Place"
-                ],
-                "restaurants": [
-                    "Local Cuisine Restaurant",
-                    "Fine Dining Option",
-                    "Casual Eatery",
-                    "Street Food Spot",
-                    "Cultural Restaurant"
-                ],
-                "events": [
-                    "Local Festival",
-                    "Cultural Event",
-                    "Seasonal Activity"
-                ]
-            }
+            destination_data = json.loads(info_text)
+        except Exception:
+            start = info_text.find('{')
+            end = info_text.rfind('}')
+            if start != -1 and end != -1 and end > start:
+                destination_data = json.loads(info_text[start:end+1])
+            else:
+                raise
+        if not _is_destination_info(destination_data):
+            raise ValueError("Destination info response is missing the expected lists")
+        return destination_data
+
+    def _route_plan(self, preferences: TravelPreferences, destination_info: Dict) -> Optional[List["DayRoute"]]:
+        """Group and order the destination's places per day locally, or ``None`` if too few geocode.
+
+        Attractions come before hidden gems unless hidden gems are preferred,
+        so the days keep the places that matter most to the traveller.
+        """
+        from utils.geo import plan_routes
+
+        attractions = _stringify_items(destination_info.get("attractions", []))
+        hidden_gems = _stringify_items(destination_info.get("hidden_gems", []))
+        places = hidden_gems + attractions if preferences.hidden_gems_preference else attractions + hidden_gems
+        with self.metrics.span("stage", stage="route_planning"):
+            return plan_routes(
+                preferences.destination, places, preferences.duration, preferences.walking_tolerance,
+                restaurants=_stringify_items(destination_info.get("restaurants", [])),
+            )
+
     def _create_daily_schedule(self, preferences: TravelPreferences, day_num: int, 
                                  attractions: List[str], restaurants: List[str]) -> str:
         """Create a structured schedule for a single day."""
-        morning_prompt = f"""Create a detailed morning schedule for day {day_num} in {preferences.destination},
+        plan = self._plan_day_segments(max(preferences.duration, day_num), attractions, restaurants)[day_num - 1]
+        prompts = [
+            self._create_segment_prompt(preferences, day_num, segment, *plan[segment])
+            for segment in SCHEDULE_SEGMENTS
+        ]
+        segments = list(self._schedule_executor.map(_in_caller_context(self._generate_segment), prompts))
+        return self._format_day(day_num, segments)
+
+    def _plan_day_segments(self, duration: int, attractions: List[str], restaurants: List[str],
+                           routes: Optional[List["DayRoute"]] = None,
+                           ) -> List[Dict[str, Tuple[List[str], List[str], List[str]]]]:
+        """Spread attractions and restaurants over every day/segment of the trip.
+
+        Each slot gets its own attractions, a restaurant for its meal, and the
+        attractions assigned elsewhere so parallel calls don't repeat each other.
+        With ``routes``, each day's ordered stops are cut into consecutive runs
+        for its segments and its nearby restaurants come first; attractions
+        the routes leave out are spread as usual.
+        """
+        slots = [(day, segment) for day in range(duration) for segment in SCHEDULE_SEGMENTS]
+        assigned: Dict[Tuple[int, str], List[str]] = {slot: [] for slot in slots}
+        meals: Dict[Tuple[int, str], str] = {}
+        routed = set()
+        for route in (routes or [])[:duration]:
+            count = len(SCHEDULE_SEGMENTS)
+            for position, segment in enumerate(SCHEDULE_SEGMENTS):
+                # Rounded up, so short days fill the morning first.
+                start = -(-position * len(route.stops) // count)
+                end = -(-(position + 1) * len(route.stops) // count)
+                assigned[(route.day - 1, segment)].extend(route.stops[start:end])
+                if position < len(route.restaurants):
+                    meals[(route.day - 1, segment)] = route.restaurants[position]
+            routed.update(route.stops)
+        unrouted = [attraction for attraction in attractions if attraction not in routed]
+        for index, attraction in enumerate(unrouted):
+            assigned[slots[index % len(slots)]].append(attraction)
+
+        plan = []
+        for day in range(duration):
+            day_plan = {}
+            for position, segment in enumerate(SCHEDULE_SEGMENTS):
+                own = assigned[(day, segment)]
+                meal = []
+                if (day, segment) in meals:
+                    meal = [meals[(day, segment)]]
+                elif restaurants:
+                    meal = [restaurants[(day * len(SCHEDULE_SEGMENTS) + position) % len(restaurants)]]
+                elsewhere = [item for item in attractions if item not in own]
+                day_plan[segment] = (own, meal, elsewhere)
+            plan.append(day_plan)
+        return plan
+
+    def _create_segment_prompt(self, preferences: TravelPreferences, day_num: int, segment: str,
+                               attractions: List[str], restaurants: List[str],
+                               planned_elsewhere: List[str]) -> str:
+        """Build a self-contained prompt for one segment of one day."""
+        meal, guidance = SEGMENT_GUIDANCE[segment]
+        # On long trips the list of everything planned elsewhere outgrows the rest of the prompt.
+        planned_elsewhere = fit_lists({"elsewhere": planned_elsewhere}, self.token_budget.context_tokens)["elsewhere"]
+        return f"""Create a detailed {segment.lower()} schedule for day {day_num} of a {preferences.duration}-day trip to {preferences.destination},
         considering the following preferences:
+        - Budget: {preferences.budget}
+        - Purpose: {preferences.purpose}
+        - Interests: {', '.join(preferences.interests) if preferences.interests else 'Various activities'}
         - Walking tolerance: {preferences.walking_tolerance}
+        - Mobility: {preferences.mobility_requirements}
         - Dietary preferences: {', '.join(preferences.dietary_preferences or ['No restrictions'])}
-        - Available attractions: {', '.join(attractions[:3] if attractions else ['No attractions'])}
-        - Breakfast options: {', '.join(restaurants[:2] if restaurants else ['No restaurants'])}
-        """
-    
-        afternoon_prompt = """Create an afternoon schedule that includes:
-        - Lunch recommendations
-        - Main attractions or activities
-        - Rest periods
-        - Alternative indoor options in case of bad weather"""
-    
-        evening_prompt = """Plan an evening that includes:
-        - Dinner recommendations
-        - Evening activities or entertainment
-        - Transportation back to accommodation"""
-    
-            
-            
-        morning = self._generate_plain_text(morning_prompt)
-        afternoon = self._generate_plain_text(afternoon_prompt)
-        evening = self._generate_plain_text(evening_prompt)
-            
+        - Attractions for this {segment.lower()}: {', '.join(attractions) if attractions else 'Your choice of local highlights'}
+        - {meal} options: {', '.join(restaurants) if restaurants else 'Your choice of local restaurants'}
+        - Already planned at other times of the trip, do not repeat: {', '.join(planned_elsewhere) if planned_elsewhere else 'Nothing yet'}
+
+        {guidance}
+        Include specific timing, transportation between stops and estimated costs.
+        Only cover the {segment.lower()}; the rest of the day is planned separately."""
+
+    def _format_day(self, day_num: int, segments: List[str]) -> str:
+        morning, afternoon, evening = segments
         return f"""Day {day_num}:
     
     Morning:
@@ -240,30 +1322,458 @@ class TravelAgent:
     
     Evening:
     {evening}"""
-    def generate_itinerary(self, preferences: TravelPreferences, feedback: str = "") -> str:
-        """Generate a complete, personalized travel itinerary."""
+
+    def _create_schedule_prompts(self, preferences: TravelPreferences, destination_info: Dict) -> List[str]:
+        """Build every day/segment prompt of the trip, in itinerary order."""
+        attractions = _stringify_items(destination_info.get("attractions", []))
+        hidden_gems = _stringify_items(destination_info.get("hidden_gems", []))
+        restaurants = _stringify_items(destination_info.get("restaurants", []))
+        if preferences.hidden_gems_preference:
+            attractions = hidden_gems + attractions
+        else:
+            attractions = attractions + hidden_gems
+
+        routes = self._route_plan(preferences, destination_info)
+        plan = self._plan_day_segments(preferences.duration, attractions, restaurants, routes)
+        return [
+            self._create_segment_prompt(preferences, day + 1, segment, *plan[day][segment])
+            for day in range(preferences.duration)
+            for segment in SCHEDULE_SEGMENTS
+        ]
+
+    def _stitch_schedules(self, segments: List[str]) -> str:
+        """Join per-segment results, in order, into the day-by-day itinerary body."""
+        count = len(SCHEDULE_SEGMENTS)
+        return "\n\n".join(
+            self._format_day(index // count + 1, segments[index:index + count])
+            for index in range(0, len(segments), count)
+        )
+
+    def _generate_daily_schedules(self, preferences: TravelPreferences, destination_info: Dict,
+                                  max_workers: Optional[int] = None) -> str:
+        """Generate every day/segment in parallel and stitch the days back in order."""
+        prompts = self._create_schedule_prompts(preferences, destination_info)
+        generate = _in_caller_context(self._generate_segment)
+        if max_workers is None or max_workers >= self.max_schedule_workers:
+            segments = list(self._schedule_executor.map(generate, prompts))
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                segments = list(executor.map(generate, prompts))
+        if not all(segments):
+            return ""
+        return self._stitch_schedules(segments)
+
+    async def _agenerate_daily_schedules(self, preferences: TravelPreferences, destination_info: Dict,
+                                         max_workers: Optional[int] = None) -> str:
+        """Async counterpart of ``_generate_daily_schedules``."""
+        prompts = self._create_schedule_prompts(preferences, destination_info)
+        limit = asyncio.Semaphore(max(1, max_workers or self.max_schedule_workers))
+
+        async def generate(prompt: str) -> str:
+            async with limit:
+                return await self._agenerate_plain_text(
+                    prompt, generation_config=self._segment_config(), stage="schedule_segment")
+
+        segments = await asyncio.gather(*(generate(prompt) for prompt in prompts))
+        if not all(segments):
+            return ""
+        return self._stitch_schedules(list(segments))
+
+    def _segment_config(self) -> Dict:
+        return {"max_output_tokens": self.token_budget.segment_output_tokens}
+
+    def _generate_segment(self, prompt: str) -> str:
+        return self._generate_plain_text(prompt, generation_config=self._segment_config(), stage="schedule_segment")
+
+    def _itinerary_config(self, preferences: TravelPreferences, structured: bool = False) -> Dict:
+        """Generation config with an output cap scaled to the trip length."""
+        base = ITINERARY_CONFIG if structured else {}
+        return dict(base, max_output_tokens=self.token_budget.output_tokens(preferences.duration, structured))
+
+    def metrics_text(self, extra_stats: Optional[Dict[str, Dict]] = None) -> str:
+        """Plain-text (Prometheus format) dump of this agent's metrics and current stats.
+
+        Token usage, cache, rate limiter and single-flight stats are always
+        included, as are ``extra_stats`` (source name -> stats, e.g. a job
+        queue's); spans and counters only when ``self.metrics`` is enabled.
+        """
+        gauges = {}
+        for stage, counters in self.token_usage.stats().items():
+            for key in ("calls", "prompt_tokens", "output_tokens"):
+                gauges[f"tokens_{stage}_{key}"] = counters[key]
+        sources = [
+            ("destination_cache", self.destination_cache.stats()),
+            ("rate_limiter", self.rate_limiter.stats()),
+            ("single_flight", self.single_flight.stats()),
+            ("conversation_memory", self.conversation_memory.stats()),
+            ("prefetch", {"pending": len(self._prefetches)}),
+        ]
+        sources.extend((f"tier_{tier}", stats) for tier, stats in self.router.stats().items())
+        if self.response_cache is not None:
+            sources.append(("response_cache", self.response_cache.stats()))
+        if self.itinerary_store is not None:
+            sources.append(("itinerary_store", self.itinerary_store.stats()))
+        if self.hedge_policy is not None:
+            sources.append(("hedging", self.hedge_policy.stats()))
+        sources.extend((extra_stats or {}).items())
+        for source, stats in sources:
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    gauges[f"{source}_{key}"] = value
+        return self.metrics.render_text(gauges)
+
+    def generate_itinerary(self, preferences: TravelPreferences, feedback: str = "",
+                           planning_mode: str = "single", max_workers: Optional[int] = None,
+                           timeout_s: Optional[float] = None) -> str:
+        """Generate a complete, personalized travel itinerary.
+
+        ``planning_mode="daily"`` plans every morning/afternoon/evening with its
+        own model call, running up to ``max_workers`` of them at once.
+        With ``timeout_s`` (or an enclosing deadline) every stage gets what is
+        left of it, and destination info is skipped when it would not fit.
+        Raises ``DeadlineExceeded`` if the deadline runs out before the itinerary.
+        A trip with ``legs`` generates every leg at once (see ``_agenerate_trip``).
+        """
         try:
-           
-            destination_info = self._get_destination_info(preferences.destination)
+            with deadline_after(timeout_s), self.metrics.span("request", operation="itinerary"):
+                if preferences.legs:
+                    trip = run_async(self._agenerate_trip(preferences, planning_mode=planning_mode,
+                                                          max_workers=max_workers))
+                    return self._assemble_itinerary(preferences, self._trip_body(trip))
+                itinerary_text = self._reuse_itinerary(preferences)
+                if itinerary_text:
+                    return self._assemble_itinerary(preferences, itinerary_text)
+                destination_info = self._destination_info_in_time(preferences.destination)
+                if planning_mode == "daily":
+                    with self.metrics.span("stage", stage="daily_schedules"):
+                        itinerary_text = self._generate_daily_schedules(preferences, destination_info, max_workers)
+                else:
+                    itinerary_prompt = self._create_itinerary_prompt(preferences, destination_info)
+                    with self.metrics.span("stage", stage="itinerary"):
+                        itinerary_text = self._generate_plain_text(
+                            itinerary_prompt, generation_config=self._itinerary_config(preferences),
+                            stage="itinerary")
+                self._store_itinerary(preferences, itinerary_text)
+                return self._assemble_itinerary(preferences, itinerary_text)
 
-            
-            def stringify_list(items):
-                result = []
-                for item in items:
-                    if isinstance(item, dict):
-                        
-                        result.append("; ".join(f"{k}: {v}" for k, v in item.items()))
-                    else:
-                        result.append(str(item))
-                return result
-
-            attractions = stringify_list(destination_info.get("attractions", []))
-            hidden_gems = stringify_list(destination_info.get("hidden_gems", []))
-            restaurants = stringify_list(destination_info.get("restaurants", []))
-            events = stringify_list(destination_info.get("events", []))
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            self.metrics.increment("errors", operation="itinerary")
+            return f"{ITINERARY_ERROR}: {str(e)}"
 
-            
-            itinerary_prompt = f"""Create a detailed {preferences.duration}-day travel itinerary for a trip to {preferences.destination}.
+    async def agenerate_itinerary(self, preferences: TravelPreferences, feedback: str = "",
+                                  planning_mode: str = "single", max_workers: Optional[int] = None,
+                                  timeout_s: Optional[float] = None) -> str:
+        """Async counterpart of ``generate_itinerary``."""
+        try:
+            with deadline_after(timeout_s), self.metrics.span("request", operation="itinerary"):
+                if preferences.legs:
+                    trip = await self._agenerate_trip(preferences, planning_mode=planning_mode,
+                                                      max_workers=max_workers)
+                    return self._assemble_itinerary(preferences, self._trip_body(trip))
+                itinerary_text = await self._areuse_itinerary(preferences)
+                if itinerary_text:
+                    return self._assemble_itinerary(preferences, itinerary_text)
+                destination_info = await self._adestination_info_in_time(preferences.destination)
+                if planning_mode == "daily":
+                    with self.metrics.span("stage", stage="daily_schedules"):
+                        itinerary_text = await self._agenerate_daily_schedules(
+                            preferences, destination_info, max_workers)
+                else:
+                    itinerary_prompt = self._create_itinerary_prompt(preferences, destination_info)
+                    with self.metrics.span("stage", stage="itinerary"):
+                        itinerary_text = await self._agenerate_plain_text(
+                            itinerary_prompt, generation_config=self._itinerary_config(preferences),
+                            stage="itinerary")
+                self._store_itinerary(preferences, itinerary_text)
+                return self._assemble_itinerary(preferences, itinerary_text)
+
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            self.metrics.increment("errors", operation="itinerary")
+            return f"{ITINERARY_ERROR}: {str(e)}"
+
+    def generate_structured_itinerary(self, preferences: TravelPreferences,
+                                      timeout_s: Optional[float] = None) -> Itinerary:
+        """Generate the itinerary in schema-constrained JSON mode and parse it once.
+
+        Raises if the model output cannot be parsed into an ``Itinerary``, or
+        ``DeadlineExceeded`` if ``timeout_s`` runs out first.
+        """
+        with deadline_after(timeout_s), self.metrics.span("request", operation="structured_itinerary"):
+            if preferences.legs:
+                return run_async(self._agenerate_trip(preferences, kind="json"))
+            itinerary_json = self._reuse_itinerary(preferences, kind="json")
+            if itinerary_json:
+                return self._parse_structured_itinerary(preferences, itinerary_json)
+            destination_info = self._destination_info_in_time(preferences.destination)
+            itinerary_json = self._generate_plain_text(
+                self._create_structured_itinerary_prompt(preferences, destination_info),
+                generation_config=self._itinerary_config(preferences, structured=True),
+                stage="structured_itinerary", validate=self._load_structured,
+            )
+            itinerary = self._parse_structured_itinerary(preferences, itinerary_json)
+            self._store_itinerary(preferences, itinerary_json, kind="json")
+            return itinerary
+
+    async def agenerate_structured_itinerary(self, preferences: TravelPreferences,
+                                             timeout_s: Optional[float] = None) -> Itinerary:
+        """Async counterpart of ``generate_structured_itinerary``."""
+        with deadline_after(timeout_s), self.metrics.span("request", operation="structured_itinerary"):
+            if preferences.legs:
+                return await self._agenerate_trip(preferences, kind="json")
+            itinerary_json = await self._areuse_itinerary(preferences, kind="json")
+            if itinerary_json:
+                return self._parse_structured_itinerary(preferences, itinerary_json)
+            destination_info = await self._adestination_info_in_time(preferences.destination)
+            itinerary_json = await self._agenerate_plain_text(
+                self._create_structured_itinerary_prompt(preferences, destination_info),
+                generation_config=self._itinerary_config(preferences, structured=True),
+                stage="structured_itinerary", validate=self._load_structured,
+            )
+            itinerary = self._parse_structured_itinerary(preferences, itinerary_json)
+            self._store_itinerary(preferences, itinerary_json, kind="json")
+            return itinerary
+
+    async def _agenerate_trip(self, preferences: TravelPreferences, kind: str = "text",
+                              planning_mode: str = "single", max_workers: Optional[int] = None) -> Itinerary:
+        """Generate every leg of a multi-destination trip concurrently and merge them, in order.
+
+        Each leg looks up its destination and generates its days as a trip
+        of its own, so the whole trip takes about as long as its slowest
+        leg. Transfer days between legs are added locally.
+        """
+        plans = plan_legs(preferences)
+        legs = [asyncio.ensure_future(self._agenerate_leg(plan, plans, kind, planning_mode, max_workers))
+                for plan in plans]
+        try:
+            itineraries = await asyncio.gather(*legs)
+        finally:
+            # One failed leg fails the trip; the others stop making calls.
+            for leg in legs:
+                leg.cancel()
+        return merge_legs(plans, itineraries, self._header_lines(preferences), PRACTICAL_INFORMATION)
+
+    async def _agenerate_leg(self, plan: LegPlan, plans: List[LegPlan], kind: str = "text",
+                             planning_mode: str = "single", max_workers: Optional[int] = None) -> Itinerary:
+        """One leg's days, reused from the itinerary store when it has them."""
+        preferences = plan.preferences
+        context = leg_context(plan, plans)
+        with self.metrics.span("stage", stage="trip_leg"):
+            body = await self._areuse_itinerary(preferences, kind, context)
+            if not body:
+                destination_info = await self._adestination_info_in_time(preferences.destination)
+                if kind == "json":
+                    body = await self._agenerate_plain_text(
+                        self._create_structured_itinerary_prompt(preferences, destination_info)
+                        + self._leg_instructions(plan, plans),
+                        generation_config=self._itinerary_config(preferences, structured=True),
+                        stage="structured_itinerary", validate=self._load_structured)
+                elif planning_mode == "daily":
+                    body = await self._agenerate_daily_schedules(preferences, destination_info, max_workers)
+                else:
+                    body = await self._agenerate_plain_text(
+                        self._create_itinerary_prompt(preferences, destination_info)
+                        + self._leg_instructions(plan, plans),
+                        generation_config=self._itinerary_config(preferences), stage="itinerary")
+                if not body:
+                    raise ValueError(f"No itinerary was generated for {preferences.destination}")
+                itinerary = self._parse_leg(body, kind)
+                self._store_itinerary(preferences, body, kind, context)
+                return itinerary
+        return self._parse_leg(body, kind)
+
+    def _parse_leg(self, body: str, kind: str) -> Itinerary:
+        """Parse a leg's body, raising if no days can be read from it, so it is not stored."""
+        itinerary = self._load_structured(body) if kind == "json" else itinerary_from_text(body)
+        if not itinerary.days:
+            raise ValueError("No days could be read from the leg's itinerary")
+        return itinerary
+
+    def _leg_instructions(self, plan: LegPlan, plans: List[LegPlan]) -> str:
+        """Tell the model where the leg sits in the trip, so it plans only the leg's own days."""
+        index = plans.index(plan)
+        route = " → ".join(other.leg.destination for other in plans)
+        arrival = (f"The traveller arrives from {plan.origin} the evening before day 1."
+                   if plan.origin else "")
+        departure = (f"After the last day they travel on to {plans[index + 1].leg.destination}."
+                     if index + 1 < len(plans) else "")
+        return f"""
+
+    This is stop {index + 1} of {len(plans)} on a longer trip: {route}. {arrival} {departure}
+    Plan only the {plan.full_days} day(s) in {plan.leg.destination}; travel between stops is planned separately."""
+
+    def _trip_body(self, trip: Itinerary) -> str:
+        """The merged days of a trip in the text layout, for between the header and footer."""
+        return Itinerary(days=trip.days).to_text()
+
+    def _generate_trip_stream(self, preferences: TravelPreferences, deadline: Optional[float]) -> Iterator[str]:
+        """Yield each leg's days in trip order, as soon as it and every leg before it are done.
+
+        The legs generate concurrently on the shared event loop; closing the
+        generator cancels the ones still running.
+        """
+        plans = plan_legs(preferences)
+        with deadline_at(deadline):
+            legs = [asyncio.run_coroutine_threadsafe(self._agenerate_leg(plan, plans), get_event_loop())
+                    for plan in plans]
+        try:
+            for index, (plan, leg) in enumerate(zip(plans, legs)):
+                days = leg_days(plan, leg.result())
+                yield ("\n\n" if index else "") + Itinerary(days=days).to_text()
+        finally:
+            for leg in legs:
+                leg.cancel()
+
+    def _itinerary_key(self, preferences: TravelPreferences, kind: str, context: str = "") -> str:
+        """Store key for an itinerary; ``context`` keeps a trip leg apart from a standalone trip."""
+        key = f"itinerary:{canonical_key(preferences, kind)}"
+        return f"{key}:{context}" if context else key
+
+    def _load_stored_itinerary(self, preferences: TravelPreferences, kind: str, context: str = "") -> Optional[Dict]:
+        if self.itinerary_store is None:
+            return None
+        entry = self.itinerary_store.get(self._itinerary_key(preferences, kind, context))
+        self.metrics.increment("cache_hits" if entry is not None else "cache_misses", cache="itinerary", stage=kind)
+        return entry
+
+    def _reuse_itinerary(self, preferences: TravelPreferences, kind: str = "text", context: str = "") -> str:
+        """Body of a stored itinerary for near-identical preferences, or "" if there is none.
+
+        The caller renders a fresh header, so dates and budget always show the
+        request's own wording. With ``adapt_stored_itineraries`` set, a
+        stored body whose preferences were worded differently first goes
+        through a short adaptation call; the stored body is used as it is if
+        that fails or does not finish within ``ADAPTATION_SHARE`` of the
+        time left. An adaptation with fewer days than the trip returns "",
+        so the itinerary is generated afresh. ``context`` is as for
+        ``_itinerary_key``.
+        """
+        entry = self._load_stored_itinerary(preferences, kind, context)
+        if entry is None:
+            return ""
+        differences = preference_differences(entry.get("preferences") or {}, preferences)
+        if not (self.adapt_stored_itineraries and differences):
+            return entry["body"]
+        prompt = self._create_adaptation_prompt(preferences, entry["body"], differences, kind)
+        try:
+            with stage_deadline(ADAPTATION_SHARE):
+                adapted = self._generate_plain_text(
+                    prompt, generation_config=self._itinerary_config(preferences, structured=kind == "json"),
+                    stage="adaptation", validate=lambda text: self._check_adapted(text, kind, preferences))
+            return self._check_adapted(adapted, kind, preferences)
+        except IncompleteItinerary:
+            self.metrics.increment("fallbacks", kind="incomplete_adaptation")
+            return ""
+        except Exception:
+            self.metrics.increment("fallbacks", kind="adaptation")
+            return entry["body"]
+
+    async def _areuse_itinerary(self, preferences: TravelPreferences, kind: str = "text", context: str = "") -> str:
+        entry = self._load_stored_itinerary(preferences, kind, context)
+        if entry is None:
+            return ""
+        differences = preference_differences(entry.get("preferences") or {}, preferences)
+        if not (self.adapt_stored_itineraries and differences):
+            return entry["body"]
+        prompt = self._create_adaptation_prompt(preferences, entry["body"], differences, kind)
+        try:
+            with stage_deadline(ADAPTATION_SHARE):
+                adapted = await self._agenerate_plain_text(
+                    prompt, generation_config=self._itinerary_config(preferences, structured=kind == "json"),
+                    stage="adaptation", validate=lambda text: self._check_adapted(text, kind, preferences))
+            return self._check_adapted(adapted, kind, preferences)
+        except IncompleteItinerary:
+            self.metrics.increment("fallbacks", kind="incomplete_adaptation")
+            return ""
+        except Exception:
+            self.metrics.increment("fallbacks", kind="adaptation")
+            return entry["body"]
+
+    def _check_adapted(self, adapted: str, kind: str, preferences: TravelPreferences) -> str:
+        """Return ``adapted`` if it is a whole itinerary of ``kind``, raising otherwise.
+
+        Raises ``IncompleteItinerary`` if it has fewer days than the trip, as
+        when the output cap cuts it short.
+        """
+        if not adapted:
+            raise ValueError("Adaptation returned no text")
+        itinerary = self._load_structured(adapted) if kind == "json" else itinerary_from_text(adapted)
+        if len(itinerary.days) < preferences.duration:
+            raise IncompleteItinerary(
+                f"Adaptation has {len(itinerary.days)} of the trip's {preferences.duration} days")
+        return adapted
+
+    def _load_structured(self, itinerary_json: str) -> Itinerary:
+        """Parse a JSON itinerary body, raising if it is not one."""
+        return itinerary_from_json(self._strip_code_fences(itinerary_json))
+
+    def _store_itinerary(self, preferences: TravelPreferences, body: str, kind: str = "text",
+                         context: str = "") -> None:
+        if self.itinerary_store is None or not body:
+            return
+        self.itinerary_store.put(self._itinerary_key(preferences, kind, context), body,
+                                 preferences.model_dump(mode="json"))
+
+    def _create_adaptation_prompt(self, preferences: TravelPreferences, body: str,
+                                  differences: Dict[str, Tuple[str, str]], kind: str) -> str:
+        changes = "\n".join(
+            f"- {field.replace('_', ' ').capitalize()}: was {before or 'not set'}, now {after or 'not set'}"
+            for field, (before, after) in differences.items()
+        )
+        output = ("Return the itinerary as JSON in the same structure." if kind == "json"
+                  else "Return the complete itinerary in the same format.")
+        return f"""Adapt this {preferences.duration}-day itinerary for {preferences.destination}, planned for a
+            very similar trip, to the traveller's details.
+            Changed details:
+            {changes}
+
+            Itinerary:
+            {body}
+
+            Keep the plan as it is unless a change calls for a different choice, such as
+            seasonal events, opening days, or prices that no longer fit the budget.
+            {output}"""
+
+    def _create_structured_itinerary_prompt(self, preferences: TravelPreferences, destination_info: Dict) -> str:
+        return self._create_itinerary_prompt(preferences, destination_info) + """
+
+    Return the itinerary as JSON with one entry per day. Give each day a short title and
+    morning, afternoon and evening segments. Each activity needs a time, a place, a short
+    description, an estimated cost and how to get there."""
+
+    def _parse_structured_itinerary(self, preferences: TravelPreferences, itinerary_json: str) -> Itinerary:
+        return itinerary_from_json(
+            self._strip_code_fences(itinerary_json), self._header_lines(preferences), PRACTICAL_INFORMATION)
+
+    def _header_lines(self, preferences: TravelPreferences) -> Tuple[str, ...]:
+        return tuple(line.strip() for line in self._itinerary_header(preferences).splitlines() if line.strip())
+
+    def _create_itinerary_prompt(self, preferences: TravelPreferences, destination_info: Dict) -> str:
+        """Build the main itinerary prompt from preferences and destination info.
+
+        The destination lists are trimmed to the token budget's input limit.
+        """
+        lists = fit_lists(
+            {key: _stringify_items(destination_info.get(key, [])) for key in DESTINATION_INFO_KEYS},
+            self.token_budget.input_tokens,
+        )
+        attractions, hidden_gems, restaurants, events = (lists[key] for key in DESTINATION_INFO_KEYS)
+        routes = self._route_plan(preferences, destination_info)
+        day_plans = ""
+        grouping = "Groups nearby attractions together to minimize travel time"
+        if routes:
+            from utils.geo import format_routes
+            plans = "\n".join(f"    {line}" for line in format_routes(routes).splitlines())
+            day_plans = f"""
+    Suggested day plans (stops grouped by location and put in walking order):
+{plans}
+"""
+            grouping = "Follows the suggested day plans, visiting their stops in the given order"
+
+        return f"""Create a detailed {preferences.duration}-day travel itinerary for a trip to {preferences.destination}.
     Trip Details:
     - Budget: {preferences.budget}
     - Dates: {preferences.start_date.strftime('%Y-%m-%d')} to {preferences.end_date.strftime('%Y-%m-%d')}
@@ -273,14 +1783,14 @@ class TravelAgent:
     - Mobility: {preferences.mobility_requirements} (Can walk for {preferences.walking_tolerance})
     - Accommodation: {preferences.accommodation_type}
 
-    Available Attractions: {', '.join(attractions)}
-    Hidden Gems: {', '.join(hidden_gems)}
-    Restaurants: {', '.join(restaurants)}
-    Events: {', '.join(events)}
-
+    Available Attractions: {', '.join(attractions) or 'Your choice of local highlights'}
+    Hidden Gems: {', '.join(hidden_gems) or 'Your choice of lesser-known spots'}
+    Restaurants: {', '.join(restaurants) or 'Your choice of local restaurants'}
+    Events: {', '.join(events) or 'Any you know of for these dates'}
+{day_plans}
     Please create a day-by-day itinerary that:
     1. Starts each day with a breakfast recommendation
-    2. Groups nearby attractions together to minimize travel time
+    2. {grouping}
     3. Includes specific timing for each activity
     4. Suggests restaurants that match dietary preferences
     5. Incorporates rest periods and flexible time
@@ -292,34 +1802,353 @@ class TravelAgent:
 
     Format the itinerary clearly with day numbers, times, and sections for morning, afternoon, and evening."""
 
-            
-            itinerary_text = self._generate_plain_text(itinerary_prompt)
-            if not itinerary_text:
-                return "Unable to generate itinerary. Please try again."
+    def _assemble_itinerary(self, preferences: TravelPreferences, itinerary_text: str) -> str:
+        """Wrap the generated itinerary body with the trip header and practical info."""
+        if not itinerary_text:
+            return NO_ITINERARY
 
-            
-            full_itinerary = f"""Personalized Travel Itinerary for {preferences.destination}
+        full_itinerary = self._itinerary_header(preferences) + itinerary_text + self._itinerary_footer()
+        return full_itinerary.strip()
+
+    def _itinerary_header(self, preferences: TravelPreferences) -> str:
+        route = f"\n    Route: {route_label(preferences.legs)}" if preferences.legs else ""
+        return f"""Personalized Travel Itinerary for {preferences.destination}{route}
     Duration: {preferences.duration} days
     Dates: {preferences.start_date.strftime('%Y-%m-%d')} to {preferences.end_date.strftime('%Y-%m-%d')}
     Budget: {preferences.budget}
-    {itinerary_text}
+    """
 
-    Practical Information:
-    - Emergency Numbers: Save local emergency contacts
-    - Weather: Check daily forecast
-    - Transportation: Download local transit apps
-    - Bookings: Make reservations in advance
-    - Local Customs: Research and respect local traditions"""
+    def _itinerary_footer(self) -> str:
+        return "\n\n    Practical Information:\n" + "\n".join(f"    - {item}" for item in PRACTICAL_INFORMATION)
 
-            return full_itinerary.strip()
+    def generate_itinerary_stream(self, preferences: TravelPreferences,
+                                  timeout_s: Optional[float] = None) -> Iterator[str]:
+        """Generate an itinerary, yielding text chunks as soon as they are available.
 
+        Joined together, the chunks have the same layout as ``generate_itinerary``.
+        ``timeout_s`` is a deadline for the whole stream, counted from the
+        first chunk being requested; a stream it cuts short raises
+        ``DeadlineExceeded`` rather than ending like a finished itinerary.
+        """
+        started = time.perf_counter()
+        # A generator cannot hold a context variable across its yields, so the
+        # deadline is applied around each step instead.
+        deadline = deadline_in(timeout_s)
+        yield self._itinerary_header(preferences)
+        try:
+            if preferences.legs:
+                yield from self._generate_trip_stream(preferences, deadline)
+                yield self._itinerary_footer()
+                self.metrics.observe("request", time.perf_counter() - started, operation="stream_itinerary")
+                return
+            with deadline_at(deadline):
+                stored = self._reuse_itinerary(preferences)
+            if stored:
+                yield stored
+                yield self._itinerary_footer()
+                self.metrics.observe("request", time.perf_counter() - started, operation="stream_itinerary")
+                return
+            with deadline_at(deadline):
+                destination_info = self._destination_info_in_time(preferences.destination)
+            itinerary_prompt = self._create_itinerary_prompt(preferences, destination_info)
+            received = []
+            chunks = self._generate_text_stream(
+                itinerary_prompt, generation_config=self._itinerary_config(preferences), stage="itinerary",
+                deadline=deadline)
+            for chunk in chunks:
+                if not received:
+                    self.metrics.observe("first_chunk", time.perf_counter() - started, operation="stream_itinerary")
+                received.append(chunk)
+                yield chunk
+            if not received:
+                yield NO_ITINERARY
+                return
+            yield self._itinerary_footer()
+            self._store_itinerary(preferences, "".join(received).strip())
+            self.metrics.observe("request", time.perf_counter() - started, operation="stream_itinerary")
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            return f"An error occurred while generating the itinerary: {str(e)}"
-    
-    def refine_suggestions(self, preferences: TravelPreferences, feedback: str) -> str:
-        """Now uses LangChain to remember all past feedback"""
+            self.metrics.increment("errors", operation="stream_itinerary")
+            yield f"\n{ITINERARY_ERROR}: {str(e)}"
+
+    def _generate_text_stream(self, prompt: str, cache: bool = True, generation_config: Optional[Dict] = None,
+                              stage: str = "other", deadline: Optional[float] = None) -> Iterator[str]:
+        """Stream plain text chunks for ``prompt``, using the response cache when set.
+
+        Raises ``DeadlineExceeded`` if the stream is still going at ``deadline``.
+        """
+        cache_key = None
+        if cache and self.response_cache is not None:
+            cache_key = self._response_cache_key(prompt, generation_config, stage)
+            cached = self.response_cache.get(cache_key)
+            self.metrics.increment("cache_hits" if cached is not None else "cache_misses",
+                                   cache="response", stage=stage)
+            if cached is not None:
+                yield cached
+                return
+
+        started = time.perf_counter()
+        chunks = []
+        with deadline_at(deadline):
+            response, reserved = self._call_model(prompt, generation_config, stream=True, stage=stage)
+        used_tokens = None
+        last_chunk = None
+        try:
+            for chunk in response:
+                if self._used_tokens(chunk):
+                    used_tokens, last_chunk = self._used_tokens(chunk), chunk
+                check_cancelled()
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DeadlineExceeded(f"deadline passed while streaming {stage}")
+                text = self._response_to_text(chunk, strip=False)
+                if text:
+                    chunks.append(text)
+                    yield text
+        except BaseException as e:
+            self.rate_limiter.release(reserved, throttled=is_throttle_error(e), failed=True)
+            raise
+        self.rate_limiter.release(reserved, used_tokens=used_tokens)
+        self.metrics.observe("model_stream", time.perf_counter() - started, stage=stage)
+
+        text = "".join(chunks).strip()
+        # Streams report usage on their final chunks.
+        self.token_usage.record(stage, prompt, last_chunk, text)
+        if cache_key is not None and text:
+            self.response_cache.set(cache_key, text)
+
+    def refine_suggestions(self, preferences: TravelPreferences, feedback: str,
+                           itinerary: Optional[str] = None, session_id: Optional[str] = None) -> str:
+        """Revise the itinerary according to ``feedback`` and return the full updated text.
+
+        The session's latest itinerary (or ``itinerary``, when given) anchors
+        the prompt, together with a running summary of older requests and the
+        most recent ones verbatim, so the prompt stays the same size however
+        long the conversation runs. ``session_id`` defaults to one derived
+        from ``preferences``.
+        """
+        session_id = session_id or self._refinement_session_id(preferences)
+        try:
+            with self.metrics.span("request", operation="refine"):
+                if itinerary:
+                    self.conversation_memory.set_itinerary(session_id, itinerary)
+                prompt = self._create_refinement_prompt(
+                    preferences, feedback, self.conversation_memory.context(session_id))
+                refined = self._generate_plain_text(
+                    prompt, generation_config=self._itinerary_config(preferences), stage="itinerary_refinement")
+                if not refined:
+                    return f"{REFINEMENT_ERROR}: the model returned no text"
+                self._remember_refinement(session_id, refined, feedback)
+                return refined
+        except Exception as e:
+            self.metrics.increment("errors", operation="refine")
+            return f"{REFINEMENT_ERROR}: {str(e)}"
+
+    async def arefine_suggestions(self, preferences: TravelPreferences, feedback: str,
+                                  itinerary: Optional[str] = None, session_id: Optional[str] = None) -> str:
+        """Async counterpart of ``refine_suggestions``."""
+        session_id = session_id or self._refinement_session_id(preferences)
+        try:
+            with self.metrics.span("request", operation="refine"):
+                if itinerary:
+                    self.conversation_memory.set_itinerary(session_id, itinerary)
+                prompt = self._create_refinement_prompt(
+                    preferences, feedback, self.conversation_memory.context(session_id))
+                refined = await self._agenerate_plain_text(
+                    prompt, generation_config=self._itinerary_config(preferences), stage="itinerary_refinement")
+                if not refined:
+                    return f"{REFINEMENT_ERROR}: the model returned no text"
+                await self._aremember_refinement(session_id, refined, feedback)
+                return refined
+        except Exception as e:
+            self.metrics.increment("errors", operation="refine")
+            return f"{REFINEMENT_ERROR}: {str(e)}"
+
+    def refine_itinerary(self, preferences: TravelPreferences, itinerary: Itinerary, feedback: str,
+                         session_id: Optional[str] = None) -> Itinerary:
+        """Apply ``feedback`` by regenerating only the days it affects.
+
+        The affected days (and, where the feedback says so, segments) are
+        found locally when the feedback names them, and by a short model
+        call otherwise. Each affected day is regenerated on its own, in
+        parallel, and spliced back; every other day is returned unchanged, so
+        cost follows the size of the change rather than the trip length. A
+        day whose regeneration fails keeps its current plan.
+        """
+        session_id = session_id or self._refinement_session_id(preferences)
+        try:
+            with self.metrics.span("request", operation="refine_itinerary"):
+                scope = feedback_scope(feedback, itinerary)
+                if scope is None:
+                    scope = self._model_scope(feedback, itinerary)
+                context = self.conversation_memory.context(session_id)
+                days = [day for day in itinerary.days if day.number in scope]
+                refined_days = self._schedule_executor.map(_in_caller_context(
+                    lambda day: self._refine_day(preferences, itinerary, day, scope[day.number], feedback, context)
+                ), days)
+                refined = self._splice_days(itinerary, dict(zip((day.number for day in days), refined_days)))
+                self._remember_refinement(session_id, refined.to_text(), feedback)
+                return refined
+        except Exception:
+            self.metrics.increment("errors", operation="refine_itinerary")
+            raise
+
+    async def arefine_itinerary(self, preferences: TravelPreferences, itinerary: Itinerary, feedback: str,
+                                session_id: Optional[str] = None) -> Itinerary:
+        """Async counterpart of ``refine_itinerary``."""
+        session_id = session_id or self._refinement_session_id(preferences)
+        try:
+            with self.metrics.span("request", operation="refine_itinerary"):
+                scope = feedback_scope(feedback, itinerary)
+                if scope is None:
+                    scope = await self._amodel_scope(feedback, itinerary)
+                context = self.conversation_memory.context(session_id)
+                days = [day for day in itinerary.days if day.number in scope]
+                refined_days = await asyncio.gather(*(
+                    self._arefine_day(preferences, itinerary, day, scope[day.number], feedback, context)
+                    for day in days
+                ))
+                refined = self._splice_days(itinerary, dict(zip((day.number for day in days), refined_days)))
+                await self._aremember_refinement(session_id, refined.to_text(), feedback)
+                return refined
+        except Exception:
+            self.metrics.increment("errors", operation="refine_itinerary")
+            raise
+
+    def _model_scope(self, feedback: str, itinerary: Itinerary) -> Dict[int, Tuple[str, ...]]:
+        """Ask the model which days the feedback affects; every day if it can't say."""
+        try:
+            text = self._generate_plain_text(
+                self._create_scope_prompt(feedback, itinerary), generation_config=SCOPE_CONFIG,
+                stage="refinement_scope")
+            return self._parse_scope(text, itinerary)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="refinement_scope")
+            return {day.number: () for day in itinerary.days}
+
+    async def _amodel_scope(self, feedback: str, itinerary: Itinerary) -> Dict[int, Tuple[str, ...]]:
         try:
-            context = f"""
+            text = await self._agenerate_plain_text(
+                self._create_scope_prompt(feedback, itinerary), generation_config=SCOPE_CONFIG,
+                stage="refinement_scope")
+            return self._parse_scope(text, itinerary)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="refinement_scope")
+            return {day.number: () for day in itinerary.days}
+
+    def _create_scope_prompt(self, feedback: str, itinerary: Itinerary) -> str:
+        outline = "\n".join(
+            f"- Day {day.number}: {day.title or 'Untitled'} "
+            f"({', '.join(activity.place for segment in day.segments for activity in segment.activities if activity.place)})"
+            for day in itinerary.days
+        )
+        return f"""Decide which days of this travel itinerary need to change to apply the traveller's feedback.
+            Itinerary outline:
+            {outline}
+
+            Feedback: {feedback}
+
+            List only the days that must change. For each, give the segments to change
+            (Morning, Afternoon, Evening), or no segments if the whole day should change."""
+
+    def _parse_scope(self, scope_text: str, itinerary: Itinerary) -> Dict[int, Tuple[str, ...]]:
+        data = json.loads(self._strip_code_fences(scope_text))
+        numbers = {day.number for day in itinerary.days}
+        scope = {}
+        for entry in data.get("days") or []:
+            if isinstance(entry, dict) and entry.get("day") in numbers:
+                segments = {segment_key(str(name)) for name in entry.get("segments") or []}
+                scope[entry["day"]] = tuple(name for name in SEGMENT_NAMES if name in segments)
+        if not scope:
+            raise ValueError("Scope response names no day of the itinerary")
+        return scope
+
+    def _day_refinement_config(self) -> Dict:
+        return dict(DAY_CONFIG, max_output_tokens=self.token_budget.output_tokens(1, structured=True))
+
+    def _refine_day(self, preferences: TravelPreferences, itinerary: Itinerary, day: Day,
+                    segments: Tuple[str, ...], feedback: str, context: Dict) -> Day:
+        prompt = self._create_day_refinement_prompt(preferences, itinerary, day, segments, feedback, context)
+        try:
+            day_json = self._generate_plain_text(
+                prompt, generation_config=self._day_refinement_config(), stage="refinement")
+            return self._parse_refined_day(day, segments, day_json)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="refine_day")
+            return day
+
+    async def _arefine_day(self, preferences: TravelPreferences, itinerary: Itinerary, day: Day,
+                           segments: Tuple[str, ...], feedback: str, context: Dict) -> Day:
+        prompt = self._create_day_refinement_prompt(preferences, itinerary, day, segments, feedback, context)
+        try:
+            day_json = await self._agenerate_plain_text(
+                prompt, generation_config=self._day_refinement_config(), stage="refinement")
+            return self._parse_refined_day(day, segments, day_json)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="refine_day")
+            return day
+
+    def _parse_refined_day(self, day: Day, segments: Tuple[str, ...], day_json: str) -> Day:
+        parsed = itinerary_from_dict({"days": [json.loads(self._strip_code_fences(day_json))]}).days
+        if not parsed or not parsed[0].segments:
+            raise ValueError("Refined day has no segments")
+        return splice_day(day, parsed[0], segments)
+
+    def _splice_days(self, itinerary: Itinerary, refined: Dict[int, Day]) -> Itinerary:
+        return itinerary._replace(days=tuple(refined.get(day.number, day) for day in itinerary.days))
+
+    def _create_day_refinement_prompt(self, preferences: TravelPreferences, itinerary: Itinerary, day: Day,
+                                      segments: Tuple[str, ...], feedback: str, context: Dict) -> str:
+        elsewhere = [
+            activity.place
+            for other in itinerary.days if other.number != day.number
+            for segment in other.segments
+            for activity in segment.activities if activity.place
+        ]
+        elsewhere = fit_lists({"elsewhere": elsewhere}, self.token_budget.context_tokens)["elsewhere"]
+        history = []
+        if context["summary"]:
+            history.append(f"Summary of earlier requests: {context['summary']}")
+        if context["turns"]:
+            history.append("Recent requests, oldest first:\n" + "\n".join(f"- {turn}" for turn in context["turns"]))
+        if segments:
+            focus = (f"Only change the {' and '.join(name.lower() for name in segments)}; "
+                     "keep the rest of the day exactly as it is.")
+        else:
+            focus = "Apply the feedback to this day and change nothing it doesn't ask for."
+        return f"""You are refining day {day.number} of a travel itinerary based on the traveller's feedback.
+            {self._create_refinement_context(preferences, feedback)}
+            Current plan for day {day.number}:
+            {itinerary_to_text(Itinerary(days=(day,)))}
+
+            Planned on other days, do not repeat: {', '.join(elsewhere) if elsewhere else 'Nothing'}
+            {chr(10).join(history) if history else 'This is the first change requested.'}
+
+            {focus} Keep earlier requests honoured.
+            Return this day as JSON with a short title and morning, afternoon and evening segments.
+            Each activity needs a time, a place, a short description, an estimated cost and how to get there."""
+
+    def _remember_refinement(self, session_id: str, itinerary: str, feedback: str) -> None:
+        """Store the refined itinerary and the request, summarizing requests that no longer fit."""
+        self.conversation_memory.set_itinerary(session_id, itinerary)
+        overflow = self.conversation_memory.add_turn(session_id, feedback)
+        if overflow:
+            summary = self.conversation_memory.get_summary(session_id)
+            self.conversation_memory.set_summary(session_id, self._summarize_requests(summary, overflow))
+
+    async def _aremember_refinement(self, session_id: str, itinerary: str, feedback: str) -> None:
+        self.conversation_memory.set_itinerary(session_id, itinerary)
+        overflow = self.conversation_memory.add_turn(session_id, feedback)
+        if overflow:
+            summary = self.conversation_memory.get_summary(session_id)
+            self.conversation_memory.set_summary(session_id, await self._asummarize_requests(summary, overflow))
+
+    def _refinement_session_id(self, preferences: TravelPreferences) -> str:
+        payload = json.dumps(preferences.model_dump(mode="json"), sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _create_refinement_context(self, preferences: TravelPreferences, feedback: str) -> str:
+        return f"""
             Original trip: {preferences.destination} for {preferences.duration} days
             Budget: {preferences.budget}, Purpose: {preferences.purpose}
             Interests: {', '.join(preferences.interests or [])}
@@ -327,24 +2156,90 @@ class TravelAgent:
             Mobility: {preferences.walking_tolerance}
             User feedback: {feedback}
             """
-            
-            response = self.conversation.predict(input=context)
-            return response
-        except Exception as e:
-            return f"Sorry, I couldn't refine the itinerary right now: {str(e)}"
+
+    def _create_refinement_prompt(self, preferences: TravelPreferences, feedback: str, context: Dict) -> str:
+        history = []
+        if context["summary"]:
+            history.append(f"Summary of earlier requests: {context['summary']}")
+        if context["turns"]:
+            history.append("Recent requests, oldest first:\n" + "\n".join(f"- {turn}" for turn in context["turns"]))
+        itinerary = context["itinerary"] or "(not available; create one that fits the trip)"
+        return f"""You are refining a travel itinerary based on the traveller's feedback.
+            {self._create_refinement_context(preferences, feedback)}
+            Current itinerary:
+            {itinerary}
+
+            {chr(10).join(history) if history else 'This is the first change requested.'}
+
+            Apply the feedback, keep earlier requests honoured, and change nothing else.
+            Return the complete updated itinerary in the same format as the current one."""
+
+    def _create_summary_prompt(self, summary: str, requests: List[str]) -> str:
+        return f"""Merge these travel itinerary change requests into the existing summary.
+            Keep every preference that still applies, drop ones that were later reversed,
+            and answer in at most {self.conversation_memory.max_history_tokens // 4} words of plain text.
+
+            Existing summary: {summary or 'None'}
+            New requests:
+            {chr(10).join(f'- {request}' for request in requests)}"""
+
+    def _fallback_summary(self, summary: str, requests: List[str]) -> str:
+        # Keep the most recent part of the history within half the session's token cap.
+        merged = "; ".join(part for part in [summary] + requests if part)
+        return merged[-self.conversation_memory.max_history_tokens * 2:]
+
+    def _summarize_requests(self, summary: str, requests: List[str]) -> str:
+        try:
+            text = self._generate_plain_text(self._create_summary_prompt(summary, requests), stage="summary")
+        except Exception:
+            text = ""
+        if not text:
+            self.metrics.increment("fallbacks", kind="summary")
+            return self._fallback_summary(summary, requests)
+        return text
+
+    async def _asummarize_requests(self, summary: str, requests: List[str]) -> str:
+        try:
+            text = await self._agenerate_plain_text(self._create_summary_prompt(summary, requests), stage="summary")
+        except Exception:
+            text = ""
+        if not text:
+            self.metrics.increment("fallbacks", kind="summary")
+            return self._fallback_summary(summary, requests)
+        return text
 
     def gather_preferences(self, user_input: str) -> Dict:
-        """Gather and refine user preferences through conversation."""
-        initial_prompt = self._create_initial_prompt()
-        resp_text = self._generate_plain_text(f"{initial_prompt}\n\nUser: {user_input}")
-        preferences = self._parse_preferences(resp_text)
-        
-       
-        if preferences.get('needs_clarification'):
-            clarification_prompt = self._create_clarification_prompt(preferences)
-            clarification_text = self._generate_plain_text(clarification_prompt)
-            preferences.update(self._parse_preferences(clarification_text))
-        
+        """Extract travel preferences from the user's free-text description.
+
+        A local rule-based pass resolves what it can without a model call;
+        only the fields it leaves open go to the model, in one structured
+        call. ``needs_clarification`` is set when fields are still missing
+        afterwards, with ``clarification_questions`` to ask the user.
+        """
+        with self.metrics.span("request", operation="gather_preferences"):
+            preferences = extract_preferences(user_input)
+            missing = missing_fields(preferences)
+            self.metrics.increment("preferences_resolved_locally", len(PREFERENCE_FIELDS) - len(missing))
+            if missing:
+                preferences.update(self._parse_preferences(user_input, missing))
+            return self._complete_preferences(preferences)
+
+    async def agather_preferences(self, user_input: str) -> Dict:
+        """Async counterpart of ``gather_preferences``."""
+        with self.metrics.span("request", operation="gather_preferences"):
+            preferences = extract_preferences(user_input)
+            missing = missing_fields(preferences)
+            self.metrics.increment("preferences_resolved_locally", len(PREFERENCE_FIELDS) - len(missing))
+            if missing:
+                preferences.update(await self._aparse_preferences(user_input, missing))
+            return self._complete_preferences(preferences)
+
+    def _complete_preferences(self, resolved: Dict) -> Dict:
+        preferences = self._default_preferences()
+        preferences.update(resolved)
+        questions = self._create_clarification_prompt(preferences)
+        preferences["needs_clarification"] = bool(questions)
+        preferences["clarification_questions"] = questions.splitlines()
         return preferences
 
     def _create_clarification_prompt(self, preferences: Dict) -> str:
@@ -359,32 +2254,63 @@ class TravelAgent:
         
         if not preferences.get('specific_interests'):
             clarification_needed.append("What specific activities or experiences interest you the most?")
+
+        if not preferences.get('budget'):
+            clarification_needed.append("What budget do you have in mind for the trip?")
         
         return "\n".join(clarification_needed)
 
-    def _parse_preferences(self, response: str) -> Dict:
-        """Parse the AI response into structured preferences."""
+    def _parse_preferences(self, response: str, fields=PREFERENCE_FIELDS) -> Dict:
+        """Ask the model for ``fields`` of the preferences described in ``response``.
+
+        Returns only the fields the model filled in.
+        """
         try:
-            
-            parse_prompt = f"""Extract key travel preferences from this conversation:
+            parse_text = self._generate_plain_text(
+                self._create_parse_prompt(response, fields), generation_config=preferences_config(fields),
+                stage="preference_parsing")
+            return self._load_preferences(parse_text, fields)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="preferences")
+            return {}
+
+    async def _aparse_preferences(self, response: str, fields=PREFERENCE_FIELDS) -> Dict:
+        """Async counterpart of ``_parse_preferences``."""
+        try:
+            parse_text = await self._agenerate_plain_text(
+                self._create_parse_prompt(response, fields), generation_config=preferences_config(fields),
+                stage="preference_parsing")
+            return self._load_preferences(parse_text, fields)
+        except Exception:
+            self.metrics.increment("fallbacks", kind="preferences")
+            return {}
+
+    def _create_parse_prompt(self, response: str, fields=PREFERENCE_FIELDS) -> str:
+        descriptions = {
+            "dietary_preferences": "dietary_preferences (list, e.g. Vegetarian, Halal, None)",
+            "walking_tolerance": "walking_tolerance (string, e.g. \"3 hours\")",
+            "specific_interests": "specific_interests (list)",
+            "budget": "budget (string, e.g. \"$2000-3000\")",
+        }
+        keys = "\n".join(f"            - {descriptions[field]}" for field in fields)
+        return f"""Extract key travel preferences from this conversation:
             {response}
             
-            Format the response as a JSON with these keys:
-            - dietary_preferences (list)
-            - walking_tolerance (string)
-            - specific_interests (list)
-            - needs_clarification (boolean)
+            Format the response as a JSON with these keys, using null or an empty
+            list when the conversation does not say:
+{keys}
             """
-            
-            parse_text = self._generate_plain_text(parse_prompt)
-            parse_text = self._strip_code_fences(parse_text)
-            preferences = json.loads(parse_text)
-            return preferences
-        except:
-            
-            return {
-                "needs_clarification": True,
-                "dietary_preferences": [],
-                "walking_tolerance": None,
-                "specific_interests": []
-            } 
+
+    def _load_preferences(self, parse_text: str, fields=PREFERENCE_FIELDS) -> Dict:
+        parse_text = self._strip_code_fences(parse_text)
+        data = json.loads(parse_text)
+        return {field: data[field] for field in fields if data.get(field)}
+
+    def _default_preferences(self) -> Dict:
+        return {
+            "needs_clarification": True,
+            "dietary_preferences": [],
+            "walking_tolerance": None,
+            "specific_interests": [],
+            "budget": None,
+        }